@@ -10,6 +10,7 @@ from libgptb.augmentors.node_shuffling import NodeShuffling
 from libgptb.augmentors.feature_masking import FeatureMasking, FeatureMaskingDGL
 from libgptb.augmentors.feature_dropout import FeatureDropout
 from libgptb.augmentors.edge_attr_masking import EdgeAttrMasking
+from libgptb.augmentors.functional import MaskedFeatures
 
 __all__ = [
     'Graph',
@@ -23,6 +24,7 @@ __all__ = [
     'FeatureMasking',
     'FeatureMaskingDGL',
     'FeatureDropout',
+    'MaskedFeatures',
     'Identity',
     'PPRDiffusion',
     'MarkovDiffusion',
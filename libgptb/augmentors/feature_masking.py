@@ -1,22 +1,25 @@
 from libgptb.augmentors.augmentor import Graph, Augmentor
-from libgptb.augmentors.functional import drop_feature
+from libgptb.augmentors.functional import drop_feature, mask_feature
 
 
 class FeatureMasking(Augmentor):
-    def __init__(self, pf: float):
+    def __init__(self, pf: float, lazy: bool = False):
         super(FeatureMasking, self).__init__()
         self.pf = pf
+        # lazy masks are returned as MaskedFeatures for encoders whose first layer is linear
+        self.lazy = lazy
 
     def augment(self, g: Graph) -> Graph:
         x, edge_index, edge_weights = g.unfold()
-        x = drop_feature(x, self.pf)
+        x = mask_feature(x, self.pf) if self.lazy else drop_feature(x, self.pf)
         return Graph(x=x, edge_index=edge_index, edge_weights=edge_weights)
     
 class FeatureMaskingDGL():
-    def __init__(self, pf: float):
+    def __init__(self, pf: float, lazy: bool = False):
         super(FeatureMaskingDGL, self).__init__()
         self.pf = pf
+        self.lazy = lazy
 
     def augment(self, x):
-        x = drop_feature(x, self.pf)
+        x = mask_feature(x, self.pf) if self.lazy else drop_feature(x, self.pf)
         return x
\ No newline at end of file
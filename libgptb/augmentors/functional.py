@@ -2,7 +2,7 @@ import torch
 import networkx as nx
 import torch.nn.functional as F
 
-from typing import Optional
+from typing import Optional, NamedTuple
 from libgptb.utils import normalize
 from torch_sparse import SparseTensor, coalesce
 from torch_scatter import scatter
@@ -87,6 +87,10 @@ def multiinstance_mixup(x1: torch.Tensor, x2: torch.Tensor,
 
 
 def drop_feature(x: torch.Tensor, drop_prob: float) -> torch.Tensor:
+    if isinstance(x, SparseTensor):
+        # mask the columns on the sparse structure instead of cloning a dense matrix
+        drop_mask = torch.empty((x.size(1),), dtype=torch.float32, device=x.device()).uniform_(0, 1) < drop_prob
+        return x.set_value(x.storage.value() * (~drop_mask)[x.storage.col()], layout='coo')
     device = x.device
     drop_mask = torch.empty((x.size(1),), dtype=torch.float32).uniform_(0, 1) < drop_prob
     drop_mask = drop_mask.to(device)
@@ -96,18 +100,59 @@ def drop_feature(x: torch.Tensor, drop_prob: float) -> torch.Tensor:
     return x
 
 
+class MaskedFeatures(NamedTuple):
+    """
+    Node features ``x`` whose columns with ``keep == 0`` are masked out, kept lazily:
+    since masking columns of X equals masking rows of the first layer's weight,
+    encoders apply ``keep`` to W (O(F·d)) instead of copying X (O(N·F)).
+    """
+    x: torch.Tensor
+    keep: torch.FloatTensor
+
+    def to(self, *args, **kwargs):
+        return MaskedFeatures(self.x.to(*args, **kwargs), self.keep.to(*args, **kwargs))
+
+    def size(self, dim=None):
+        return self.x.size() if dim is None else self.x.size(dim)
+
+    def materialize(self):
+        if isinstance(self.x, SparseTensor):
+            return self.x.set_value(self.x.storage.value() * self.keep[self.x.storage.col()], layout='coo')
+        return self.x * self.keep
+
+
+def _apply_keep(x, keep: torch.FloatTensor) -> MaskedFeatures:
+    if isinstance(x, MaskedFeatures):
+        return MaskedFeatures(x.x, x.keep * keep)
+    return MaskedFeatures(x, keep)
+
+
+def mask_feature(x, drop_prob: float) -> MaskedFeatures:
+    """
+    Lazy counterpart of ``drop_feature``: samples the same column mask but
+    returns it as ``MaskedFeatures`` without touching ``x``.
+    """
+    base = x.x if isinstance(x, MaskedFeatures) else x
+    device = base.device() if isinstance(base, SparseTensor) else base.device
+    keep = torch.empty((x.size(1),), dtype=torch.float32).uniform_(0, 1) >= drop_prob
+    return _apply_keep(x, keep.to(device, torch.float32))
+
+
 def dropout_feature(x: torch.FloatTensor, drop_prob: float) -> torch.FloatTensor:
+    if isinstance(x, SparseTensor):
+        return x.set_value(F.dropout(x.storage.value(), p=1. - drop_prob), layout='coo')
     return F.dropout(x, p=1. - drop_prob)
 
 
 class AugmentTopologyAttributes(object):
-    def __init__(self, pe=0.5, pf=0.5):
+    def __init__(self, pe=0.5, pf=0.5, lazy=False):
         self.pe = pe
         self.pf = pf
+        self.lazy = lazy
 
     def __call__(self, x, edge_index):
         edge_index = dropout_adj(edge_index, p=self.pe)[0]
-        x = drop_feature(x, self.pf)
+        x = mask_feature(x, self.pf) if self.lazy else drop_feature(x, self.pf)
         return x, edge_index
 
 
@@ -131,6 +176,16 @@ def drop_feature_by_weight(x, weights, drop_prob: float, threshold: float = 0.7)
     return x
 
 
+def mask_feature_by_weight(x, weights, drop_prob: float, threshold: float = 0.7) -> MaskedFeatures:
+    """
+    Lazy counterpart of ``drop_feature_by_weight``, see ``mask_feature``.
+    """
+    weights = weights / weights.mean() * drop_prob
+    weights = weights.where(weights < threshold, torch.ones_like(weights) * threshold)  # clip
+    keep = 1. - torch.bernoulli(weights)
+    return _apply_keep(x, keep)
+
+
 def get_eigenvector_weights(data):
     def _eigenvector_centrality(data):
         graph = to_networkx(data)
@@ -198,16 +253,20 @@ def drop_edge_by_weight(edge_index, weights, drop_prob: float, threshold: float
 
 
 class AdaptivelyAugmentTopologyAttributes(object):
-    def __init__(self, edge_weights, feature_weights, pe=0.5, pf=0.5, threshold=0.7):
+    def __init__(self, edge_weights, feature_weights, pe=0.5, pf=0.5, threshold=0.7, lazy=False):
         self.edge_weights = edge_weights
         self.feature_weights = feature_weights
         self.pe = pe
         self.pf = pf
         self.threshold = threshold
+        self.lazy = lazy
 
     def __call__(self, x, edge_index):
         edge_index = drop_edge_by_weight(edge_index, self.edge_weights, self.pe, self.threshold)
-        x = drop_feature_by_weight(x, self.feature_weights, self.pf, self.threshold)
+        if self.lazy:
+            x = mask_feature_by_weight(x, self.feature_weights, self.pf, self.threshold)
+        else:
+            x = drop_feature_by_weight(x, self.feature_weights, self.pf, self.threshold)
 
         return x, edge_index
 
@@ -1,5 +1,7 @@
 from libgptb.data.utils import get_dataset
+from libgptb.data.loader import get_node_loader
 
 __all__ = [
-    "get_dataset"
+    "get_dataset",
+    "get_node_loader"
 ]
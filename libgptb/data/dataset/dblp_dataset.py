@@ -37,8 +37,6 @@ class DBLPDataset(DGLDataset):
         # 使用提供的键来构造特征矩阵
         features = sp.csr_matrix((data['attr_data'], data['attr_indices'], data['attr_indptr']), shape=data['attr_shape'])
         
-        # 转换为密集矩阵格式
-        features = features.todense()
 
         # 读取标签
         labels = data['labels']
@@ -48,7 +46,8 @@ class DBLPDataset(DGLDataset):
         g = dgl.add_self_loop(g)
 
         # 添加节点特征和标签
-        g.ndata['feat'] = torch.FloatTensor(features)
+        # DGL 的节点特征只能是稠密张量，这里从 CSR 直接生成 float32 矩阵，避免 todense 的额外拷贝
+        g.ndata['feat'] = torch.from_numpy(features.astype(np.float32).toarray())
         g.ndata['label'] = torch.LongTensor(labels)
 
         # 如果有转换函数，则应用它
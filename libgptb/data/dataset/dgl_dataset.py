@@ -20,6 +20,7 @@ class DGLDataset(AbstractDataset):
     def _load_data(self):
         device = torch.device('cuda')
         path = osp.join(osp.expanduser('~'), 'datasets')
+        self.data_dir = osp.join(path, self.datasetName)
 
 
         if self.datasetName in ["Cora", "CiteSeer", "PubMed"]:
@@ -51,5 +52,5 @@ class DGLDataset(AbstractDataset):
         Returns:
             dict: 包含数据集的相关特征的字典
         """
-        return {"input_dim": self.data.ndata['feat'].shape[1]}
+        return {"input_dim": self.data.ndata['feat'].shape[1], "data_dir": self.data_dir}
     
@@ -1,13 +1,71 @@
 import torch
 import os.path as osp
 import os
+import pickle
 import pandas as pd
 import numpy as np
+import scipy.sparse as sp
 import datetime
 from logging import getLogger
 import torch_geometric.transforms as T
 from libgptb.data.dataset.abstract_dataset import AbstractDataset
 import importlib
+from torch_sparse import SparseTensor
+
+
+def normalize_sparse_features(x):
+    """
+    Row-normalise sparse node features to sum to one, like ``T.NormalizeFeatures``
+    on non-negative features, without densifying them.
+
+    Args:
+        x(SparseTensor): node features, shape (N, F)
+
+    Returns:
+        SparseTensor: the normalised features
+    """
+    row_sum = x.sum(dim=1).clamp(min=1.)
+    return x.set_value(x.storage.value() / row_sum[x.storage.row()], layout='coo')
+
+
+def read_sparse_features(dataset):
+    """
+    Node features of a PyG citation or co-purchase dataset read from its raw
+    CSR files, in the node order and with the values of the processed dataset,
+    without ever densifying them.
+
+    Args:
+        dataset(InMemoryDataset): Planetoid, Amazon, Coauthor or CitationFull dataset
+
+    Returns:
+        SparseTensor: node features, shape (N, F)
+    """
+    if type(dataset).__name__ == 'Planetoid':
+        prefix = osp.join(dataset.raw_dir, 'ind.{}.'.format(dataset.name.lower()))
+
+        def read(name):
+            with open(prefix + name, 'rb') as f:
+                return pickle.load(f, encoding='latin1')
+
+        allx, tx = read('allx'), read('tx')
+        test_index = np.loadtxt(prefix + 'test.index', dtype=np.int64)
+        sorted_test_index = np.sort(test_index)
+        if dataset.name.lower() == 'citeseer':
+            # isolated test nodes have no raw features, as in torch_geometric's reader
+            tx_ext = sp.lil_matrix((sorted_test_index[-1] - sorted_test_index[0] + 1, tx.shape[1]))
+            tx_ext[sorted_test_index - sorted_test_index[0], :] = tx
+            tx = tx_ext
+        x = sp.vstack([allx, tx]).tocsr()
+        perm = np.arange(x.shape[0])
+        perm[test_index] = sorted_test_index
+        x = x[perm]
+    else:
+        # binarised like torch_geometric's read_npz
+        with np.load(dataset.raw_paths[0]) as f:
+            x = sp.csr_matrix((f['attr_data'], f['attr_indices'], f['attr_indptr']), f['attr_shape'])
+        x.data = (x.data > 0).astype(np.float32)
+        x.eliminate_zeros()
+    return SparseTensor.from_scipy(x.astype(np.float32))
 
 
 class PyGDataset(AbstractDataset):
@@ -19,6 +77,7 @@ class PyGDataset(AbstractDataset):
     def _load_data(self):
         device = torch.device('cuda')
         path = osp.join(os.getcwd(), 'raw_data')
+        self.data_dir = osp.join(path, self.datasetName)
 
         if self.datasetName in ["Cora", "CiteSeer", "PubMed"]:
             pyg = getattr(importlib.import_module('torch_geometric.datasets'), 'Planetoid')
@@ -28,8 +87,35 @@ class PyGDataset(AbstractDataset):
             pyg = getattr(importlib.import_module('torch_geometric.datasets'), 'Coauthor')
         if self.datasetName in ["DBLP"]:
             pyg = getattr(importlib.import_module('torch_geometric.datasets'), 'CitationFull')
-        self.dataset = pyg(path, name=self.datasetName, transform=T.NormalizeFeatures())
-        self.data = self.dataset[0].to(device)
+        self.sparse_features = self.config.get('sparse_features', False)
+        if self.sparse_features:
+            self.data = self._load_sparse(pyg, path)
+        else:
+            self.dataset = pyg(path, name=self.datasetName, transform=T.NormalizeFeatures())
+            self.data = self.dataset[0]
+        self.num_features = self.data.x.size(1)
+        self.data = self.data.to(device)
+
+    def _load_sparse(self, pyg, path):
+        """
+        the graph with sparse features, cached in ``data_dir/sparse/data.pt``. The
+        first run still loads the dense processed dataset for the structure, the
+        features are built from the raw CSR files; later runs load no dense features.
+        """
+        cache_file = osp.join(self.data_dir, 'sparse', 'data.pt')
+        if osp.exists(cache_file):
+            getLogger().info('Loaded the graph with sparse features from {}'.format(cache_file))
+            return torch.load(cache_file)
+        dataset = pyg(path, name=self.datasetName)
+        data = dataset[0]
+        x = read_sparse_features(dataset)
+        assert x.sparse_sizes() == tuple(data.x.shape), 'raw features do not match the processed dataset'
+        data.x = normalize_sparse_features(x)
+        del dataset
+        os.makedirs(osp.dirname(cache_file), exist_ok=True)
+        torch.save(data, cache_file)
+        getLogger().info('Saved the graph with sparse features to {}'.format(cache_file))
+        return data
         
     
     def get_data(self):
@@ -43,5 +129,5 @@ class PyGDataset(AbstractDataset):
         Returns:
             dict: 包含数据集的相关特征的字典
         """
-        return {"input_dim": self.dataset.num_features}
+        return {"input_dim": self.num_features, "data_dir": self.data_dir}
     
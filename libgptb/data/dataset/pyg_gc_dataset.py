@@ -9,6 +9,7 @@ import torch_geometric.transforms as T
 from libgptb.data.dataset.abstract_dataset import AbstractDataset
 import importlib
 from torch_geometric.loader import DataLoader
+from libgptb.data.loader import DeviceGraphLoader, IndexedGraphDataset, get_bucket_sampler
 
 
 class PyGGCDataset(AbstractDataset):
@@ -24,7 +25,17 @@ class PyGGCDataset(AbstractDataset):
         if self.datasetName in ["IMDB-BINARY","IMDB-MULTI","REDDIT-BINARY", "REDDIT-MULTI-5K" ,"MUTAG", "NCI1", "PROTEINS", "COLLAB", "PTC_MR", "GITHUB_STARGAZER"] and self.config['model']!='JOAO':
             pyg = getattr(importlib.import_module('torch_geometric.datasets'), 'TUDataset')
             self.dataset = pyg(path, name=self.datasetName, transform=T.NormalizeFeatures())
-            self.data = DataLoader(self.dataset, batch_size=128)
+            # size-bucketed batches under a node budget, fixed 128 graphs if None
+            sampler = get_bucket_sampler(self.config, self.dataset)
+            if self.config.get('graph_loader', 'pyg') == 'device':
+                # collated once and kept on the training device, batches are slices
+                self.data = DeviceGraphLoader(self.dataset, 128, self.config.get('device', torch.device('cpu')),
+                                              batch_sampler=sampler)
+            elif sampler is not None:
+                # the batches are not in dataset order, their graphs carry their index
+                self.data = DataLoader(IndexedGraphDataset(self.dataset), batch_sampler=sampler)
+            else:
+                self.data = DataLoader(self.dataset, batch_size=128)
         if self.config['model']=='JOAO':
             pyg = getattr(importlib.import_module('aug'), 'TUDataset_aug')
             self.dataset = pyg(path, name=self.datasetName, transform=T.NormalizeFeatures(),aug='minmax')
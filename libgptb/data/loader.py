@@ -0,0 +1,366 @@
+import copy
+import os
+
+import dgl
+import numpy as np
+import torch
+from torch_geometric.data import Batch, Data
+from torch_geometric.loader import NeighborLoader
+
+from libgptb.data.partition import get_partition
+
+
+def get_node_loader(config, data, device=None, data_dir=None, features=None):
+    """
+    according the config['batch_mode'] to create the subgraph loader used by the
+    node-level executors
+
+    Args:
+        config(ConfigParser): config
+        data(Data or DGLGraph): the whole graph
+        device(torch.device): device the sampled subgraphs are moved to
+        data_dir(str): directory of the dataset, graph partitions are cached below it
+        features(np.memmap or torch.Tensor): precomputed node inputs that need no
+            graph, e.g. the hops of a SIGN encoder
+
+    Returns:
+        NeighborSubgraphLoader, ClusterSubgraphLoader or FeatureBatchLoader: the
+        loader, or None for full-batch training
+    """
+    batch_mode = config.get('batch_mode', 'full')
+    if features is not None:
+        # no neighbourhood is needed, so any batch mode is a plain node mini-batch
+        batch_size = features.shape[0] if batch_mode == 'full' else config.get('batch_size', None) or 1024
+        return FeatureBatchLoader(features, batch_size, isinstance(data, dgl.DGLGraph), device=device)
+    if batch_mode == 'full':
+        return None
+    batch_size = config.get('batch_size', None) or 1024
+    num_workers = config.get('num_workers', 0)
+    if batch_mode == 'neighbor_sample':
+        fanouts = config.get('fanouts', [10] * config.get('layers', 2))
+        return NeighborSubgraphLoader(data, fanouts, batch_size, device=device, num_workers=num_workers)
+    if batch_mode == 'cluster':
+        num_parts = config.get('num_parts', 100)
+        cache_dir = None if data_dir is None else os.path.join(data_dir, 'partition')
+        part = get_partition(data, num_parts, config.get('partition_method', 'metis'), cache_dir)
+        return ClusterSubgraphLoader(data, part, num_parts, config.get('clusters_per_batch', 10), device=device)
+    raise ValueError('batch_mode {} is not supported'.format(batch_mode))
+
+
+class NeighborSubgraphLoader(object):
+    """
+    Iterate over random seed-node batches of a single graph. Every item is a tuple
+    ``(subgraph, num_seeds)`` where the seed nodes are the first ``num_seeds`` nodes of
+    the sampled subgraph, so a contrastive loss can be restricted to ``z[:num_seeds]``.
+
+    PyG graphs are sampled with ``NeighborLoader``; DGL graphs with
+    ``MultiLayerNeighborSampler``, whose message flow graphs are merged back into one
+    homogeneous graph so the existing encoders can run on it unchanged.
+    """
+
+    def __init__(self, data, fanouts, batch_size, shuffle=True, device=None, num_workers=0):
+        self.is_dgl = isinstance(data, dgl.DGLGraph)
+        self.device = device
+        if self.is_dgl:
+            self.graph = data.to('cpu')
+            sampler = dgl.dataloading.MultiLayerNeighborSampler(fanouts)
+            self.loader = dgl.dataloading.DataLoader(
+                self.graph, torch.arange(self.graph.num_nodes()), sampler,
+                batch_size=batch_size, shuffle=shuffle, drop_last=False, num_workers=num_workers)
+        else:
+            # Data.to works in place, so move a shallow copy to keep the executor's graph
+            self.loader = NeighborLoader(copy.copy(data).to('cpu'), num_neighbors=fanouts, batch_size=batch_size,
+                                         shuffle=shuffle, num_workers=num_workers)
+
+    def _merge_blocks(self, input_nodes, blocks):
+        # the destination nodes of a block are a prefix of its source nodes, so block-local
+        # ids of every layer index into ``input_nodes`` directly
+        src = torch.cat([block.edges()[0] for block in blocks])
+        dst = torch.cat([block.edges()[1] for block in blocks])
+        subgraph = dgl.to_simple(dgl.graph((src, dst), num_nodes=input_nodes.numel()))
+        for key, value in self.graph.ndata.items():
+            subgraph.ndata[key] = value[input_nodes]
+        return subgraph
+
+    def __iter__(self):
+        if self.is_dgl:
+            for input_nodes, output_nodes, blocks in self.loader:
+                subgraph = self._merge_blocks(input_nodes, blocks)
+                if self.device is not None:
+                    subgraph = subgraph.to(self.device)
+                yield subgraph, output_nodes.numel()
+        else:
+            for batch in self.loader:
+                if self.device is not None:
+                    batch = batch.to(self.device)
+                yield batch, batch.batch_size
+
+    def __len__(self):
+        return len(self.loader)
+
+
+class ClusterSubgraphLoader(object):
+    """
+    Cluster-GCN style batches: the graph is partitioned once and every item is the
+    subgraph induced by a random union of ``clusters_per_batch`` clusters, so the
+    edges between the chosen clusters are kept. Items are ``(subgraph, num_nodes)``
+    tuples, i.e. every node of the subgraph is a seed.
+    """
+
+    def __init__(self, data, part, num_parts, clusters_per_batch, shuffle=True, device=None):
+        self.is_dgl = isinstance(data, dgl.DGLGraph)
+        self.data = data.to('cpu') if self.is_dgl else copy.copy(data).to('cpu')
+        self.num_parts = num_parts
+        self.clusters_per_batch = clusters_per_batch
+        self.shuffle = shuffle
+        self.device = device
+        # nodes sorted by cluster, cluster c owns node_perm[partptr[c]:partptr[c + 1]]
+        self.node_perm = torch.argsort(part, stable=True)
+        self.partptr = torch.zeros(num_parts + 1, dtype=torch.long)
+        self.partptr[1:] = torch.cumsum(torch.bincount(part, minlength=num_parts), dim=0)
+
+    def _subgraph(self, clusters):
+        nodes = torch.cat([self.node_perm[self.partptr[c]:self.partptr[c + 1]] for c in clusters.tolist()])
+        if self.is_dgl:
+            return dgl.node_subgraph(self.data, nodes)
+        return self.data.subgraph(nodes)
+
+    def __iter__(self):
+        clusters = torch.randperm(self.num_parts) if self.shuffle else torch.arange(self.num_parts)
+        for chunk in clusters.split(self.clusters_per_batch):
+            subgraph = self._subgraph(chunk)
+            if self.device is not None:
+                subgraph = subgraph.to(self.device)
+            num_nodes = subgraph.num_nodes() if self.is_dgl else subgraph.num_nodes
+            yield subgraph, num_nodes
+
+    def __len__(self):
+        return (self.num_parts + self.clusters_per_batch - 1) // self.clusters_per_batch
+
+
+class FeatureBatchLoader(object):
+    """
+    Random node mini-batches of a precomputed feature matrix. Every item is an
+    edgeless graph holding the rows of the batch, in the format of the executor
+    (``Data.x`` or ``ndata['feat']``), and ``None`` seeds since every node is one.
+    Memory-mapped features are read in sorted row order.
+    """
+
+    def __init__(self, features, batch_size, is_dgl, shuffle=True, device=None):
+        self.features = features
+        self.batch_size = batch_size
+        self.is_dgl = is_dgl
+        self.shuffle = shuffle
+        self.device = device
+
+    def _rows(self, index):
+        if isinstance(self.features, np.memmap):
+            return torch.from_numpy(np.array(self.features[index.numpy()]))
+        return self.features[index.to(self.features.device)]
+
+    def __iter__(self):
+        num_nodes = self.features.shape[0]
+        order = torch.randperm(num_nodes) if self.shuffle else torch.arange(num_nodes)
+        for index in order.split(self.batch_size):
+            x = self._rows(index.sort().values)
+            if self.is_dgl:
+                batch = dgl.graph(([], []), num_nodes=x.size(0))
+                batch.ndata['feat'] = x.cpu()
+            else:
+                batch = Data(x=x, edge_index=torch.empty(2, 0, dtype=torch.long))
+            if self.device is not None:
+                batch = batch.to(self.device)
+            yield batch, None
+
+    def __len__(self):
+        return (self.features.shape[0] + self.batch_size - 1) // self.batch_size
+
+
+class BucketBatchSampler(object):
+    """
+    Size-aware batches of graph indices under a node (and optionally edge) budget.
+    Every epoch the graphs are shuffled and cut into buckets of ``bucket_size``
+    graphs; the graphs of a bucket are sorted by node count and packed greedily
+    into batches of at most ``max_nodes`` nodes and ``max_edges`` edges, so graphs
+    of similar size share a batch. A graph larger than the budget forms its own
+    batch. The batch order is shuffled as well. Usable as the ``batch_sampler`` of
+    a ``DataLoader``.
+
+    Args:
+        num_nodes(list): node count of every graph
+        num_edges(list): edge count of every graph
+        max_nodes(int): node budget of a batch
+        max_edges(int): edge budget of a batch, unlimited if None
+        bucket_size(int): number of graphs sorted together
+        shuffle(bool): whether to shuffle, batches are formed over the size-sorted
+            dataset otherwise; either way the graphs are not in dataset order, the
+            batches need their ``graph_index`` (see ``IndexedGraphDataset``)
+    """
+
+    def __init__(self, num_nodes, num_edges, max_nodes, max_edges=None, bucket_size=1024, shuffle=True):
+        self.num_nodes = torch.as_tensor(num_nodes, dtype=torch.long)
+        self.num_edges = torch.as_tensor(num_edges, dtype=torch.long)
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        self.bucket_size = bucket_size
+        self.shuffle = shuffle
+        # the batch count varies with the shuffling, the unshuffled packing estimates it
+        self._num_batches = len(self._pack(torch.argsort(self.num_nodes, stable=True)))
+
+    def _pack(self, order):
+        batches, batch = [], []
+        nodes = edges = 0
+        for i, n, e in zip(order.tolist(), self.num_nodes[order].tolist(), self.num_edges[order].tolist()):
+            over = nodes + n > self.max_nodes or (self.max_edges is not None and edges + e > self.max_edges)
+            if batch and over:
+                batches.append(batch)
+                batch, nodes, edges = [], 0, 0
+            batch.append(i)
+            nodes += n
+            edges += e
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def __iter__(self):
+        if not self.shuffle:
+            yield from self._pack(torch.argsort(self.num_nodes, stable=True))
+            return
+        perm = torch.randperm(self.num_nodes.numel())
+        batches = []
+        for bucket in perm.split(self.bucket_size):
+            bucket = bucket[torch.argsort(self.num_nodes[bucket], stable=True)]
+            batches += self._pack(bucket)
+        for i in torch.randperm(len(batches)).tolist():
+            yield batches[i]
+
+    def __len__(self):
+        return self._num_batches
+
+
+class IndexedGraphDataset(torch.utils.data.Dataset):
+    """
+    A graph dataset whose graphs carry their dataset index as ``graph_index``, so
+    that a batch formed in any order, e.g. by a ``BucketBatchSampler``, tells which
+    graphs it holds.
+
+    Args:
+        dataset(Dataset): PyG graph dataset
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        data = copy.copy(self.dataset[index])
+        data.graph_index = torch.tensor([index])
+        return data
+
+
+def get_bucket_sampler(config, dataset):
+    """
+    according the config['max_nodes_per_batch'] to create the size-bucketed batch
+    sampler of a graph-level dataset
+
+    Args:
+        config(ConfigParser): config
+        dataset(Dataset): PyG graph dataset
+
+    Returns:
+        BucketBatchSampler: the sampler, or None for fixed-size batches
+    """
+    max_nodes = config.get('max_nodes_per_batch', None)
+    if max_nodes is None:
+        return None
+    sizes = [(graph.num_nodes, graph.num_edges) for graph in dataset]
+    return BucketBatchSampler([n for n, _ in sizes], [e for _, e in sizes], max_nodes,
+                              max_edges=config.get('max_edges_per_batch', None),
+                              bucket_size=config.get('bucket_size', 1024))
+
+
+class DeviceGraphLoader(object):
+    """
+    Graph-level mini-batches of a whole dataset that is collated once into device
+    tensors (``x``, ``edge_index``, ``y`` and the node and edge offsets of every
+    graph); missing node features are filled with ones once. Every epoch the graphs
+    are reordered on the device by a random permutation, after which a batch is a
+    contiguous range of graphs, i.e. a slice of every tensor, so there is no
+    per-batch collation or host-to-device copy. Items are ``Data`` objects with
+    ``x``, ``edge_index``, ``y``, ``batch``, ``ptr``, ``num_graphs`` and
+    ``graph_index``, the dataset index of every graph of the batch. With a
+    ``batch_sampler`` the graphs are ordered batch after batch instead, and a batch
+    is the range of its graphs.
+
+    Args:
+        dataset(Dataset): PyG graph dataset
+        batch_size(int): number of graphs per batch
+        device(torch.device): device the dataset is kept on
+        shuffle(bool): whether to permute the graphs every epoch
+        batch_sampler(BucketBatchSampler): forms the batches, overrides ``batch_size``
+            and ``shuffle``
+    """
+
+    def __init__(self, dataset, batch_size, device, shuffle=True, batch_sampler=None):
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.batch_sampler = batch_sampler
+        data = Batch.from_data_list([dataset[i] for i in range(len(dataset))])
+        self.num_graphs = data.num_graphs
+        if data.x is None:
+            data.x = torch.ones((data.num_nodes, 1), dtype=torch.float32)
+        self.x = data.x.to(device)
+        self.edge_index = data.edge_index.to(device)
+        self.y = data.y.to(device)
+        self.ptr = data.ptr.to(device)
+        # edges are stored graph by graph as well
+        num_edges = torch.bincount(data.batch[data.edge_index[0]], minlength=self.num_graphs)
+        self.edge_ptr = torch.cat([num_edges.new_zeros(1), num_edges.cumsum(0)]).to(device)
+
+    @staticmethod
+    def _ranges(ptr, order, total):
+        # indices of the rows of the ``order``-ed segments of a CSR layout, and the new offsets
+        counts = ptr[1:][order] - ptr[:-1][order]
+        new_ptr = torch.cat([counts.new_zeros(1), counts.cumsum(0)])
+        index = torch.arange(total, device=ptr.device)
+        index += torch.repeat_interleave(ptr[:-1][order] - new_ptr[:-1], counts)
+        return index, new_ptr
+
+    def _permute(self, order):
+        node_index, ptr = self._ranges(self.ptr, order, self.x.size(0))
+        edge_index, edge_ptr = self._ranges(self.edge_ptr, order, self.edge_index.size(1))
+        relabel = torch.empty_like(node_index)
+        relabel[node_index] = torch.arange(node_index.numel(), device=node_index.device)
+        return (self.x[node_index], relabel[self.edge_index[:, edge_index]], self.y[order], ptr, edge_ptr)
+
+    def __iter__(self):
+        bounds = list(range(0, self.num_graphs, self.batch_size)) + [self.num_graphs]
+        if self.batch_sampler is not None:
+            batches = list(self.batch_sampler)
+            order = torch.tensor([i for batch in batches for i in batch], device=self.ptr.device)
+            bounds = np.cumsum([0] + [len(batch) for batch in batches]).tolist()
+            x, edge_index, y, ptr, edge_ptr = self._permute(order)
+        elif self.shuffle:
+            order = torch.randperm(self.num_graphs, device=self.ptr.device)
+            x, edge_index, y, ptr, edge_ptr = self._permute(order)
+        else:
+            order = torch.arange(self.num_graphs, device=self.ptr.device)
+            x, edge_index, y, ptr, edge_ptr = self.x, self.edge_index, self.y, self.ptr, self.edge_ptr
+        counts = ptr[1:] - ptr[:-1]
+        batch = torch.repeat_interleave(torch.arange(self.num_graphs, device=ptr.device), counts)
+        # a single transfer of the offsets drives the slicing of the whole epoch
+        offsets, edge_offsets = ptr.tolist(), edge_ptr.tolist()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            lo, hi = offsets[start], offsets[end]
+            data = Data(x=x[lo:hi], edge_index=edge_index[:, edge_offsets[start]:edge_offsets[end]] - lo,
+                        y=y[start:end], batch=batch[lo:hi] - start, ptr=ptr[start:end + 1] - lo)
+            data.num_graphs = end - start
+            data.graph_index = order[start:end]
+            yield data
+
+    def __len__(self):
+        if self.batch_sampler is not None:
+            return len(self.batch_sampler)
+        return (self.num_graphs + self.batch_size - 1) // self.batch_size
@@ -0,0 +1,166 @@
+import math
+import os
+import os.path as osp
+from logging import getLogger
+
+import dgl
+import torch
+from torch_geometric.data import Data
+from torch_geometric.loader import ClusterData
+
+
+def get_partition(data, num_parts, method='metis', cache_dir=None):
+    """
+    partition the nodes of a graph into ``num_parts`` clusters. The assignment is
+    cached in ``cache_dir`` so it is computed once per dataset.
+
+    Args:
+        data(Data or DGLGraph): the whole graph
+        num_parts(int): number of clusters
+        method(str): ``metis``, falling back to ``lp`` when METIS is unavailable,
+            or ``lp`` for the built-in label-propagation partitioner
+        cache_dir(str): directory the assignment is stored in, named after the
+            method that produced it, no caching if None
+
+    Returns:
+        torch.LongTensor: cluster id of every node, shape (N,)
+    """
+    _logger = getLogger()
+    if method not in ['metis', 'lp']:
+        raise ValueError('partition method {} is not supported'.format(method))
+    num_nodes = data.num_nodes() if isinstance(data, dgl.DGLGraph) else data.num_nodes
+    part = _load_partition(cache_dir, method, num_parts, num_nodes)
+    if part is not None:
+        return part
+
+    if method == 'metis':
+        try:
+            part = metis_partition(data, num_parts)
+        except (ImportError, RuntimeError, AttributeError) as e:
+            # the result is cached as an lp partition, a later run with METIS recomputes it
+            _logger.warning('METIS is unavailable ({}), falling back to label propagation'.format(e))
+            method = 'lp'
+            part = _load_partition(cache_dir, method, num_parts, num_nodes)
+            if part is not None:
+                return part
+    if part is None:
+        if isinstance(data, dgl.DGLGraph):
+            edge_index = torch.stack(data.edges())
+        else:
+            edge_index = data.edge_index
+        part = label_propagation_partition(edge_index, num_nodes, num_parts)
+
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        cache_file = _partition_file(cache_dir, method, num_parts)
+        torch.save(part, cache_file)
+        _logger.info('Saved {} graph partition to {}'.format(method, cache_file))
+    return part
+
+
+def _partition_file(cache_dir, method, num_parts):
+    # named after the method that produced the partition
+    return osp.join(cache_dir, 'partition_{}_{}.pt'.format(method, num_parts))
+
+
+def _load_partition(cache_dir, method, num_parts, num_nodes):
+    if cache_dir is None:
+        return None
+    cache_file = _partition_file(cache_dir, method, num_parts)
+    if not osp.exists(cache_file):
+        return None
+    part = torch.load(cache_file)
+    if part.numel() != num_nodes:
+        return None
+    getLogger().info('Loaded {} graph partition from {}'.format(method, cache_file))
+    return part
+
+
+def metis_partition(data, num_parts):
+    """
+    METIS partitioning through ``dgl.metis_partition_assignment`` for DGL graphs and
+    ``ClusterData`` for PyG graphs.
+
+    Args:
+        data(Data or DGLGraph): the whole graph
+        num_parts(int): number of clusters
+
+    Returns:
+        torch.LongTensor: cluster id of every node, shape (N,)
+    """
+    if isinstance(data, dgl.DGLGraph):
+        return dgl.metis_partition_assignment(data.to('cpu'), num_parts).long()
+    cluster_data = ClusterData(_structure_only(data), num_parts, log=False)
+    # newer PyG keeps the permutation in ``cluster_data.partition``
+    partition = getattr(cluster_data, 'partition', cluster_data)
+    perm = getattr(partition, 'node_perm', None)
+    if perm is None:
+        perm = partition.perm
+    sizes = partition.partptr[1:] - partition.partptr[:-1]
+    part = torch.empty(data.num_nodes, dtype=torch.long)
+    part[perm] = torch.repeat_interleave(torch.arange(num_parts), sizes)
+    return part
+
+
+def _structure_only(data):
+    # ClusterData permutes every node attribute; only the connectivity is needed here
+    return Data(edge_index=data.edge_index.cpu(), num_nodes=data.num_nodes)
+
+
+def label_propagation_partition(edge_index, num_nodes, num_parts, num_iters=10, imbalance=0.1, seed=0):
+    """
+    Size-constrained label propagation. Nodes start in random balanced clusters and,
+    for ``num_iters`` rounds, move to the cluster most of their neighbours are in as
+    long as that cluster stays below ``(1 + imbalance) * N / num_parts`` nodes.
+    Runs in O(E) memory per round.
+
+    Args:
+        edge_index(torch.LongTensor): graph connectivity
+        num_nodes(int): number of nodes
+        num_parts(int): number of clusters
+        num_iters(int): number of propagation rounds
+        imbalance(float): allowed relative excess of a cluster over the mean size
+        seed(int): seed of the initial assignment
+
+    Returns:
+        torch.LongTensor: cluster id of every node, shape (N,)
+    """
+    generator = torch.Generator().manual_seed(seed)
+    row, col = edge_index.cpu()
+    part = torch.randperm(num_nodes, generator=generator) % num_parts
+    capacity = int(math.ceil((1 + imbalance) * num_nodes / num_parts))
+
+    for _ in range(num_iters):
+        # number of neighbours of every node in every cluster, as sorted (node, cluster) keys
+        key, count = torch.unique(row * num_parts + part[col], return_counts=True)
+        node = key // num_parts
+
+        # best cluster per node: order by node, then by count descending
+        order = torch.argsort(count, descending=True, stable=True)
+        order = order[torch.argsort(node[order], stable=True)]
+        first = torch.ones(order.numel(), dtype=torch.bool)
+        first[1:] = node[order][1:] != node[order][:-1]
+        best = order[first]
+        cand_node, cand_part, cand_count = node[best], key[best] % num_parts, count[best]
+
+        # neighbours already in the current cluster
+        cur_key = cand_node * num_parts + part[cand_node]
+        pos = torch.searchsorted(key, cur_key).clamp(max=key.numel() - 1)
+        cur_count = torch.where(key[pos] == cur_key, count[pos], torch.zeros_like(count[pos]))
+
+        gain = cand_count - cur_count
+        move = (cand_part != part[cand_node]) & (gain > 0)
+        if not move.any():
+            break
+        cand_node, cand_part, gain = cand_node[move], cand_part[move], gain[move]
+
+        # admit the largest gains of every target cluster up to its free capacity
+        order = torch.argsort(gain, descending=True, stable=True)
+        order = order[torch.argsort(cand_part[order], stable=True)]
+        target = cand_part[order]
+        group_start = torch.searchsorted(target, target)
+        rank = torch.arange(target.numel()) - group_start
+        free = (capacity - torch.bincount(part, minlength=num_parts)).clamp(min=0)
+        admitted = order[rank < free[target]]
+        part[cand_node[admitted]] = cand_part[admitted]
+    return part
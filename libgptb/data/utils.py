@@ -6,6 +6,9 @@ import copy
 from libgptb.data.list_dataset import ListDataset
 from libgptb.data.batch import Batch, BatchPAD
 
+# models whose encoders take torch_sparse node features, see ``sparse_features``
+SPARSE_FEATURE_MODELS = ['DGI', 'MVGRL', 'BGRL', 'GBT', 'COSTA']
+
 
 def get_dataset(config):
     """
@@ -17,6 +20,9 @@ def get_dataset(config):
     Returns:
         AbstractDataset: the loaded dataset
     """
+    if config.get('sparse_features', False) and config.get('model') not in SPARSE_FEATURE_MODELS:
+        raise ValueError('sparse_features is only supported by the models {}, not by {}'.
+                         format(', '.join(SPARSE_FEATURE_MODELS), config.get('model')))
     try:
         return getattr(importlib.import_module('libgptb.data.dataset'),
                        config['dataset_class'])(config)
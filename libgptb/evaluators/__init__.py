@@ -1,5 +1,5 @@
 from libgptb.evaluators.eval import get_split, from_predefined_split
-from libgptb.evaluators.logistic_regression import LREvaluator
+from libgptb.evaluators.logistic_regression import LREvaluator, BatchedLREvaluator
 from libgptb.evaluators.svm import SVMEvaluator
 from libgptb.evaluators.random_forest import RFEvaluator
 from libgptb.evaluators.base_evaluator import BaseEvaluator
@@ -9,6 +9,7 @@ __all__ = [
     'BaseEvaluator',
     'BaseSKLearnEvaluator',
     'LREvaluator',
+    'BatchedLREvaluator',
     'SVMEvaluator',
     'RFEvaluator',
     'get_split',
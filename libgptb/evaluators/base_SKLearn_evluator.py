@@ -2,10 +2,10 @@ import torch
 import numpy as np
 
 from abc import ABC, abstractmethod
-from sklearn.metrics import f1_score
 from sklearn.model_selection import PredefinedSplit, GridSearchCV
 from libgptb.evaluators.base_evaluator import BaseEvaluator
 from libgptb.evaluators.eval import split_to_numpy,get_predefined_split
+from libgptb.evaluators.metrics import f1_scores
 
 class BaseSKLearnEvaluator(BaseEvaluator):
     def __init__(self, evaluator, params):
@@ -17,8 +17,8 @@ class BaseSKLearnEvaluator(BaseEvaluator):
         ps, [x_train, y_train] = get_predefined_split(x_train, x_val, y_train, y_val)
         classifier = GridSearchCV(self.evaluator, self.params, cv=ps, scoring='accuracy', verbose=0)
         classifier.fit(x_train, y_train)
-        test_macro = f1_score(y_test, classifier.predict(x_test), average='macro')
-        test_micro = f1_score(y_test, classifier.predict(x_test), average='micro')
+        test_micro, test_macro = f1_scores(torch.as_tensor(y_test), torch.as_tensor(classifier.predict(x_test)))
+        test_micro, test_macro = test_micro.item(), test_macro.item()
 
         return {
             'micro_f1': test_micro,
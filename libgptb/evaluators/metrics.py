@@ -0,0 +1,117 @@
+import torch
+
+
+def _encode_labels(y_true, y_pred):
+    """
+    map arbitrary integer labels, e.g. -1 and 1, to 0..C-1 in sorted order, as
+    sklearn's unique_labels does; a host synchronisation
+
+    Returns:
+        tuple: the encoded y_true and y_pred, and C
+    """
+    values, inverse = torch.unique(torch.cat([y_true.reshape(-1), y_pred.reshape(-1)]), return_inverse=True)
+    return inverse[:y_true.numel()].view_as(y_true), inverse[y_true.numel():].view_as(y_pred), values.numel()
+
+
+def confusion_matrix(y_true, y_pred, num_classes=None):
+    """
+    confusion matrix of single-label predictions, on the device of the labels
+
+    Args:
+        y_true(torch.LongTensor): labels, shape (n,)
+        y_pred(torch.LongTensor): predicted classes, shape (n,)
+        num_classes(int): number of classes, the labels are then 0..C-1; if None
+            the classes are the sorted labels occurring in y_true or y_pred
+
+    Returns:
+        torch.LongTensor: (C, C) counts, rows are the labels and columns the predictions
+    """
+    if num_classes is None:
+        y_true, y_pred, num_classes = _encode_labels(y_true, y_pred)
+    return torch.bincount(y_true * num_classes + y_pred, minlength=num_classes ** 2).view(num_classes, num_classes)
+
+
+def accuracy(y_true, y_pred):
+    """
+    share of correct predictions, as sklearn's accuracy_score
+
+    Returns:
+        torch.Tensor: 0-dim tensor on the device of the labels
+    """
+    return (y_pred == y_true).float().mean()
+
+
+def f1_scores(y_true, y_pred, num_classes=None):
+    """
+    micro and macro F1 of single-label predictions, as sklearn's f1_score: the
+    macro average runs over the classes occurring in y_true or y_pred, and the
+    micro F1 equals the accuracy
+
+    Args:
+        y_true(torch.LongTensor): labels, shape (n,)
+        y_pred(torch.LongTensor): predicted classes, shape (n,)
+        num_classes(int): number of classes, the labels are then 0..C-1; if None
+            any integer labels are accepted at the cost of a host synchronisation
+
+    Returns:
+        tuple: 0-dim tensors of the micro and macro F1
+    """
+    micro, macro = batched_f1_scores(y_true, y_pred.unsqueeze(0), num_classes)
+    return micro[0], macro[0]
+
+
+def batched_f1_scores(y_true, y_pred, num_classes=None):
+    """
+    ``f1_scores`` of the predictions of H classifiers of the same samples at once
+
+    Args:
+        y_true(torch.LongTensor): labels, shape (n,)
+        y_pred(torch.LongTensor): predicted classes, shape (H, n)
+        num_classes(int): number of classes, the labels are then 0..C-1; if None
+            any integer labels are accepted
+
+    Returns:
+        tuple: micro and macro F1 of every classifier, each of shape (H,)
+    """
+    if num_classes is None:
+        y_true, y_pred, num_classes = _encode_labels(y_true, y_pred)
+    num_heads = y_pred.size(0)
+    # the diagonal and the column sums of every confusion matrix, from one bincount each
+    offset = torch.arange(num_heads, device=y_pred.device).unsqueeze(1) * num_classes
+    correct = y_pred == y_true
+    tp = torch.bincount((offset + y_true)[correct], minlength=num_heads * num_classes)
+    predicted = torch.bincount((offset + y_pred).view(-1), minlength=num_heads * num_classes)
+    tp, predicted = tp.view(num_heads, num_classes).float(), predicted.view(num_heads, num_classes).float()
+    support = torch.bincount(y_true, minlength=num_classes).float()
+    present = (support + predicted) > 0
+    f1 = 2 * tp / (support + predicted).clamp(min=1)
+    return correct.float().mean(dim=1), (f1 * present).sum(dim=1) / present.sum(dim=1)
+
+
+def _binary_auc(positive, scores):
+    # Mann-Whitney U of the average ranks, ties counting one half as in sklearn
+    _, inverse, counts = torch.unique(scores, return_inverse=True, return_counts=True)
+    counts = counts.double()
+    ranks = (torch.cumsum(counts, dim=0) - (counts - 1) / 2)[inverse]
+    num_pos = positive.sum().double()
+    num_neg = positive.numel() - num_pos
+    return (ranks[positive].sum() - num_pos * (num_pos + 1) / 2) / (num_pos * num_neg)
+
+
+def roc_auc(y_true, scores):
+    """
+    area under the ROC curve, as sklearn's roc_auc_score: binary for 1-dim
+    scores of the positive class, the macro one-vs-rest average for (n, C)
+    class scores
+
+    Args:
+        y_true(torch.LongTensor): labels, shape (n,), 0 or 1 in the binary case
+        scores(torch.Tensor): scores, shape (n,) or (n, C)
+
+    Returns:
+        torch.Tensor: 0-dim double tensor, nan if a class has no positive or no
+        negative sample, where sklearn raises
+    """
+    if scores.dim() == 1:
+        return _binary_auc(y_true == 1, scores)
+    return torch.stack([_binary_auc(y_true == c, scores[:, c]) for c in range(scores.size(1))]).mean()
@@ -1,3 +1,6 @@
+from libgptb.executors.trainer import GCLTrainer
+from libgptb.executors.dgl_trainer import DGLTwoViewTrainer
+from libgptb.executors.graph_trainer import GraphTrainer
 from libgptb.executors.DGI_executor import DGIExecutor
 from libgptb.executors.SUGRL_executor import SUGRLExecutor
 from libgptb.executors.CCA_executor import CCAExecutor
@@ -15,6 +18,9 @@ from libgptb.executors.GraphMAE_executor import GraphMAEExecutor
 
 
 __all__ = [
+    "GCLTrainer",
+    "DGLTwoViewTrainer",
+    "GraphTrainer",
     "DGIExecutor",
     "CCAExecutor",
     "SFAExecutor",
@@ -0,0 +1,165 @@
+import os
+import threading
+from logging import getLogger
+
+import torch
+
+
+def get_checkpoint_manager(config, cache_dir):
+    """
+    according the config to create the CheckpointManager of an executor
+
+    Args:
+        config(ConfigParser): config
+        cache_dir(str): directory of the model cache
+
+    Returns:
+        CheckpointManager: the manager
+    """
+    path_format = cache_dir + '/' + config['model'] + '_' + config['dataset'] + '_epoch%d.tar'
+    return CheckpointManager(path_format, keep_last=config.get('checkpoint_keep_last', 1),
+                             async_write=config.get('checkpoint_async', True))
+
+
+def _to_cpu(obj):
+    # a copy that later optimizer steps cannot modify
+    if torch.is_tensor(obj):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return type(obj)((key, _to_cpu(value)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(value) for value in obj)
+    return obj
+
+
+class CheckpointManager(object):
+    """
+    Checkpoints written from a background thread. ``save`` snapshots the state to
+    CPU memory and returns at once. A "best so far" checkpoint that is still queued
+    when a newer one arrives is dropped, so only the latest is written. After every
+    write the files of this run that are neither the best, a milestone nor among
+    the ``keep_last`` most recent checkpoints are removed. Files written by
+    earlier runs are never touched.
+
+    Args:
+        path_format(str): checkpoint path with a ``%d`` for the epoch
+        keep_last(int): number of most recent checkpoints kept besides the best
+            one and the milestones
+        async_write(bool): write from a background thread, synchronously otherwise
+    """
+
+    def __init__(self, path_format, keep_last=1, async_write=True):
+        self.path_format = path_format
+        self.keep_last = keep_last
+        self.async_write = async_write
+        self._logger = getLogger()
+        self._cond = threading.Condition()
+        self._queue = []
+        self._writing = False
+        self._error = None
+        self._written = []
+        self._best = None
+        self._milestones = set()
+        self._thread = None
+
+    def path(self, epoch):
+        return self.path_format % epoch
+
+    def save(self, epoch, state, best=False, milestone=False):
+        """
+        queue a checkpoint
+
+        Args:
+            epoch(int): epoch of the checkpoint
+            state(dict): the state dicts, saved with ``torch.save``
+            best(bool): whether it is the best checkpoint so far
+            milestone(bool): whether it is always kept
+
+        Returns:
+            str: the path the checkpoint is written to
+        """
+        snapshot = _to_cpu(state)
+        with self._cond:
+            self._raise_error()
+            if milestone:
+                self._milestones.add(epoch)
+            for item in self._queue:
+                if item[0] == epoch:
+                    best = best or item[2]
+            queue = [item for item in self._queue if item[0] != epoch]
+            if best:
+                # a queued best that is not a milestone is superseded
+                queue = [item for item in queue if not item[2] or item[0] in self._milestones]
+            self._queue = queue + [(epoch, snapshot, best)]
+            if self.async_write and self._thread is None:
+                self._thread = threading.Thread(target=self._worker, daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        if not self.async_write:
+            while self._next() is not None:
+                pass
+            self.wait()
+        return self.path(epoch)
+
+    def wait(self):
+        """
+        block until every queued checkpoint is written
+        """
+        with self._cond:
+            while self._queue or self._writing:
+                self._cond.wait()
+            self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('writing a checkpoint failed') from error
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+            self._next()
+
+    def _next(self):
+        with self._cond:
+            if not self._queue:
+                return None
+            epoch, snapshot, best = self._queue.pop(0)
+            self._writing = True
+        try:
+            path = self.path(epoch)
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            # write then rename, a crash never leaves a truncated checkpoint
+            torch.save(snapshot, path + '.tmp')
+            os.replace(path + '.tmp', path)
+            with self._cond:
+                if epoch in self._written:
+                    self._written.remove(epoch)
+                self._written.append(epoch)
+                if best:
+                    self._best = epoch
+                self._retain()
+        except Exception as e:
+            self._logger.error('Writing the checkpoint of epoch {} failed: {}'.format(epoch, e))
+            with self._cond:
+                self._error = e
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+        return epoch
+
+    def _retain(self):
+        recent = self._written[-self.keep_last:] if self.keep_last > 0 else []
+        keep = []
+        for epoch in self._written:
+            if epoch in recent or epoch in self._milestones or epoch == self._best:
+                keep.append(epoch)
+                continue
+            try:
+                os.remove(self.path(epoch))
+            except OSError as e:
+                self._logger.warning('Removing the checkpoint of epoch {} failed: {}'.format(epoch, e))
+        self._written = keep
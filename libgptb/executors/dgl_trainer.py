@@ -0,0 +1,94 @@
+from libgptb.executors.trainer import GCLTrainer
+from libgptb.augmentors import EdgeRemovingDGL, FeatureMaskingDGL
+from libgptb.data import get_node_loader
+
+
+class DGLTwoViewTrainer(GCLTrainer):
+    """
+    DGL 节点级对比模型的训练引擎: 以边删除与特征遮蔽生成图的两个增强视图,
+    编码后交给对比损失。增强率由配置项 ``dfr`` 与 ``der`` 给出。
+    """
+
+    def __init__(self, config, model, data_feature):
+        super().__init__(config, model, data_feature)
+        self.dfr = self.config.get('dfr', 0.2)
+        self.der = self.config.get('der', 0.2)
+
+    def prepare(self, data):
+        """
+        构建增强与子图采样器, SIGN 编码器先预计算各跳特征
+
+        Args:
+            data(DGLGraph): 全图数据
+
+        Returns:
+            iterable: (整图或子图, 种子节点个数) 的序列
+        """
+        graph = data.to('cpu')
+
+        self.edgeremove = EdgeRemovingDGL(self.dfr)
+        self.featmask = FeatureMaskingDGL(self.der, lazy=self.config.get('lazy_feature_mask', False))
+        # subgraphs stay on the CPU, the augmented views are moved in _augment
+        features = self.sign_hops(graph) if self.sign else None
+        self.node_loader = get_node_loader(self.config, graph, data_dir=self.data_feature.get('data_dir'),
+                                           features=features)
+        return [(graph, None)] if self.node_loader is None else self.node_loader
+
+    def _augment(self, graph):
+        """
+        在 CPU 上生成图的两个增强视图，并移动到训练设备
+
+        Args:
+            graph(DGLGraph): 整图或采样得到的子图
+
+        Returns:
+            tuple: (graph1, graph2, feat1, feat2)
+        """
+        feat = graph.ndata['feat']
+        graph1 = self.edgeremove.augment(graph)
+        graph2 = self.edgeremove.augment(graph)
+        feat1 = self.featmask.augment(feat)
+        feat2 = self.featmask.augment(feat)
+
+        graph1 = graph1.add_self_loop().to(self.device)
+        graph2 = graph2.add_self_loop().to(self.device)
+        feat1 = feat1.to(self.device)
+        feat2 = feat2.to(self.device)
+        return graph1, graph2, feat1, feat2
+
+    def step(self, batch, epoch_idx):
+        """
+        计算一个 batch 的损失
+
+        Args:
+            batch: (整图或采样得到的子图, 子图中种子节点的个数), 种子节点排在最前, 整图训练时为 None
+            epoch_idx: 轮次数
+
+        Returns:
+            torch.Tensor: 该 batch 的损失
+        """
+        graph, num_seeds = batch
+        with self.profiler.phase('augment'):
+            graph1, graph2, feat1, feat2 = self._augment(graph)
+        with self.profiler.phase('encoder'):
+            z1, z2 = self.model.encoder_model(graph1, graph2, feat1, feat2)
+        if num_seeds is not None:
+            z1, z2 = z1[:num_seeds], z2[:num_seeds]
+        with self.profiler.phase('loss'):
+            return self.model.contrast_model(z1, z2)
+
+    def embed(self, data):
+        """
+        用当前模型计算全图的节点表示, 用于评估
+
+        Args:
+            data(DGLGraph): 全图数据
+
+        Returns:
+            tuple: 节点表示和节点标签
+        """
+        engine = self.inference_engine(data, self_loops=True)
+        self.model.encoder_model.eval()
+        # the SIGN encoder is pointwise over the precomputed hops
+        feat = self.sign_hops(data) if self.sign else data.ndata['feat'].to(self.device)
+        return engine.run(feat, self.model.gconv.inference_stages()), data.ndata['label']
@@ -0,0 +1,102 @@
+import os
+import os.path as osp
+
+import numpy as np
+import torch
+
+
+def get_embedding_store(config, exp_id):
+    """
+    according the config to create the EmbeddingStore of an executor
+
+    Args:
+        config(ConfigParser): config
+        exp_id(str): id of the experiment
+
+    Returns:
+        EmbeddingStore: the store
+    """
+    return EmbeddingStore('./libgptb/cache/{}/embedding_cache'.format(exp_id),
+                          dtype=config.get('embedding_store_dtype', 'float32'),
+                          enabled=config.get('embedding_store', True))
+
+
+class EmbeddingStore(object):
+    """
+    Evaluation embeddings of the milestone epochs, one ``.npy`` file per epoch that
+    is read back memory-mapped, so evaluating a milestone needs neither its
+    checkpoint nor a forward pass. Labels are stored next to the embeddings when
+    their order depends on the epoch, e.g. for shuffled graph batches.
+
+    Args:
+        root(str): directory of the stored embeddings
+        dtype(str): storage type, ``float32`` or ``float16`` for half the size
+        enabled(bool): a disabled store keeps nothing and finds nothing
+    """
+
+    def __init__(self, root, dtype='float32', enabled=True):
+        if dtype not in ['float32', 'float16']:
+            raise ValueError('embedding store dtype {} is not supported'.format(dtype))
+        self.root = root
+        self.dtype = np.dtype(dtype)
+        self.enabled = enabled
+
+    def clear(self):
+        """
+        drop every stored epoch, e.g. those of an earlier run with the same exp_id
+        """
+        if not osp.isdir(self.root):
+            return
+        for name in os.listdir(self.root):
+            if name.startswith('epoch') and (name.endswith('.npy') or name.endswith('.npy.tmp')):
+                os.remove(osp.join(self.root, name))
+
+    def _path(self, epoch, name):
+        return osp.join(self.root, 'epoch{}_{}.npy'.format(epoch, name))
+
+    def put(self, epoch, z, y=None):
+        """
+        store the embeddings of an epoch
+
+        Args:
+            epoch(int): epoch of the model that computed them
+            z(torch.Tensor): embeddings, shape (N, d)
+            y(torch.Tensor): labels in the order of ``z``, optional
+        """
+        if not self.enabled:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        if y is not None:
+            np.save(self._path(epoch, 'y'), y.cpu().numpy())
+        # the embeddings are renamed into place last, they mark a complete entry
+        path = self._path(epoch, 'z')
+        out = np.lib.format.open_memmap(path + '.tmp', mode='w+', dtype=self.dtype, shape=tuple(z.shape))
+        out[:] = z.detach().float().cpu().numpy()
+        out.flush()
+        del out
+        os.replace(path + '.tmp', path)
+
+    def get(self, epoch, device=None):
+        """
+        load the embeddings of an epoch
+
+        Args:
+            epoch(int): epoch of the model that computed them
+            device(torch.device): device the tensors are moved to, kept on the CPU if None
+
+        Returns:
+            tuple: embeddings as float32 and labels, None for what is not stored
+        """
+        path = self._path(epoch, 'z')
+        if not self.enabled or not osp.exists(path):
+            return None, None
+        # copy-on-write keeps the file read-only while giving torch a writable array;
+        # float32 entries stay memory-mapped, float16 ones are converted
+        z = torch.from_numpy(np.load(path, mmap_mode='c').astype(np.float32, copy=False))
+        y = None
+        if osp.exists(self._path(epoch, 'y')):
+            y = torch.from_numpy(np.load(self._path(epoch, 'y')))
+        if device is not None:
+            z = z.to(device)
+            y = None if y is None else y.to(device)
+        return z, y
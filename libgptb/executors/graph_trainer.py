@@ -0,0 +1,112 @@
+import torch
+from libgptb.executors.trainer import GCLTrainer
+from libgptb.evaluators import SVMEvaluator
+
+
+class GraphTrainer(GCLTrainer):
+    """
+    图级对比模型的训练引擎: 每个轮次遍历图数据的 Dataloader, 以线性 SVM 评估图表示。
+
+    子类实现 ``graph_loss`` (一个 batch 的损失) 与 ``graph_embed`` (一个 batch 的图表示)。
+    """
+
+    split_ratio = (0.8, 0.1)
+    loss_reduction = 'sum'
+
+    def _build_probe(self):
+        return SVMEvaluator(linear=True)
+
+    def prepare(self, data):
+        """
+        图数据的 Dataloader 本身即为每个轮次的 batch 序列
+
+        Args:
+            data: 图数据的 Dataloader
+
+        Returns:
+            iterable: 图的 batch
+        """
+        return data
+
+    def _to_device(self, batch):
+        """
+        把一个 batch 的图移动到训练设备, 没有节点特征的数据集以全 1 特征代替
+
+        Args:
+            batch: 一个 batch 的图
+
+        Returns:
+            Batch: 训练设备上的 batch
+        """
+        data = batch.to(self.device)
+        if data.x is None:
+            num_nodes = data.batch.size(0)
+            data.x = torch.ones((num_nodes, 1), dtype=torch.float32, device=data.batch.device)
+        return data
+
+    def graph_loss(self, data):
+        """
+        计算一个 batch 的对比损失, 由子类实现
+
+        Args:
+            data: 训练设备上的一个 batch 的图
+
+        Returns:
+            torch.Tensor: 该 batch 的损失
+        """
+        raise NotImplementedError
+
+    def graph_embed(self, data):
+        """
+        计算一个 batch 的图表示, 由子类实现
+
+        Args:
+            data: 训练设备上的一个 batch 的图
+
+        Returns:
+            torch.Tensor: 图表示
+        """
+        raise NotImplementedError
+
+    def step(self, batch, epoch_idx):
+        """
+        计算一个 batch 的损失
+
+        Args:
+            batch: 一个 batch 的图
+            epoch_idx: 轮次数
+
+        Returns:
+            torch.Tensor: 该 batch 的损失
+        """
+        return self.graph_loss(self._to_device(batch))
+
+    def embed(self, data):
+        """
+        用当前模型计算所有图的表示, 用于评估。Dataloader 打乱或按大小分组时,
+        batch 中的 ``graph_index`` 把表示放回数据集的顺序, 与固定的数据划分对应
+
+        Args:
+            data: 图数据的 Dataloader
+
+        Returns:
+            tuple: 按数据集顺序排列的图表示和对应的标签
+        """
+        self.model.encoder_model.eval()
+        x = []
+        y = []
+        index = []
+        with torch.inference_mode():
+            for batch in data:
+                batch = self._to_device(batch)
+                x.append(self.graph_embed(batch))
+                y.append(batch.y)
+                index.append(getattr(batch, 'graph_index', None))
+        x, y = torch.cat(x, dim=0), torch.cat(y, dim=0)
+        if any(i is None for i in index):
+            # a loader without graph indices yields the graphs in dataset order
+            return x, y
+        index = torch.cat(index).to(x.device)
+        x_, y_ = torch.empty_like(x), torch.empty_like(y)
+        x_[index], y_[index] = x, y
+        return x_, y_
@@ -0,0 +1,164 @@
+import gc
+import os
+import resource
+from logging import getLogger
+
+import torch
+
+
+def get_memory_monitor(config, writer):
+    """
+    according the config to create the MemoryMonitor of an executor
+
+    Args:
+        config(ConfigParser): config
+        writer(SummaryWriter): where the per-epoch statistics are written
+
+    Returns:
+        MemoryMonitor: the monitor, or None unless ``memory_monitor`` is set
+    """
+    if not config.get('memory_monitor', False):
+        return None
+    return MemoryMonitor(writer, config.get('device', torch.device('cpu')),
+                         threshold_mb=config.get('memory_threshold_mb', None),
+                         top_n=config.get('memory_top_n', 10))
+
+
+def rss_bytes():
+    """
+    resident set size of the process, its peak where the current one is unavailable
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryMonitor(object):
+    """
+    Memory accounting of the training loop. Every epoch the process RSS and the
+    CUDA allocator statistics are written under ``memory/*``, together with the
+    peak of each phase of the training step reported by the ``StepProfiler``:
+    the peak allocated device memory on CUDA, the RSS at the end of the phase on
+    the CPU. When a phase peak exceeds ``threshold_mb`` and, by 10%, every
+    peak dumped before, and on out-of-memory errors, the ``top_n`` largest live tensors are
+    logged with the module whose forward created them, as far as ``watch`` could
+    tag them.
+
+    Args:
+        writer(SummaryWriter): per-epoch statistics are written under ``memory/*``
+        device(torch.device): training device
+        threshold_mb(float): phase peak in MB above which the live tensors are dumped
+        top_n(int): number of tensors dumped
+    """
+
+    def __init__(self, writer, device, threshold_mb=None, top_n=10):
+        self.writer = writer
+        self.device = torch.device(device)
+        self.cuda = self.device.type == 'cuda' and torch.cuda.is_available()
+        self.threshold_mb = threshold_mb
+        self.top_n = top_n
+        self._logger = getLogger()
+        self._phase_peaks = {}
+        self._dumped_peak = None if threshold_mb is None else threshold_mb * 2 ** 20
+        self._hooks = []
+
+    def watch(self, model, compiled=False):
+        """
+        tag the tensors returned by every submodule of ``model`` with the module
+        name, so that dumps can tell where a tensor was created. Only done when a
+        threshold is set, the hooks cost a little on every forward. A compiled
+        model is not watched: setting attributes on tensors inside a compiled
+        graph breaks it.
+
+        Args:
+            model(torch.nn.Module): the model
+            compiled(bool): whether the model was compiled with ``torch.compile``
+        """
+        if self.threshold_mb is None or self._hooks:
+            return
+        if compiled:
+            self._logger.warning('The model is compiled, the tensors in memory dumps are not tagged '
+                                 'with the module that created them')
+            return
+        for name, module in model.named_modules():
+            self._hooks.append(module.register_forward_hook(self._tag_hook(name or type(model).__name__)))
+
+    @staticmethod
+    def _tag_hook(name):
+        def hook(module, inputs, outputs):
+            for out in outputs if isinstance(outputs, (list, tuple)) else [outputs]:
+                if torch.is_tensor(out) and not hasattr(out, '_created_by'):
+                    out._created_by = '{} ({})'.format(name, type(module).__name__)
+        return hook
+
+    def phase_end(self, name, peak=None):
+        """
+        record the peak of a phase
+
+        Args:
+            name(str): phase name
+            peak(int): peak allocated bytes of the phase on CUDA, the current RSS
+                is used if None
+        """
+        if peak is None:
+            peak = rss_bytes()
+        self._phase_peaks[name] = max(self._phase_peaks.get(name, 0), peak)
+        if self._dumped_peak is not None and peak > self._dumped_peak:
+            # small fluctuations above the last dump are not dumped again
+            self._dumped_peak = 1.1 * peak
+            self.dump('phase {} reached {:.1f}MB, above the threshold of {:.1f}MB'.
+                      format(name, peak / 2 ** 20, self.threshold_mb))
+
+    def dump(self, reason):
+        """
+        log the largest live tensors
+
+        Args:
+            reason(str): why the dump was made
+        """
+        tensors = {}
+        for obj in gc.get_objects():
+            try:
+                if torch.is_tensor(obj):
+                    tensors[id(obj)] = obj
+            except Exception:
+                # some objects fail on attribute access during the scan
+                continue
+        largest = sorted(tensors.values(), key=lambda t: t.element_size() * t.nelement(), reverse=True)
+        lines = ['{:>10.1f}MB  {:<24}{:<10}{:<10}{}'.format(t.element_size() * t.nelement() / 2 ** 20,
+                                                            str(tuple(t.shape)), str(t.dtype).replace('torch.', ''),
+                                                            str(t.device), getattr(t, '_created_by', '-'))
+                 for t in largest[:self.top_n]]
+        self._logger.warning('Memory: {}. The {} largest live tensors:\n{}'.format(reason, len(lines), '\n'.join(lines)))
+
+    def end_epoch(self, epoch, run_peak=None):
+        """
+        write the statistics of an epoch and start the next epoch
+
+        Args:
+            epoch(int): epoch index
+            run_peak(int): peak allocated device memory of the run in bytes, see
+                ``StepProfiler.max_memory_allocated``
+        """
+        stats = {'rss_mb': rss_bytes() / 2 ** 20,
+                 'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+        if self.cuda:
+            allocator = torch.cuda.memory_stats(self.device)
+            stats['allocated_mb'] = torch.cuda.memory_allocated(self.device) / 2 ** 20
+            stats['reserved_mb'] = torch.cuda.memory_reserved(self.device) / 2 ** 20
+            stats['alloc_retries'] = allocator.get('num_alloc_retries', 0)
+            stats['ooms'] = allocator.get('num_ooms', 0)
+            if run_peak is not None:
+                stats['run_peak_allocated_mb'] = run_peak / 2 ** 20
+        for name, value in stats.items():
+            self.writer.add_scalar('memory/{}'.format(name), value, epoch)
+        for name, peak in self._phase_peaks.items():
+            self.writer.add_scalar('memory/peak_mb/{}'.format(name), peak / 2 ** 20, epoch)
+        peaks = ', '.join('{} {:.1f}MB'.format(name, peak / 2 ** 20) for name, peak in self._phase_peaks.items())
+        self._logger.info('Memory at epoch {}: '.format(epoch) +
+                          ', '.join('{} {:.1f}'.format(name, value) for name, value in stats.items()) +
+                          ('; phase peaks: ' + peaks if peaks else ''))
+        self._phase_peaks = {}
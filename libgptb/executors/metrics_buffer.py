@@ -0,0 +1,57 @@
+import torch
+
+
+class MetricsBuffer(object):
+    """
+    Epoch losses kept as detached tensors on the training device until ``flush``
+    moves all of them to the host in a single transfer and writes them to
+    TensorBoard, so the training loop does not wait for the device every step.
+
+    Args:
+        writer(SummaryWriter): where the losses are written
+        tag(str): TensorBoard tag of the losses
+    """
+
+    def __init__(self, writer, tag='training loss'):
+        self.writer = writer
+        self.tag = tag
+        self._pending = []
+        self._last = None
+
+    def append(self, epoch, losses):
+        """
+        record the loss of an epoch, the mean of its batch losses
+
+        Args:
+            epoch(int): epoch index
+            losses(torch.Tensor, float or list): loss of the epoch or of each of its batches
+        """
+        if isinstance(losses, (list, tuple)):
+            loss = torch.stack([torch.as_tensor(l, dtype=torch.float32) for l in losses]).mean()
+        else:
+            loss = torch.as_tensor(losses, dtype=torch.float32)
+        self._last = loss.detach()
+        self._pending.append((epoch, self._last))
+
+    def last(self):
+        """
+        the loss of the latest epoch, still on the device, also after a ``flush``
+        """
+        return self._last
+
+    def flush(self):
+        """
+        move the recorded losses to the host and write them to TensorBoard
+
+        Returns:
+            list: ``(epoch, loss)`` pairs in recording order
+        """
+        if not self._pending:
+            return []
+        device = self._pending[-1][1].device
+        values = torch.stack([loss.to(device) for _, loss in self._pending]).cpu().tolist()
+        flushed = [(epoch, value) for (epoch, _), value in zip(self._pending, values)]
+        self._pending = []
+        for epoch, value in flushed:
+            self.writer.add_scalar(self.tag, value, epoch)
+        return flushed
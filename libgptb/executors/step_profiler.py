@@ -0,0 +1,171 @@
+import time
+from contextlib import contextmanager
+
+import torch
+
+
+def get_step_profiler(config, writer, memory=None):
+    """
+    according the config to create the StepProfiler of an executor
+
+    Args:
+        config(ConfigParser): config
+        writer(SummaryWriter): where the per-epoch timings are written
+        memory(MemoryMonitor): receives the peak memory of every phase
+
+    Returns:
+        StepProfiler: the profiler, a no-op unless ``profile_phases`` is set
+    """
+    return StepProfiler(writer, config.get('device', torch.device('cpu')),
+                        sync=config.get('profile_sync', False),
+                        enabled=config.get('profile_phases', False), memory=memory)
+
+
+class StepProfiler(object):
+    """
+    Wall time and peak device memory of the phases of a training step. A phase
+    opened inside another one is recorded under ``outer/inner``, so the time of
+    an outer phase includes its inner phases. Without ``sync`` the timings are
+    those of the host, which runs ahead of an asynchronous device; with it the
+    device is synchronised around every phase, which is accurate but slower.
+
+    On CUDA every phase resets the peak statistics of the caching allocator, so
+    ``torch.cuda.max_memory_allocated`` only covers the current phase while the
+    profiler or the memory monitor is on. The peak of the whole run is kept by
+    ``max_memory_allocated`` instead, which the memory monitor writes every epoch
+    and the trainer logs at the end of training.
+
+    Args:
+        writer(SummaryWriter): per-epoch totals are written under ``profile/*``
+        device(torch.device): training device, memory is only tracked on CUDA
+        sync(bool): synchronise the device around every phase
+        enabled(bool): a disabled profiler records no timings
+        memory(MemoryMonitor): receives the peak memory of every phase, also
+            when the timings are disabled
+    """
+
+    def __init__(self, writer, device, sync=False, enabled=True, memory=None):
+        self.writer = writer
+        self.device = torch.device(device)
+        self.cuda = self.device.type == 'cuda' and torch.cuda.is_available()
+        self.sync = sync and self.cuda
+        self.enabled = enabled
+        self.memory = memory
+        self._stack = []
+        self._epoch = {}
+        self._total = {}
+        self._order = []
+        self._peak = 0
+
+    @contextmanager
+    def phase(self, name):
+        """
+        time the enclosed code as the phase ``name``
+        """
+        if not self.enabled and self.memory is None:
+            yield
+            return
+        if self.sync:
+            torch.cuda.synchronize(self.device)
+        frame = {'name': '/'.join([f['name'] for f in self._stack] + [name]), 'peak': 0}
+        if frame['name'] not in self._order:
+            self._order.append(frame['name'])
+        if self.cuda:
+            # the peak so far belongs to the enclosing phase, it is kept there
+            peak = torch.cuda.max_memory_allocated(self.device)
+            self._peak = max(self._peak, peak)
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            torch.cuda.reset_peak_memory_stats(self.device)
+        self._stack.append(frame)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.sync:
+                torch.cuda.synchronize(self.device)
+            elapsed = time.perf_counter() - start
+            self._stack.pop()
+            peak = None
+            if self.cuda:
+                peak = max(frame['peak'], torch.cuda.max_memory_allocated(self.device))
+                self._peak = max(self._peak, peak)
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            if self.enabled:
+                self._record(frame['name'], elapsed, peak)
+            if self.memory is not None:
+                self.memory.phase_end(frame['name'], peak)
+
+    def max_memory_allocated(self):
+        """
+        peak allocated device memory of the run, in bytes, which the resets made
+        by the phases hide from ``torch.cuda.max_memory_allocated``
+
+        Returns:
+            int: the peak, None when the device is not CUDA
+        """
+        if not self.cuda:
+            return None
+        return max(self._peak, torch.cuda.max_memory_allocated(self.device))
+
+    def iterate(self, name, iterable):
+        """
+        iterate over ``iterable``, timing the fetch of every item as the phase ``name``
+        """
+        if not self.enabled and self.memory is None:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    def _record(self, name, elapsed, peak):
+        for stats in [self._epoch, self._total]:
+            entry = stats.setdefault(name, {'calls': 0, 'time': 0., 'peak': None})
+            entry['calls'] += 1
+            entry['time'] += elapsed
+            if peak is not None:
+                entry['peak'] = peak if entry['peak'] is None else max(entry['peak'], peak)
+
+    def end_epoch(self, epoch):
+        """
+        write the phase totals of an epoch to TensorBoard and start the next epoch
+
+        Args:
+            epoch(int): epoch index
+        """
+        for name, entry in self._epoch.items():
+            self.writer.add_scalar('profile/{}_time'.format(name), entry['time'], epoch)
+            if entry['peak'] is not None:
+                self.writer.add_scalar('profile/{}_peak_mem_mb'.format(name), entry['peak'] / 2 ** 20, epoch)
+        self._epoch = {}
+
+    def summary(self, total_time=None):
+        """
+        table of the phases over the whole run
+
+        Args:
+            total_time(float): training time the shares are computed from, the sum
+                of the top-level phases if None
+
+        Returns:
+            str: the table, empty if nothing was recorded
+        """
+        if not self._total:
+            return ''
+        if total_time is None:
+            total_time = sum(entry['time'] for name, entry in self._total.items() if '/' not in name)
+        lines = ['{:<28}{:>10}{:>12}{:>12}{:>9}{:>12}'.format('phase', 'calls', 'total(s)', 'mean(ms)',
+                                                            'share', 'peak(MB)')]
+        for name in self._order:
+            entry = self._total[name]
+            peak = '-' if entry['peak'] is None else '{:.1f}'.format(entry['peak'] / 2 ** 20)
+            share = entry['time'] / total_time if total_time > 0 else 0.
+            lines.append('{:<28}{:>10}{:>12.3f}{:>12.3f}{:>8.1%}{:>12}'.format(
+                name, entry['calls'], entry['time'], 1000 * entry['time'] / entry['calls'], share, peak))
+        return '\n'.join(lines)
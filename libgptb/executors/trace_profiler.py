@@ -0,0 +1,97 @@
+import os
+from logging import getLogger
+
+import torch
+
+
+def get_trace_profiler(config, exp_id):
+    """
+    according the config to create the TraceProfiler of an executor
+
+    Args:
+        config(ConfigParser): config
+        exp_id(str): id of the experiment
+
+    Returns:
+        TraceProfiler: the profiler, a no-op unless ``profile`` is set
+    """
+    return TraceProfiler('./libgptb/cache/{}/profile'.format(exp_id),
+                         steps=config.get('profile_steps', 5),
+                         warmup=config.get('profile_warmup', 1),
+                         device=config.get('device', torch.device('cpu')),
+                         enabled=config.get('profile', False))
+
+
+class TraceProfiler(object):
+    """
+    ``torch.profiler`` capture of a window of training steps: ``warmup`` steps
+    are run under the profiler but discarded, the next ``steps`` are recorded
+    with input shapes, memory, Python stacks and FLOP estimates. A Chrome trace
+    (``trace.json``, open it in chrome://tracing or Perfetto) and the operator
+    table (``key_averages.txt``) are written to ``root`` when the window ends.
+
+    Args:
+        root(str): output directory
+        steps(int): number of recorded steps
+        warmup(int): number of steps run before recording
+        device(torch.device): training device, its kernels are traced on CUDA
+        enabled(bool): a disabled profiler records nothing
+    """
+
+    def __init__(self, root, steps=5, warmup=1, device='cpu', enabled=True):
+        self.root = root
+        self.steps = steps
+        self.warmup = warmup
+        self.enabled = enabled
+        self._logger = getLogger()
+        self._activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.device(device).type == 'cuda' and torch.cuda.is_available():
+            self._activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self._profiler = None
+
+    def start(self):
+        """
+        start profiling, the window begins with the next step
+        """
+        if not self.enabled or self._profiler is not None:
+            return
+        self._profiler = torch.profiler.profile(
+            activities=self._activities,
+            schedule=torch.profiler.schedule(wait=0, warmup=self.warmup, active=self.steps, repeat=1),
+            on_trace_ready=self._export,
+            record_shapes=True,
+            profile_memory=True,
+            with_stack=True,
+            with_flops=True)
+        self._profiler.start()
+
+    def step(self):
+        """
+        mark the end of a training step
+        """
+        if self._profiler is not None:
+            self._profiler.step()
+
+    def stop(self):
+        """
+        stop profiling, a window cut short by the end of training is still exported
+        """
+        if self._profiler is not None:
+            self._profiler.stop()
+            self._profiler = None
+
+    def _export(self, prof):
+        os.makedirs(self.root, exist_ok=True)
+        trace_path = os.path.join(self.root, 'trace.json')
+        prof.export_chrome_trace(trace_path)
+        sort_by = 'self_cuda_time_total' if len(self._activities) > 1 else 'self_cpu_time_total'
+        averages = prof.key_averages()
+        table_path = os.path.join(self.root, 'key_averages.txt')
+        with open(table_path, 'w') as f:
+            f.write(averages.table(sort_by=sort_by, row_limit=100))
+            f.write('\n')
+            f.write(prof.key_averages(group_by_input_shape=True).table(sort_by=sort_by, row_limit=50))
+        flops = sum(event.flops for event in averages if event.flops)
+        self._logger.info('Profiled {} steps, {:.3f} GFLOPs estimated over the recorded operators, '
+                          'trace saved at {}, operator table at {}'.
+                          format(self.steps, flops / 1e9, trace_path, table_path))
@@ -0,0 +1,539 @@
+import os
+import time
+import json
+import datetime
+import torch
+from logging import getLogger
+from torch.utils.tensorboard import SummaryWriter
+from libgptb.executors.abstract_executor import AbstractExecutor
+from libgptb.utils import get_evaluator, ensure_dir, get_autocast, compile_model
+from libgptb.executors.checkpoint import get_checkpoint_manager
+from libgptb.executors.embedding_store import get_embedding_store
+from libgptb.executors.metrics_buffer import MetricsBuffer
+from libgptb.executors.memory_monitor import get_memory_monitor
+from libgptb.executors.step_profiler import get_step_profiler
+from libgptb.executors.trace_profiler import get_trace_profiler
+from libgptb.evaluators import get_split, LREvaluator, BatchedLREvaluator
+from libgptb.model.inference import get_inference_engine
+from libgptb.model.sign import precompute_hops
+
+
+class GCLTrainer(AbstractExecutor):
+    """
+    所有自监督图表示学习模型共用的训练引擎: 负责训练循环、计时、检查点、
+    里程碑轮次的表示缓存与评估。具体模型只需实现三个钩子:
+
+    - ``prepare(data)``: 训练开始前调用一次, 返回每个轮次遍历的 batch 序列
+    - ``step(batch, epoch_idx)``: 计算一个 batch 的损失, 反向传播与参数更新由引擎完成,
+      可用 ``self.profiler.phase(name)`` 细分其中的阶段
+    - ``embed(data)``: 用当前模型计算评估用的表示, 返回 (表示, 标签)
+
+    类属性 ``eval_epochs`` (从 0 开始计数的里程碑轮次)、``split_ratio``
+    (线性探针的训练集与测试集比例)、``loss_reduction`` (一个轮次内各 batch
+    损失的合并方式, ``mean`` 或 ``sum``) 与 ``supports_sign`` (模型能否使用
+    SIGN 编码器) 由子类按需覆盖。
+    """
+
+    eval_epochs = [50-1, 100-1, 500-1, 1000-1, 10000-1]
+    split_ratio = (0.1, 0.8)
+    loss_reduction = 'mean'
+    supports_sign = False
+
+    def __init__(self, config, model, data_feature):
+        self.evaluator = get_evaluator(config)
+        self.config = config
+        self.data_feature = data_feature
+        self.device = self.config.get('device', torch.device('cpu'))
+        self.model = model.to(self.device)
+        self.exp_id = self.config.get('exp_id', None)
+
+        self.cache_dir = './libgptb/cache/{}/model_cache'.format(self.exp_id)
+        self.evaluate_res_dir = './libgptb/cache/{}/evaluate_cache'.format(self.exp_id)
+        self.summary_writer_dir = './libgptb/cache/{}/'.format(self.exp_id)
+        ensure_dir(self.cache_dir)
+        ensure_dir(self.evaluate_res_dir)
+        ensure_dir(self.summary_writer_dir)
+
+        self._writer = SummaryWriter(self.summary_writer_dir)
+        self.metrics = MetricsBuffer(self._writer)
+        self.memory = get_memory_monitor(self.config, self._writer)
+        self.profiler = get_step_profiler(self.config, self._writer, self.memory)
+        self._logger = getLogger()
+        self._scaler = self.data_feature.get('scaler')
+        self._logger.info(self.model)
+        for name, param in self.model.named_parameters():
+            self._logger.info(str(name) + '\t' + str(param.shape) + '\t' +
+                              str(param.device) + '\t' + str(param.requires_grad))
+        total_num = sum([param.nelement() for param in self.model.parameters()])
+        self._logger.info('Total parameter numbers: {}'.format(total_num))
+        self.compiled = compile_model(self.config, self.model)
+        if self.memory is not None:
+            self.memory.watch(self.model, compiled=self.compiled)
+
+        self.epochs = self.config.get('max_epoch', 100)
+        self.train_loss = self.config.get('train_loss', 'none')
+        self.learner = self.config.get('learner', 'adam')
+        self.learning_rate = self.config.get('learning_rate', 0.01)
+        self.weight_decay = self.config.get('weight_decay', 0)
+        self.lr_beta1 = self.config.get('lr_beta1', 0.9)
+        self.lr_beta2 = self.config.get('lr_beta2', 0.999)
+        self.lr_betas = (self.lr_beta1, self.lr_beta2)
+        self.lr_alpha = self.config.get('lr_alpha', 0.99)
+        self.lr_epsilon = self.config.get('lr_epsilon', 1e-8)
+        self.lr_momentum = self.config.get('lr_momentum', 0)
+        self.lr_decay = self.config.get('lr_decay', True)
+        self.lr_scheduler_type = self.config.get('lr_scheduler', 'multisteplr')
+        self.lr_decay_ratio = self.config.get('lr_decay_ratio', 0.1)
+        self.milestones = self.config.get('steps', [])
+        self.step_size = self.config.get('step_size', 10)
+        self.lr_lambda = self.config.get('lr_lambda', lambda x: x)
+        self.lr_T_max = self.config.get('lr_T_max', 30)
+        self.lr_eta_min = self.config.get('lr_eta_min', 0)
+        self.lr_patience = self.config.get('lr_patience', 10)
+        self.lr_threshold = self.config.get('lr_threshold', 1e-4)
+        self.clip_grad_norm = self.config.get('clip_grad_norm', False)
+        self.max_grad_norm = self.config.get('max_grad_norm', 1.)
+        self.use_early_stop = self.config.get('use_early_stop', False)
+        self.patience = self.config.get('patience', 50)
+        self.log_every = self.config.get('log_every', 1)
+        self.saved = self.config.get('saved_model', True)
+        self.checkpointer = get_checkpoint_manager(self.config, self.cache_dir)
+        self.embedding_store = get_embedding_store(self.config, self.exp_id)
+        self.tracer = get_trace_profiler(self.config, self.exp_id)
+        self.load_best_epoch = self.config.get('load_best_epoch', False)
+        self.hyper_tune = self.config.get('hyper_tune', False)
+        self.sign = self.supports_sign and self.config.get('encoder', 'gcn') == 'sign'
+        self._engines = {}
+        self._hops = None
+
+        self.output_dim = self.config.get('output_dim', 1)
+        self.optimizer = self._build_optimizer()
+        self.lr_scheduler = self._build_lr_scheduler()
+        self._epoch_num = self.config.get('epoch', 0)
+        if self._epoch_num > 0:
+            self.load_model_with_epoch(self._epoch_num)
+
+    def prepare(self, data):
+        """
+        训练开始前的准备, 如构建子图采样器、预计算特征等
+
+        Args:
+            data: 训练数据
+
+        Returns:
+            iterable: 每个轮次依次传给 ``step`` 的 batch
+        """
+        raise NotImplementedError("Trainer prepare not implemented")
+
+    def step(self, batch, epoch_idx):
+        """
+        计算一个 batch 的损失
+
+        Args:
+            batch: ``prepare`` 返回的序列中的一个元素
+            epoch_idx: 轮次数
+
+        Returns:
+            torch.Tensor: 该 batch 的损失
+        """
+        raise NotImplementedError("Trainer step not implemented")
+
+    def embed(self, data):
+        """
+        用当前模型计算评估用的表示
+
+        Args:
+            data: 评估数据
+
+        Returns:
+            tuple: 表示和对应的标签
+        """
+        raise NotImplementedError("Trainer embed not implemented")
+
+    def inference_engine(self, data, name='graph', edges=None, self_loops=False):
+        """
+        全图推理所用的 InferenceEngine, 首次调用时构建, 之后的里程碑轮次复用其归一化的邻接矩阵。
+        使用 SIGN 编码器时不构建邻接矩阵
+
+        Args:
+            data: 全图数据
+            name(str): 引擎的名字, 一个模型需要多个邻接矩阵时区分它们
+            edges(callable): 返回 (edge_index, edge_weight), 替代 data 的连接, 只在构建时调用
+            self_loops(bool): DGL 图是否先去掉再重新加上自环
+
+        Returns:
+            InferenceEngine: 推理引擎
+        """
+        if name not in self._engines:
+            if self.sign:
+                engine = get_inference_engine(self.config, data, self.device, propagate=False)
+            else:
+                if self_loops:
+                    data = data.remove_self_loop().add_self_loop()
+                edge_index, edge_weight = (None, None) if edges is None else edges()
+                engine = get_inference_engine(self.config, data, self.device,
+                                              './libgptb/cache/{}'.format(self.exp_id),
+                                              edge_index=edge_index, edge_weight=edge_weight)
+            self._engines[name] = engine
+        return self._engines[name]
+
+    def sign_hops(self, data):
+        """
+        SIGN 编码器的输入, 各跳特征只预计算一次
+
+        Args:
+            data: 全图数据
+
+        Returns:
+            np.memmap or torch.Tensor: 预计算的各跳特征
+        """
+        if self._hops is None:
+            self._hops = precompute_hops(self.config, data, self.device, self.data_feature.get('data_dir'))
+        return self._hops
+
+    def _parameters(self):
+        """
+        优化器更新的参数
+        """
+        return self.model.encoder_model.parameters()
+
+    def _build_probe(self):
+        """
+        评估表示所用的线性探针, probe_batched 时为一次训练多个探针的 BatchedLREvaluator
+        """
+        if self.config.get('probe_batched', False):
+            return BatchedLREvaluator(seeds=self.config.get('probe_seeds', [0]),
+                                      weight_decays=self.config.get('probe_weight_decays', [0.0]))
+        return LREvaluator(solver=self.config.get('probe_solver', 'adam'))
+
+    def save_model(self, cache_name):
+        """
+        将当前的模型保存到文件
+
+        Args:
+            cache_name(str): 保存的文件名
+        """
+        ensure_dir(self.cache_dir)
+        self._logger.info("Saved model at " + cache_name)
+        torch.save((self.model.state_dict(), self.optimizer.state_dict()), cache_name)
+
+    def load_model(self, cache_name):
+        """
+        加载对应模型的 cache
+
+        Args:
+            cache_name(str): 保存的文件名
+        """
+        self._logger.info("Loaded model at " + cache_name)
+        model_state, optimizer_state = torch.load(cache_name)
+        self.model.load_state_dict(model_state)
+        self.optimizer.load_state_dict(optimizer_state)
+
+    def save_model_with_epoch(self, epoch, best=False, milestone=False):
+        """
+        保存某个epoch的模型
+
+        Args:
+            epoch(int): 轮数
+            best(bool): 是否为目前最优的模型, 排队中的上一个最优模型不再写入
+            milestone(bool): 是否为需要一直保留的模型
+        """
+        ensure_dir(self.cache_dir)
+        config = dict()
+        config['model_state_dict'] = self.model.state_dict()
+        config['optimizer_state_dict'] = self.optimizer.state_dict()
+        config['epoch'] = epoch
+        model_path = self.checkpointer.save(epoch, config, best=best, milestone=milestone)
+        self._logger.info("Saved model at {}".format(epoch))
+        return model_path
+
+    def load_model_with_epoch(self, epoch):
+        """
+        加载某个epoch的模型
+
+        Args:
+            epoch(int): 轮数
+        """
+        self.checkpointer.wait()
+        model_path = self.checkpointer.path(epoch)
+        assert os.path.exists(model_path), 'Weights at epoch %d not found' % epoch
+        checkpoint = torch.load(model_path, map_location='cpu')
+        self.model.load_state_dict(checkpoint['model_state_dict'])
+        self.optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+        self._logger.info("Loaded model at {}".format(epoch))
+
+    def _build_optimizer(self):
+        """
+        根据全局参数`learner`选择optimizer
+        """
+        self._logger.info('You select `{}` optimizer.'.format(self.learner.lower()))
+        if self.learner.lower() == 'adam':
+            optimizer = torch.optim.Adam(self._parameters(), lr=self.learning_rate, weight_decay=self.weight_decay)
+        elif self.learner.lower() == 'sgd':
+            optimizer = torch.optim.SGD(self._parameters(), lr=self.learning_rate,
+                                        momentum=self.lr_momentum, weight_decay=self.weight_decay)
+        elif self.learner.lower() == 'adagrad':
+            optimizer = torch.optim.Adagrad(self._parameters(), lr=self.learning_rate,
+                                            eps=self.lr_epsilon, weight_decay=self.weight_decay)
+        elif self.learner.lower() == 'rmsprop':
+            optimizer = torch.optim.RMSprop(self._parameters(), lr=self.learning_rate,
+                                            alpha=self.lr_alpha, eps=self.lr_epsilon,
+                                            momentum=self.lr_momentum, weight_decay=self.weight_decay)
+        elif self.learner.lower() == 'sparse_adam':
+            optimizer = torch.optim.SparseAdam(self._parameters(), lr=self.learning_rate,
+                                               eps=self.lr_epsilon, betas=self.lr_betas)
+        else:
+            self._logger.warning('Received unrecognized optimizer, set default Adam optimizer')
+            optimizer = torch.optim.Adam(self._parameters(), lr=self.learning_rate,
+                                         eps=self.lr_epsilon, weight_decay=self.weight_decay)
+        return optimizer
+
+    def _build_lr_scheduler(self):
+        """
+        根据全局参数`lr_scheduler`选择对应的lr_scheduler
+        """
+        if self.lr_decay:
+            self._logger.info('You select `{}` lr_scheduler.'.format(self.lr_scheduler_type.lower()))
+            if self.lr_scheduler_type.lower() == 'multisteplr':
+                lr_scheduler = torch.optim.lr_scheduler.MultiStepLR(
+                    self.optimizer, milestones=self.milestones, gamma=self.lr_decay_ratio)
+            elif self.lr_scheduler_type.lower() == 'steplr':
+                lr_scheduler = torch.optim.lr_scheduler.StepLR(
+                    self.optimizer, step_size=self.step_size, gamma=self.lr_decay_ratio)
+            elif self.lr_scheduler_type.lower() == 'exponentiallr':
+                lr_scheduler = torch.optim.lr_scheduler.ExponentialLR(
+                    self.optimizer, gamma=self.lr_decay_ratio)
+            elif self.lr_scheduler_type.lower() == 'cosineannealinglr':
+                lr_scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(
+                    self.optimizer, T_max=self.lr_T_max, eta_min=self.lr_eta_min)
+            elif self.lr_scheduler_type.lower() == 'lambdalr':
+                lr_scheduler = torch.optim.lr_scheduler.LambdaLR(
+                    self.optimizer, lr_lambda=self.lr_lambda)
+            elif self.lr_scheduler_type.lower() == 'reducelronplateau':
+                lr_scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(
+                    self.optimizer, mode='min', patience=self.lr_patience,
+                    factor=self.lr_decay_ratio, threshold=self.lr_threshold)
+            else:
+                self._logger.warning('Received unrecognized lr_scheduler, '
+                                     'please check the parameter `lr_scheduler`.')
+                lr_scheduler = None
+        else:
+            lr_scheduler = None
+        return lr_scheduler
+
+    def evaluate(self, test_dataloader):
+        """
+        use model to test data
+
+        Args:
+            test_dataloader(torch.Dataloader): Dataloader
+
+        Returns:
+            dict: evaluation result of every milestone epoch
+        """
+        self._logger.info('Start evaluating ...')
+        probe = self._build_probe()
+        epochs = [epoch_idx for epoch_idx in self.eval_epochs if epoch_idx < self.epochs]
+        if isinstance(probe, BatchedLREvaluator):
+            # one probe for all milestones: their embeddings must be those of the same samples
+            embeddings = [self._milestone_embedding(epoch_idx, test_dataloader) for epoch_idx in epochs]
+            if embeddings and all(torch.equal(y, embeddings[0][1]) for _, y in embeddings):
+                z, y = embeddings[0]
+                results = probe.evaluate_many([z for z, _ in embeddings], y, self._split(z))
+                for epoch_idx, result in zip(epochs, results):
+                    self._save_result(epoch_idx, result)
+                return dict(zip(epochs, results))
+            self._logger.warning('Milestone labels differ, the milestones are probed one by one')
+        results = {}
+        for epoch_idx in epochs:
+            z, y = self._milestone_embedding(epoch_idx, test_dataloader)
+            results[epoch_idx] = probe(z, y, self._split(z))
+            self._save_result(epoch_idx, results[epoch_idx])
+        return results
+
+    def _milestone_embedding(self, epoch_idx, test_dataloader):
+        """
+        某个里程碑轮次的表示, 未缓存时加载该轮次的模型重新计算
+
+        Args:
+            epoch_idx(int): 轮次数
+            test_dataloader: 评估数据
+
+        Returns:
+            tuple: 表示和与之同设备的标签
+        """
+        z, y = self.embedding_store.get(epoch_idx, self.device)
+        if z is None:
+            self.load_model_with_epoch(epoch_idx)
+            z, y = self.embed(test_dataloader)
+        return z, y.to(z.device)
+
+    def _split(self, z):
+        train_ratio, test_ratio = self.split_ratio
+        return get_split(num_samples=z.size()[0], train_ratio=train_ratio, test_ratio=test_ratio,
+                         dataset=self.config['dataset'])
+
+    def _save_result(self, epoch_idx, result):
+        """
+        记录并保存某个里程碑轮次的评估结果
+
+        Args:
+            epoch_idx(int): 轮次数
+            result(dict): 评估结果
+        """
+        self._logger.info(f'(E): Best test F1Mi={result["micro_f1"]:.4f}, F1Ma={result["macro_f1"]:.4f}')
+
+        self._logger.info('Evaluate result is ' + json.dumps(result))
+        filename = datetime.datetime.now().strftime('%Y_%m_%d_%H_%M_%S') + '_' + \
+            self.config['model'] + '_' + self.config['dataset'] + '_' + str(epoch_idx)
+        save_path = os.path.join(self.evaluate_res_dir, '{}.json'.format(filename))
+        with open(save_path, 'w') as f:
+            json.dump(result, f)
+            self._logger.info('Evaluate result is saved at ' + save_path)
+
+    def train(self, train_dataloader, eval_dataloader):
+        """
+        use data to train model with config
+
+        Args:
+            train_dataloader(torch.Dataloader): Dataloader
+            eval_dataloader(torch.Dataloader): Dataloader
+        """
+        self._logger.info('Start training ...')
+        min_val_loss = float('inf')
+        best_loss = float('inf')
+        wait = 0
+        best_epoch = 0
+        train_time = []
+        flush_time = []
+        # embeddings left by an earlier run with the same exp_id are not this run's
+        self.embedding_store.clear()
+        batches = self.prepare(train_dataloader)
+        if hasattr(batches, '__len__'):
+            self._logger.info("num_batches:{}".format(len(batches)))
+
+        self.tracer.start()
+        # the trace is closed, and its window exported, also when an epoch raises
+        try:
+            for epoch_idx in range(self._epoch_num, self.epochs):
+                start_time = time.time()
+                losses = self._train_epoch(batches, epoch_idx)
+                t1 = time.time()
+                train_time.append(t1 - start_time)
+                self.metrics.append(epoch_idx, losses)
+                self._logger.info("epoch complete!")
+
+                t2 = time.time()
+                # losses reach the host every log_every epochs, in one transfer
+                flush = (epoch_idx % self.log_every) == 0 or epoch_idx == self.epochs - 1
+                epoch_losses = self.metrics.flush() if flush else []
+                end_time = time.time()
+                flush_time.append(end_time - t2)
+
+                if self.lr_scheduler is not None:
+                    if self.lr_scheduler_type.lower() == 'reducelronplateau':
+                        # stepped on the flushed losses, reading the device loss would sync every epoch
+                        if epoch_losses:
+                            self.lr_scheduler.step(epoch_losses[-1][1])
+                    else:
+                        self.lr_scheduler.step()
+
+                if epoch_losses:
+                    log_lr = self.optimizer.param_groups[0]['lr']
+                    message = 'Epoch [{}/{}] train_loss: {:.4f}, lr: {:.6f}, {:.2f}s'.\
+                        format(epoch_idx, self.epochs, epoch_losses[-1][1],  log_lr, (end_time - start_time))
+                    self._logger.info(message)
+
+                if epoch_idx in self.eval_epochs:
+                    model_file_name = self.save_model_with_epoch(epoch_idx, milestone=True)
+                    self._logger.info('saving to {}'.format(model_file_name))
+                    if self.embedding_store.enabled:
+                        with self.profiler.phase('embed'):
+                            self.embedding_store.put(epoch_idx, *self.embed(train_dataloader))
+                self.profiler.end_epoch(epoch_idx)
+                if self.memory is not None:
+                    self.memory.end_epoch(epoch_idx, run_peak=self.profiler.max_memory_allocated())
+
+                # early stopping only sees the flushed losses
+                stop = False
+                for _, val_loss in epoch_losses:
+                    if val_loss < min_val_loss:
+                        wait = 0
+                        min_val_loss = val_loss
+                    else:
+                        wait += 1
+                        stop = stop or (wait == self.patience and self.use_early_stop)
+                # only the weights of the current epoch can be saved: with log_every > 1 an
+                # earlier minimum of the window is logged but not checkpointed as the best
+                if epoch_losses and epoch_losses[-1][1] < best_loss:
+                    if self.saved:
+                        model_file_name = self.save_model_with_epoch(epoch_idx, best=True)
+                        self._logger.info('Val loss decrease from {:.4f} to {:.4f}, '
+                                          'saving to {}'.format(best_loss, epoch_losses[-1][1], model_file_name))
+                    best_loss = epoch_losses[-1][1]
+                    best_epoch = epoch_idx
+                if epoch_losses:
+                    min_epoch, min_loss = min(epoch_losses, key=lambda pair: pair[1])
+                    if min_loss == min_val_loss and min_epoch != epoch_idx:
+                        self._logger.info('Minimum loss {:.4f} at epoch {} was not checkpointed, the best '
+                                          'checkpoint stays at epoch {}'.format(min_loss, min_epoch, best_epoch))
+                if stop:
+                    self._logger.warning('Early stopping at epoch: %d' % epoch_idx)
+                    break
+        finally:
+            self.tracer.stop()
+        if self.compiled and len(train_time) > 1:
+            # the first epoch includes the torch.compile warm-up
+            self._logger.info('First epoch (with compilation) took {:.3f}s, the other epochs {:.3f}s on average'.
+                              format(train_time[0], sum(train_time[1:]) / (len(train_time) - 1)))
+        if len(train_time) > 0:
+            self._logger.info('Trained totally {} epochs, average train time is {:.3f}s, '
+                              'average loss flush time is {:.3f}s'.
+                              format(len(train_time), sum(train_time) / len(train_time),
+                                     sum(flush_time) / len(flush_time)))
+        if self.profiler.enabled and len(train_time) > 0:
+            self._logger.info('Time and peak memory of the training phases:\n' +
+                              self.profiler.summary(sum(train_time)))
+        run_peak = self.profiler.max_memory_allocated()
+        if run_peak is not None and (self.profiler.enabled or self.memory is not None):
+            self._logger.info('Peak allocated device memory of the run: {:.1f}MB'.format(run_peak / 2 ** 20))
+        # checkpoints still being written in the background
+        self.checkpointer.wait()
+        if self.load_best_epoch:
+            self.load_model_with_epoch(best_epoch)
+        return min_val_loss
+
+    def _train_epoch(self, batches, epoch_idx):
+        """
+        完成模型一个轮次的训练
+
+        Args:
+            batches: ``prepare`` 返回的 batch 序列
+            epoch_idx: 轮次数
+
+        Returns:
+            torch.Tensor or list: 该轮次的损失或每个batch的损失的数组, 留在设备上
+        """
+        self.model.train()
+        losses = []
+        for batch in self.profiler.iterate('data', batches):
+            self.optimizer.zero_grad()
+            try:
+                with self.profiler.phase('forward'), get_autocast(self.config):
+                    loss = self.step(batch, epoch_idx)
+                with self.profiler.phase('backward'):
+                    loss.backward()
+            except RuntimeError as e:
+                # torch.cuda.OutOfMemoryError is a RuntimeError
+                if self.memory is not None and 'out of memory' in str(e):
+                    self.memory.dump('out of memory at epoch {}'.format(epoch_idx))
+                raise
+            with self.profiler.phase('optimizer'):
+                if self.clip_grad_norm:
+                    torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.max_grad_norm)
+                self.optimizer.step()
+            losses.append(loss.detach())
+            self.tracer.step()
+        if self.loss_reduction == 'sum':
+            return torch.stack(losses).sum()
+        return losses
@@ -5,6 +5,8 @@ from libgptb.losses.abstract_losses import Loss
 def bt_loss(h1: torch.Tensor, h2: torch.Tensor, lambda_, batch_norm=True, eps=1e-15, *args, **kwargs):
     batch_size = h1.size(0)
     feature_dim = h1.size(1)
+    # the std normalisation is sensitive to bf16 rounding; c is only D x D
+    h1, h2 = h1.float(), h2.float()
 
     if lambda_ is None:
         lambda_ = 1. / feature_dim
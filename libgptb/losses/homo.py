@@ -48,7 +48,7 @@ class InfoNCE(Loss):
         return -loss.mean()
 def homo_loss(x, edge_index, nclusters, niter, sigma):
     kmeans = faiss.Kmeans(x.shape[1], nclusters, niter=niter) 
-    kmeans.train(x.cpu().detach().numpy())
+    kmeans.train(x.detach().float().cpu().numpy())
     centroids = torch.FloatTensor(kmeans.centroids).to(x.device)
     logits = []
     for c in centroids:
@@ -66,10 +66,11 @@ def semi_loss(z1, adj1, z2, adj2, confmatrix, tau):
         refl_sim = f(sim(z1, z1))
         between_sim = f(sim(z1, z2))
         # if mean:
-        pos = between_sim.diag() + (refl_sim * adj1 * confmatrix).sum(1) / (adj1.sum(1)+0.01) 
+        pos = between_sim.diag() + (refl_sim * adj1 * confmatrix).sum(1, dtype=torch.float32) / (adj1.sum(1)+0.01) 
         # else:
             # pos = between_sim.diag() + (refl_sim * adj1 * confmatrix).sum(1)
-        neg = refl_sim.sum(1) + between_sim.sum(1) - refl_sim.diag() - (refl_sim * adj1).sum(1) - (between_sim * adj2).sum(1)
+        neg = refl_sim.sum(1, dtype=torch.float32) + between_sim.sum(1, dtype=torch.float32) - refl_sim.diag() \
+            - (refl_sim * adj1).sum(1, dtype=torch.float32) - (between_sim * adj2).sum(1, dtype=torch.float32)
         loss = -torch.log(pos / (pos + neg))
 
         return loss
@@ -41,10 +41,14 @@ class InfoNCE(Loss):
 
     def compute(self, anchor, sample, pos_mask, neg_mask, *args, **kwargs):
         sim = _similarity(anchor, sample) / self.tau
+        # N x N terms stay in the autocast dtype, row reductions accumulate in fp32
+        pos_mask, neg_mask = pos_mask.to(sim.dtype), neg_mask.to(sim.dtype)
         exp_sim = torch.exp(sim) * (pos_mask + neg_mask)
-        log_prob = sim - torch.log(exp_sim.sum(dim=1, keepdim=True))
-        loss = log_prob * pos_mask
-        loss = loss.sum(dim=1) / pos_mask.sum(dim=1)
+        log_norm = torch.log(exp_sim.sum(dim=1, dtype=torch.float32))
+        num_pos = pos_mask.sum(dim=1, dtype=torch.float32)
+        # sum_j pos_ij * (sim_ij - log_norm_i), without materialising log_prob
+        loss = (sim * pos_mask).sum(dim=1, dtype=torch.float32) - log_norm * num_pos
+        loss = loss / num_pos
         return -loss.mean()
 
 
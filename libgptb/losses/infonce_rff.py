@@ -16,13 +16,13 @@ class InfoNCE_RFF(Loss):
         z1 = F.normalize(h1, dim=-1)
         z2 = F.normalize(h2, dim=-1)
 
-        pos_score = torch.exp(torch.sum(z1 * z2, dim=1) / self.tau)
+        pos_score = torch.exp(torch.sum(z1 * z2, dim=1, dtype=torch.float32) / self.tau)
 
         z = torch.cat([z1, z2], dim = 0)
 
         if self.mode == 'infonce':
             neg_sim = torch.exp(torch.mm(z1, z.t().contiguous()) / self.tau)
-            neg_score = neg_sim.sum(1)
+            neg_score = neg_sim.sum(1, dtype=torch.float32)
        
         elif self.mode == 'rff':
             w = torch.randn(z.size(1), self.rff_dim).to(z.device) / np.sqrt(self.tau)
@@ -30,7 +30,7 @@ class InfoNCE_RFF(Loss):
             
             rff_1, rff_2 = rff_out.chunk(2, dim = 0)
 
-            neg_sum = torch.sum(rff_out, dim=0, keepdim=True)
+            neg_sum = torch.sum(rff_out, dim=0, keepdim=True, dtype=torch.float32)
             neg_score = np.exp(1 / self.tau) * (torch.sum(rff_1 * neg_sum, dim=1))
 
         score = - torch.log((pos_score + SIGMA) / neg_score).mean()
@@ -40,7 +40,8 @@ class InfoNCE_RFF(Loss):
 
     def rff_transform(self, embedding, w):
         D = w.size(1)
-        out = torch.mm(embedding, w)
+        # cos/sin of large bf16 phases lose too much precision
+        out = torch.mm(embedding, w).float()
         d1 = torch.cos(out)
         d2 = torch.sin(out)
         return np.sqrt(1 / D) * torch.cat([d1, d2], dim=1)
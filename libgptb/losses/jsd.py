@@ -1,3 +1,4 @@
+import torch
 import numpy as np
 import torch.nn.functional as F
 
@@ -13,12 +14,14 @@ class JSD(Loss):
         num_neg = neg_mask.int().sum()
         num_pos = pos_mask.int().sum()
         similarity = self.discriminator(anchor, sample)
+        # the sums over all pairs accumulate in fp32 under bf16 autocast
+        pos_mask, neg_mask = pos_mask.to(similarity.dtype), neg_mask.to(similarity.dtype)
 
-        E_pos = (np.log(2) - F.softplus(- similarity * pos_mask)).sum()
+        E_pos = (np.log(2) - F.softplus(- similarity * pos_mask)).sum(dtype=torch.float32)
         E_pos /= num_pos
 
         neg_sim = similarity * neg_mask
-        E_neg = (F.softplus(- neg_sim) + neg_sim - np.log(2)).sum()
+        E_neg = (F.softplus(- neg_sim) + neg_sim - np.log(2)).sum(dtype=torch.float32)
         E_neg /= num_neg
 
         return E_neg - E_pos
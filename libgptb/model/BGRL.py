@@ -13,6 +13,8 @@ from libgptb.evaluators import get_split, LREvaluator
 from libgptb.models import BootstrapContrast
 from torch_geometric.nn import GCNConv
 from libgptb.model.abstract_gcl_model import AbstractGCLModel
+from libgptb.model.layers import checkpoint_layer, gcn_conv, gcn_inference_stages
+from libgptb.model.sign import SIGNEncoder
 
 class Normalize(torch.nn.Module):
     def __init__(self, dim=None, norm='batch'):
@@ -30,15 +32,20 @@ class Normalize(torch.nn.Module):
 
 class GConv(torch.nn.Module):
     def __init__(self, input_dim, hidden_dim, num_layers, dropout=0.2,
-                 encoder_norm='batch', projector_norm='batch'):
+                 encoder_norm='batch', projector_norm='batch', body=None, activation_checkpoint=False):
         super(GConv, self).__init__()
+        # recompute the activations of every conv in backward instead of storing them
+        self.activation_checkpoint = activation_checkpoint
         self.activation = torch.nn.PReLU()
         self.dropout = dropout
 
+        # ``body`` replaces the GCN layers, e.g. with a SIGNEncoder
+        self.body = body
         self.layers = torch.nn.ModuleList()
-        self.layers.append(GCNConv(input_dim, hidden_dim))
-        for _ in range(num_layers - 1):
-            self.layers.append(GCNConv(hidden_dim, hidden_dim))
+        if body is None:
+            self.layers.append(GCNConv(input_dim, hidden_dim))
+            for _ in range(num_layers - 1):
+                self.layers.append(GCNConv(hidden_dim, hidden_dim))
 
         self.batch_norm = Normalize(hidden_dim, norm=encoder_norm)
         self.projection_head = torch.nn.Sequential(
@@ -48,14 +55,23 @@ class GConv(torch.nn.Module):
             torch.nn.Dropout(dropout))
 
     def forward(self, x, edge_index, edge_weight=None):
-        z = x
+        z = x if self.body is None else self.body(x, edge_index, edge_weight)
         for conv in self.layers:
-            z = conv(z, edge_index, edge_weight)
+            z = checkpoint_layer(self.activation_checkpoint, gcn_conv, conv, z, edge_index, edge_weight)
             z = self.activation(z)
             z = F.dropout(z, p=self.dropout, training=self.training)
         z = self.batch_norm(z)
         return z, self.projection_head(z)
 
+    def inference_stages(self):
+        """
+        the encoder as ``InferenceEngine`` stages, see ``libgptb.model.inference``
+        """
+        stages = [] if self.body is None else self.body.inference_stages()
+        for conv in self.layers:
+            stages += gcn_inference_stages(conv) + [self.activation]
+        return stages + [self.batch_norm]
+
 
 class Encoder(torch.nn.Module):
     def __init__(self, encoder, augmentor, hidden_dim, dropout=0.2, predictor_norm='batch'):
@@ -111,12 +127,27 @@ class BGRL(AbstractGCLModel):
         self.pf1 = config.get('drop_feature_rate1', 0.1)
         self.pe2 = config.get('drop_edge_rate2', 0.5)
         self.pf2 = config.get('drop_feature_rate2', 0.1)
+        # mask the rows of the first weight instead of copying X, see MaskedFeatures
+        self.lazy_feature_mask = config.get('lazy_feature_mask', False)
+
+        self.encoder = config.get('encoder', 'gcn')
+        self.num_hops = config.get('num_hops', 3)
+        self.sign_dropout = config.get('sign_dropout', 0.0)
 
-        aug1 = A.Compose([A.EdgeRemoving(pe=self.pe1), A.FeatureMasking(pf=self.pf1)])
-        aug2 = A.Compose([A.EdgeRemoving(pe=self.pe2), A.FeatureMasking(pf=self.pf2)])
+        if self.encoder == 'sign':
+            # edges of the precomputed hops cannot be dropped, drop hop features instead
+            aug1 = A.Compose([A.FeatureDropout(pf=self.pe1), A.FeatureMasking(pf=self.pf1, lazy=self.lazy_feature_mask)])
+            aug2 = A.Compose([A.FeatureDropout(pf=self.pe2), A.FeatureMasking(pf=self.pf2, lazy=self.lazy_feature_mask)])
+        else:
+            aug1 = A.Compose([A.EdgeRemoving(pe=self.pe1), A.FeatureMasking(pf=self.pf1, lazy=self.lazy_feature_mask)])
+            aug2 = A.Compose([A.EdgeRemoving(pe=self.pe2), A.FeatureMasking(pf=self.pf2, lazy=self.lazy_feature_mask)])
 
         super().__init__(config, data_feature)
 
-        self.gconv = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, num_layers=self.layers).to(self.device)
+        body = None
+        if self.encoder == 'sign':
+            body = SIGNEncoder(self.input_dim * (self.num_hops + 1), self.nhid, self.layers, dropout=self.sign_dropout)
+        self.gconv = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, num_layers=self.layers,
+                           body=body, activation_checkpoint=config.get('activation_checkpoint', False)).to(self.device)
         self.encoder_model = Encoder(encoder=self.gconv, augmentor=(aug1, aug2), hidden_dim=self.nhid).to(self.device)
         self.contrast_model = BootstrapContrast(loss=L.BootstrapLatent(), mode='L2L').to(self.device)
@@ -12,6 +12,7 @@ from torch.optim import Adam
 from libgptb.evaluators import get_split, LREvaluator
 from torch_geometric.nn import GCNConv
 from libgptb.model.abstract_gcl_model import AbstractGCLModel
+from libgptb.model.layers import checkpoint_layer, gcn_conv, gcn_inference_stages
 
 def _similarity(h1: torch.Tensor, h2: torch.Tensor):
     h1 = F.normalize(h1)
@@ -26,8 +27,8 @@ class COSTAInfoNCE(object):
     def compute(self, anchor, sample):
         sim = _similarity(anchor, sample) / self.tau
         exp_sim = torch.exp(sim)
-        log_prob = sim - torch.log(exp_sim.sum(dim=1, keepdim=True))
-        loss = log_prob.diag()
+        # only the diagonal of log_prob is used; the row sums accumulate in fp32
+        loss = sim.diag().float() - torch.log(exp_sim.sum(dim=1, dtype=torch.float32))
         return -loss.mean()
 
     def __call__(self, anchor, sample) -> torch.FloatTensor:
@@ -47,8 +48,10 @@ class DualBranchContrast(torch.nn.Module):
 
 
 class GConv(torch.nn.Module):
-    def __init__(self, input_dim, hidden_dim, activation, num_layers):
+    def __init__(self, input_dim, hidden_dim, activation, num_layers, activation_checkpoint=False):
         super(GConv, self).__init__()
+        # recompute the activations of every conv in backward instead of storing them
+        self.activation_checkpoint = activation_checkpoint
         self.activation = activation()
         self.layers = torch.nn.ModuleList()
         self.layers.append(GCNConv(input_dim, hidden_dim, cached=False))
@@ -58,10 +61,19 @@ class GConv(torch.nn.Module):
     def forward(self, x, edge_index, edge_weight=None):
         z = x
         for i, conv in enumerate(self.layers):
-            z = conv(z, edge_index, edge_weight)
+            z = checkpoint_layer(self.activation_checkpoint, gcn_conv, conv, z, edge_index, edge_weight)
             z = self.activation(z)
         return z
-    
+
+    def inference_stages(self):
+        """
+        the encoder as ``InferenceEngine`` stages, see ``libgptb.model.inference``
+        """
+        stages = []
+        for conv in self.layers:
+            stages += gcn_inference_stages(conv) + [self.activation]
+        return stages
+
 
 class Encoder(torch.nn.Module):
     def __init__(self, encoder, augmentor, hidden_dim, proj_dim, ratio, device):
@@ -81,16 +93,19 @@ class Encoder(torch.nn.Module):
         return self.fc2(z)
     
 
-    def forward(self, x, edge_index, edge_weight=None):
+    def forward(self, x, edge_index, edge_weight=None, num_seeds=None):
         aug1, aug2 = self.augmentor
         x1, edge_index1, edge_weight1 = aug1(x, edge_index, edge_weight)
         x2, edge_index2, edge_weight2 = aug2(x, edge_index, edge_weight)
         z = self.encoder(x, edge_index, edge_weight)
         z1 = self.encoder(x1, edge_index1, edge_weight1)
         z2 = self.encoder(x2, edge_index2, edge_weight2)
+        if num_seeds is not None:
+            # sampled subgraph: sketch only the seed nodes, neighbours are context
+            z1, z2 = z1[:num_seeds], z2[:num_seeds]
 
-        k = torch.tensor(int(z.shape[0] * self.ratio))
-        p = (1/torch.sqrt(k))*torch.randn(k, z.shape[0]).to(self.device)
+        k = torch.tensor(int(z1.shape[0] * self.ratio))
+        p = (1/torch.sqrt(k))*torch.randn(k, z1.shape[0]).to(self.device)
 
         z1 = p @ z1
         z2 = p @ z2 
@@ -111,17 +126,20 @@ class COSTA(AbstractGCLModel):
         self.pf1 = config.get('drop_feature_rate1', 0.1)
         self.pe2 = config.get('drop_edge_rate2', 0.5)
         self.pf2 = config.get('drop_feature_rate2', 0.1)
+        # mask the rows of the first weight instead of copying X, see MaskedFeatures
+        self.lazy_feature_mask = config.get('lazy_feature_mask', False)
 
         self.ratio = config.get('ratio', 0.5)
         self.tau = config.get('tau',0.1)
 
-        aug1 = A.Compose([A.EdgeRemoving(pe=self.pe1), A.FeatureMasking(pf=self.pf1)])
-        aug2 = A.Compose([A.EdgeRemoving(pe=self.pe2), A.FeatureMasking(pf=self.pf2)])
+        aug1 = A.Compose([A.EdgeRemoving(pe=self.pe1), A.FeatureMasking(pf=self.pf1, lazy=self.lazy_feature_mask)])
+        aug2 = A.Compose([A.EdgeRemoving(pe=self.pe2), A.FeatureMasking(pf=self.pf2, lazy=self.lazy_feature_mask)])
 
         super().__init__(config, data_feature)
 
         self.gconv = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, \
-                            activation=torch.nn.ReLU, num_layers=self.layers).to(self.device)
+                            activation=torch.nn.ReLU, num_layers=self.layers,\
+                            activation_checkpoint=config.get('activation_checkpoint', False)).to(self.device)
         self.encoder_model = Encoder(encoder=self.gconv,augmentor=(aug1, aug2),\
                                       hidden_dim=self.nhid, proj_dim = self.pnhid,\
                                         ratio =self.ratio, device=self.device).to(self.device)
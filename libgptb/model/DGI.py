@@ -12,10 +12,13 @@ from torch_geometric.nn import GCNConv
 from torch_geometric.nn import SAGEConv
 from torch_geometric.nn.inits import uniform
 from libgptb.model.abstract_gcl_model import AbstractGCLModel
+from libgptb.model.layers import checkpoint_layer, gcn_conv, gcn_forward_corrupted, gcn_inference_stages
 
 class GConv(nn.Module):
-    def __init__(self, input_dim, hidden_dim, num_layers):
+    def __init__(self, input_dim, hidden_dim, num_layers, activation_checkpoint=False):
         super(GConv, self).__init__()
+        # recompute the activations of every conv in backward instead of storing them
+        self.activation_checkpoint = activation_checkpoint
         self.layers = torch.nn.ModuleList()
         self.activations = torch.nn.ModuleList()
         for i in range(num_layers):
@@ -28,15 +31,33 @@ class GConv(nn.Module):
     def forward(self, x, edge_index, edge_weight=None):
         z = x
         for conv, act in zip(self.layers, self.activations):
-            z = conv(z, edge_index, edge_weight)
+            z = checkpoint_layer(self.activation_checkpoint, gcn_conv, conv, z, edge_index, edge_weight)
             z = act(z)
         return z
 
+    def forward_corrupted(self, x, perm, edge_index, edge_weight=None):
+        """
+        Encode ``x`` and its row-permuted corruption ``x[perm]`` together, see
+        ``libgptb.model.layers.gcn_forward_corrupted``.
+        """
+        return gcn_forward_corrupted(self.layers, self.activations, x, perm, edge_index, edge_weight,
+                                     self.activation_checkpoint)
+
+    def inference_stages(self):
+        """
+        the encoder as ``InferenceEngine`` stages, see ``libgptb.model.inference``
+        """
+        stages = []
+        for conv, act in zip(self.layers, self.activations):
+            stages += gcn_inference_stages(conv) + [act]
+        return stages
+
 
 class Encoder(torch.nn.Module):
-    def __init__(self, encoder, hidden_dim):
+    def __init__(self, encoder, hidden_dim, shared_propagation=False):
         super(Encoder, self).__init__()
         self.encoder = encoder
+        self.shared_propagation = shared_propagation
         self.project = torch.nn.Linear(hidden_dim, hidden_dim)
         uniform(hidden_dim, self.project.weight)
 
@@ -45,9 +66,13 @@ class Encoder(torch.nn.Module):
         return x[torch.randperm(x.size(0))], edge_index
 
     def forward(self, x, edge_index):
-        z = self.encoder(x, edge_index)
+        if self.shared_propagation:
+            perm = torch.randperm(x.size(0), device=x.device)
+            z, zn = self.encoder.forward_corrupted(x, perm, edge_index)
+        else:
+            z = self.encoder(x, edge_index)
+            zn = self.encoder(*self.corruption(x, edge_index))
         g = self.project(torch.sigmoid(z.mean(dim=0, keepdim=True)))
-        zn = self.encoder(*self.corruption(x, edge_index))
         return z, g, zn
     
 class DGI(AbstractGCLModel):
@@ -56,9 +81,14 @@ class DGI(AbstractGCLModel):
         self.nhid = config.get('nhid', 32)
         self.layers = config.get('layers', 3)
         self.device = config.get('device', torch.device('cpu'))
+        self.sparse_features = config.get('sparse_features', False)
+        # rows of sparse features cannot be permuted; the shared path permutes lin(x) instead
+        self.shared_propagation = config.get('shared_propagation', False) or self.sparse_features
         self.input_dim = data_feature.get('input_dim', 2)
         super().__init__(config, data_feature)
 
-        self.gconv = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, num_layers=self.layers).to(self.device)
-        self.encoder_model = Encoder(encoder=self.gconv, hidden_dim=self.nhid).to(self.device)
+        self.gconv = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, num_layers=self.layers,
+                           activation_checkpoint=config.get('activation_checkpoint', False)).to(self.device)
+        self.encoder_model = Encoder(encoder=self.gconv, hidden_dim=self.nhid,
+                                     shared_propagation=self.shared_propagation).to(self.device)
         self.contrast_model = SingleBranchContrast(loss=L.JSD(), mode='G2L').to(self.device)
@@ -13,23 +13,34 @@ from libgptb.evaluators import get_split, LREvaluator
 from libgptb.models import  WithinEmbedContrast
 from torch_geometric.nn import GCNConv
 from libgptb.model.abstract_gcl_model import AbstractGCLModel
+from libgptb.model.layers import checkpoint_layer, gcn_conv, gcn_inference_stages
+from libgptb.model.sign import SIGNEncoder
 
 
 class GConv(torch.nn.Module):
-    def __init__(self, input_dim, hidden_dim):
+    def __init__(self, input_dim, hidden_dim, activation_checkpoint=False):
         super(GConv, self).__init__()
+        # recompute the activations of every conv in backward instead of storing them
+        self.activation_checkpoint = activation_checkpoint
         self.act = torch.nn.PReLU()
         self.bn = torch.nn.BatchNorm1d(2 * hidden_dim, momentum=0.01)
         self.conv1 = GCNConv(input_dim, 2 * hidden_dim, cached=False)
         self.conv2 = GCNConv(2 * hidden_dim, hidden_dim, cached=False)
 
     def forward(self, x, edge_index, edge_weight=None):
-        z = self.conv1(x, edge_index, edge_weight)
+        z = checkpoint_layer(self.activation_checkpoint, gcn_conv, self.conv1, x, edge_index, edge_weight)
         z = self.bn(z)
         z = self.act(z)
-        z = self.conv2(z, edge_index, edge_weight)
+        z = checkpoint_layer(self.activation_checkpoint, self.conv2, z, edge_index, edge_weight)
         return z
-    
+
+    def inference_stages(self):
+        """
+        the encoder as ``InferenceEngine`` stages, see ``libgptb.model.inference``
+        """
+        return gcn_inference_stages(self.conv1) + [self.bn, self.act] + gcn_inference_stages(self.conv2)
+
+
 class Encoder(torch.nn.Module):
     def __init__(self, encoder, augmentor):
         super(Encoder, self).__init__()
@@ -56,12 +67,28 @@ class GBT(AbstractGCLModel):
         self.pf1 = config.get('drop_feature_rate1', 0.1)
         self.pe2 = config.get('drop_edge_rate2', 0.5)
         self.pf2 = config.get('drop_feature_rate2', 0.1)
+        # mask the rows of the first weight instead of copying X, see MaskedFeatures
+        self.lazy_feature_mask = config.get('lazy_feature_mask', False)
+
+        self.encoder = config.get('encoder', 'gcn')
+        self.num_hops = config.get('num_hops', 3)
+        self.sign_dropout = config.get('sign_dropout', 0.0)
 
-        aug1 = A.Compose([A.EdgeRemoving(pe=self.pe1), A.FeatureMasking(pf=self.pf1)])
-        aug2 = A.Compose([A.EdgeRemoving(pe=self.pe2), A.FeatureMasking(pf=self.pf2)])
+        if self.encoder == 'sign':
+            # edges of the precomputed hops cannot be dropped, drop hop features instead
+            aug1 = A.Compose([A.FeatureDropout(pf=self.pe1), A.FeatureMasking(pf=self.pf1, lazy=self.lazy_feature_mask)])
+            aug2 = A.Compose([A.FeatureDropout(pf=self.pe2), A.FeatureMasking(pf=self.pf2, lazy=self.lazy_feature_mask)])
+        else:
+            aug1 = A.Compose([A.EdgeRemoving(pe=self.pe1), A.FeatureMasking(pf=self.pf1, lazy=self.lazy_feature_mask)])
+            aug2 = A.Compose([A.EdgeRemoving(pe=self.pe2), A.FeatureMasking(pf=self.pf2, lazy=self.lazy_feature_mask)])
 
         super().__init__(config, data_feature)
 
-        self.gconv = GConv(input_dim=self.input_dim, hidden_dim=self.nhid).to(self.device)
+        if self.encoder == 'sign':
+            self.gconv = SIGNEncoder(self.input_dim * (self.num_hops + 1), self.nhid, 2,
+                                     dropout=self.sign_dropout).to(self.device)
+        else:
+            self.gconv = GConv(input_dim=self.input_dim, hidden_dim=self.nhid,
+                               activation_checkpoint=config.get('activation_checkpoint', False)).to(self.device)
         self.encoder_model = Encoder(encoder=self.gconv, augmentor=(aug1, aug2)).to(self.device)
         self.contrast_model =  WithinEmbedContrast(loss=L.BarlowTwins(), mode='L2L').to(self.device)
@@ -11,10 +11,14 @@ from libgptb.models import CCAContrast
 import dgl
 from dgl.nn import GraphConv
 from libgptb.model.abstract_gcl_model import AbstractGCLModel
+from libgptb.model.layers import checkpoint_layer, graphconv, graphconv_inference_stages
+from libgptb.model.sign import SIGNEncoder
 from libgptb.models import DualBranchContrast,InfoNCEContrast_RFF
 class GCN(nn.Module):
-    def __init__(self, in_dim, hid_dim, num_layers):
+    def __init__(self, in_dim, hid_dim, num_layers, activation_checkpoint=False):
         super().__init__()
+        # recompute the activations of every conv in backward instead of storing them
+        self.activation_checkpoint = activation_checkpoint
 
         self.num_layers = num_layers
         self.convs = nn.ModuleList()
@@ -29,11 +33,20 @@ class GCN(nn.Module):
     def forward(self, graph, x):
 
         for i in range(self.num_layers - 1):
-            x = F.relu(self.convs[i](graph, x))
-        x = self.convs[-1](graph, x)
+            x = F.relu(checkpoint_layer(self.activation_checkpoint, graphconv, self.convs[i], graph, x))
+        x = checkpoint_layer(self.activation_checkpoint, graphconv, self.convs[-1], graph, x)
 
         return x
 
+    def inference_stages(self):
+        """
+        the encoder as ``InferenceEngine`` stages, see ``libgptb.model.inference``
+        """
+        stages = []
+        for i in range(self.num_layers - 1):
+            stages += graphconv_inference_stages(self.convs[i]) + [F.relu]
+        return stages + graphconv_inference_stages(self.convs[-1])
+
 
 class Encoder(torch.nn.Module):
     def __init__(self, encoder, hidden_dim):
@@ -65,9 +78,18 @@ class GRACE(AbstractGCLModel):
         self.mode = config.get('mode', 'rff')
 
         self.input_dim = data_feature.get('input_dim', 2)
+        self.encoder = config.get('encoder', 'gcn')
+        self.num_hops = config.get('num_hops', 3)
+        # edges of the precomputed hops cannot be dropped, drop hop features instead
+        self.sign_dropout = config.get('sign_dropout', config.get('dfr', 0.2))
         super().__init__(config, data_feature)
 
-        self.gconv = GCN(in_dim=self.input_dim, hid_dim=self.nhid, num_layers=self.layers).to(self.device)
+        if self.encoder == 'sign':
+            self.gconv = SIGNEncoder(self.input_dim * (self.num_hops + 1), self.nhid, self.layers,
+                                     dropout=self.sign_dropout, graph_first=True).to(self.device)
+        else:
+            self.gconv = GCN(in_dim=self.input_dim, hid_dim=self.nhid, num_layers=self.layers,
+                             activation_checkpoint=config.get('activation_checkpoint', False)).to(self.device)
         self.encoder_model = Encoder(encoder=self.gconv, hidden_dim=self.nhid).to(self.device)
         self.contrast_model = InfoNCEContrast_RFF(loss=L.InfoNCE_RFF(tau = self.tau, rff_dim = self.rff_dim, mode = self.mode)).to(self.device)
         # self.contrast_model = DualBranchContrast(loss=L.InfoNCE(tau = self.tau), mode='L2L').to(self.device)
\ No newline at end of file
@@ -9,15 +9,19 @@ from tqdm import tqdm
 from torch.optim import Adam
 from libgptb.model.abstract_gcl_model import AbstractGCLModel
 from libgptb.models import DualBranchContrast
-from torch_geometric.nn import GINConv, global_add_pool
+from torch_geometric.nn import GINConv
+from libgptb.model.layers import batch_ptr, checkpoint_layer, fused_readout
 
 
 def make_gin_conv(input_dim, out_dim):
     return GINConv(nn.Sequential(nn.Linear(input_dim, out_dim), nn.ReLU(), nn.Linear(out_dim, out_dim)))
 
 class GConv(nn.Module):
-    def __init__(self, input_dim, hidden_dim, num_layers):
+    def __init__(self, input_dim, hidden_dim, num_layers, activation_checkpoint=False, readouts=('sum',)):
         super(GConv, self).__init__()
+        self.readouts = readouts
+        # recompute the activations of every conv in backward instead of storing them
+        self.activation_checkpoint = activation_checkpoint
         self.layers = nn.ModuleList()
         self.batch_norms = nn.ModuleList()
 
@@ -30,21 +34,23 @@ class GConv(nn.Module):
 
         project_dim = hidden_dim * num_layers
         self.project = torch.nn.Sequential(
-            nn.Linear(project_dim, project_dim),
+            nn.Linear(project_dim * len(readouts), project_dim),
             nn.ReLU(inplace=True),
             nn.Linear(project_dim, project_dim))
 
-    def forward(self, x, edge_index, batch):
+    def forward(self, x, edge_index, batch, ptr=None):
         z = x
-        zs = []
-        for conv, bn in zip(self.layers, self.batch_norms):
-            z = conv(z, edge_index)
+        zs = None
+        for i, (conv, bn) in enumerate(zip(self.layers, self.batch_norms)):
+            z = checkpoint_layer(self.activation_checkpoint, conv, z, edge_index)
             z = F.relu(z)
             z = bn(z)
-            zs.append(z)
-        gs = [global_add_pool(z, batch) for z in zs]
-        z, g = [torch.cat(x, dim=1) for x in [zs, gs]]
-        return z, g
+            # layer outputs are written side by side into one buffer and pooled once
+            if zs is None:
+                zs = z.new_empty(z.size(0), z.size(1) * len(self.layers))
+            zs[:, i * z.size(1):(i + 1) * z.size(1)] = z
+        g = fused_readout(zs, batch_ptr(batch, ptr), self.readouts)
+        return zs, g
 
 
 class Encoder(torch.nn.Module):
@@ -53,13 +59,15 @@ class Encoder(torch.nn.Module):
         self.encoder = encoder
         self.augmentor = augmentor
 
-    def forward(self, x, edge_index, batch):
+    def forward(self, x, edge_index, batch, ptr=None):
         aug1, aug2 = self.augmentor
         x1, edge_index1, edge_weight1 = aug1(x, edge_index)
         x2, edge_index2, edge_weight2 = aug2(x, edge_index)
-        z, g = self.encoder(x, edge_index, batch)
-        z1, g1 = self.encoder(x1, edge_index1, batch)
-        z2, g2 = self.encoder(x2, edge_index2, batch)
+        # the augmentations keep every node, so the graph offsets are shared
+        ptr = batch_ptr(batch, ptr)
+        z, g = self.encoder(x, edge_index, batch, ptr)
+        z1, g1 = self.encoder(x1, edge_index1, batch, ptr)
+        z2, g2 = self.encoder(x2, edge_index2, batch, ptr)
         return z, g, z1, z2, g1, g2
 
 class GraphCL(AbstractGCLModel):
@@ -77,6 +85,8 @@ class GraphCL(AbstractGCLModel):
                             A.NodeDropping(pn=0.1),
                             A.FeatureMasking(pf=0.1),
                             A.EdgeRemoving(pe=0.1)], 1)
-        gconv = GConv(input_dim=self.input_dim, hidden_dim=self.hidden_dim, num_layers=self.num_layers).to(self.device)
+        gconv = GConv(input_dim=self.input_dim, hidden_dim=self.hidden_dim, num_layers=self.num_layers,
+                      activation_checkpoint=config.get('activation_checkpoint', False),
+                      readouts=config.get('readouts', ['sum'])).to(self.device)
         self.encoder_model = Encoder(encoder=gconv, augmentor=(aug1, aug2)).to(self.device)
         self.contrast_model = DualBranchContrast(loss=L.InfoNCE(tau=0.2), mode='G2G').to(self.device)
\ No newline at end of file
@@ -11,6 +11,7 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from torch_geometric.nn import GINConv, MLP
+from torch_scatter import gather_csr, segment_csr
 def sce_loss(x, y, alpha=3):
     x = F.normalize(x, p=2, dim=-1)
     y = F.normalize(y, p=2, dim=-1)
@@ -35,32 +36,27 @@ class NormLayer(nn.Module):
             self.bias = nn.Parameter(torch.zeros(hidden_dim))
 
             self.mean_scale = nn.Parameter(torch.ones(hidden_dim))
+            # CSR offsets of the graphs in the batch, shared by every NormLayer of the
+            # model and set once per batch, see GraphMAE.set_graph_ptr
+            self.ptr = None
         else:
             raise NotImplementedError
-        
-    def forward(self, graph, x):
+
+    def forward(self, x):
         tensor = x
         if self.norm is not None and type(self.norm) != str:
             return self.norm(tensor)
         elif self.norm is None:
             return tensor
 
-        batch_list = graph.batch_num_nodes
-        batch_size = len(batch_list)
-        batch_list = torch.Tensor(batch_list).long().to(tensor.device)
-        batch_index = torch.arange(batch_size).to(tensor.device).repeat_interleave(batch_list)
-        batch_index = batch_index.view((-1,) + (1,) * (tensor.dim() - 1)).expand_as(tensor)
-        mean = torch.zeros(batch_size, *tensor.shape[1:]).to(tensor.device)
-        mean = mean.scatter_add_(0, batch_index, tensor)
-        mean = (mean.T / batch_list).T
-        mean = mean.repeat_interleave(batch_list, dim=0)
-
+        ptr = self.ptr
+        if ptr is None:
+            # a single graph
+            ptr = torch.tensor([0, tensor.size(0)], device=tensor.device)
+        # segment reductions over the contiguous node ranges of the graphs
+        mean = gather_csr(segment_csr(tensor, ptr, reduce="mean"), ptr)
         sub = tensor - mean * self.mean_scale
-
-        std = torch.zeros(batch_size, *tensor.shape[1:]).to(tensor.device)
-        std = std.scatter_add_(0, batch_index, sub.pow(2))
-        std = ((std.T / batch_list).T + 1e-6).sqrt()
-        std = std.repeat_interleave(batch_list, dim=0)
+        std = (gather_csr(segment_csr(sub.pow(2), ptr, reduce="mean"), ptr) + 1e-6).sqrt()
         return self.weight * sub / std + self.bias
 def create_norm(name):
     if name == "layernorm":
@@ -68,7 +64,7 @@ def create_norm(name):
     elif name == "batchnorm":
         return nn.BatchNorm1d
     elif name == "graphnorm":
-        return partial(NormLayer, norm_type="groupnorm")
+        return partial(NormLayer, norm_type="graphnorm")
     else:
         return nn.Identity
 
@@ -150,6 +146,34 @@ class GIN(nn.Module):
         else:
             return self.head(h)
 
+    def forward_targets(self, inputs, edge_index, targets):
+        """
+        ``forward(inputs, edge_index)[targets]``, but the last layer only aggregates
+        the messages sent to ``targets``. The MLPs must be row-wise (no batchnorm or
+        graphnorm), they see the target rows only.
+
+        Args:
+            inputs(torch.Tensor): node features, shape (N, F)
+            edge_index(torch.LongTensor): graph connectivity
+            targets(torch.LongTensor): nodes whose output is needed, shape (M,)
+
+        Returns:
+            torch.Tensor: outputs of ``targets``, shape (M, out_dim)
+        """
+        h = inputs
+        for l in range(self.num_layers - 1):
+            h = F.dropout(h, p=self.dropout, training=self.training)
+            h = self.layers[l](h, edge_index)
+        h = F.dropout(h, p=self.dropout, training=self.training)
+        # bipartite graph from all nodes to the targets, renumbered 0..M-1
+        local = torch.full((h.size(0),), -1, dtype=torch.long, device=h.device)
+        local[targets] = torch.arange(targets.numel(), device=h.device)
+        src, dst = edge_index
+        keep = local[dst] >= 0
+        sub_edge_index = torch.stack([src[keep], local[dst[keep]]])
+        h = self.layers[-1]((h, h[targets]), sub_edge_index, size=(h.size(0), targets.numel()))
+        return self.head(h)
+
 
 
 class ApplyNodeFunc(nn.Module):
@@ -277,6 +301,11 @@ class GraphMAE(nn.Module):
         
         self._replace_rate = replace_rate
         self._mask_token_rate = 1 - self._replace_rate
+        # decode the masked nodes only; batch statistics of the decoder would change
+        self._decode_masked_only = config.get("decode_masked_only", True) and \
+            (decoder_type in ("mlp", "linear") or norm not in ("batchnorm", "graphnorm"))
+        # token mask reused across steps of equal node count
+        self._token_mask = None
 
         assert num_hidden % nhead == 0
         assert num_hidden % nhead_out == 0
@@ -353,7 +382,6 @@ class GraphMAE(nn.Module):
     def encoding_mask_noise(self, x, mask_rate=0.3):
         num_nodes = x.shape[0]
         perm = torch.randperm(num_nodes, device=x.device)
-        num_mask_nodes = int(mask_rate * num_nodes)
 
         # random masking
         num_mask_nodes = int(mask_rate * num_nodes)
@@ -366,23 +394,41 @@ class GraphMAE(nn.Module):
             token_nodes = mask_nodes[perm_mask[: int(self._mask_token_rate * num_mask_nodes)]]
             noise_nodes = mask_nodes[perm_mask[-int(self._replace_rate * num_mask_nodes):]]
             noise_to_be_chosen = torch.randperm(num_nodes, device=x.device)[:num_noise_nodes]
-
-            out_x = x.clone()
-            out_x[token_nodes] = 0.0
-            out_x[noise_nodes] = x[noise_to_be_chosen]
         else:
-            out_x = x.clone()
             token_nodes = mask_nodes
-            out_x[mask_nodes] = 0.0
+            noise_nodes = None
 
-        out_x[token_nodes] += self.enc_mask_token
+        if self._token_mask is None or self._token_mask.numel() != num_nodes \
+                or self._token_mask.device != x.device:
+            self._token_mask = torch.zeros(num_nodes, dtype=torch.bool, device=x.device)
+        token_mask = self._token_mask.fill_(False)
+        token_mask[token_nodes] = True
+
+        # one (N, F) allocation: token rows take the mask token, the others x
+        out_x = torch.where(token_mask.unsqueeze(-1), self.enc_mask_token.to(x.dtype), x)
+        if noise_nodes is not None:
+            out_x = out_x.index_put_((noise_nodes,), x[noise_to_be_chosen])
 
         return out_x, (mask_nodes, keep_nodes)
 
-    def forward(self, x, edge_index):
+    def set_graph_ptr(self, ptr):
+        """
+        Share the graph boundaries of the current batch with every graphnorm layer.
+
+        Args:
+            ptr(torch.LongTensor): CSR offsets of the graphs, ``Batch.ptr``, or None
+                when the input is a single graph
+        """
+        for module in self.modules():
+            if isinstance(module, NormLayer) and module.norm == "graphnorm":
+                module.ptr = ptr
+
+    def forward(self, x, edge_index, ptr=None):
         # ---- attribute reconstruction ----
+        self.set_graph_ptr(ptr)
         loss = self.mask_attr_prediction(x, edge_index)
-        loss_item = {"loss": loss.item()}
+        # detached, not .item(): reading it would sync the device every step
+        loss_item = {"loss": loss.detach()}
         return loss, loss_item
     
     def mask_attr_prediction(self, x, edge_index):
@@ -399,6 +445,12 @@ class GraphMAE(nn.Module):
             enc_rep = torch.cat(all_hidden, dim=1)
 
         # ---- attribute reconstruction ----
+        x_init = x[mask_nodes]
+        if self._decode_masked_only and self._decoder_type in ("mlp", "linear"):
+            # the loss only reads the masked rows, the decoder is row-wise
+            x_rec = self.decoder(self.encoder_to_decoder(enc_rep[mask_nodes]))
+            return self.criterion(x_rec, x_init)
+
         rep = self.encoder_to_decoder(enc_rep)
 
         if self._decoder_type not in ("mlp", "linear"):
@@ -407,16 +459,19 @@ class GraphMAE(nn.Module):
 
         if self._decoder_type in ("mlp", "linear") :
             recon = self.decoder(rep)
+        elif self._decode_masked_only:
+            recon = self.decoder.forward_targets(rep, use_edge_index, mask_nodes)
+            return self.criterion(recon, x_init)
         else:
             recon = self.decoder(rep, use_edge_index)
 
-        x_init = x[mask_nodes]
         x_rec = recon[mask_nodes]
 
         loss = self.criterion(x_rec, x_init)
         return loss
 
-    def embed(self, x, edge_index):
+    def embed(self, x, edge_index, ptr=None):
+        self.set_graph_ptr(ptr)
         rep = self.encoder(x, edge_index)
         return rep
 
@@ -6,7 +6,8 @@ from torch.nn import Sequential, Linear, ReLU
 import numpy as np
 import os.path as osp
 import sys
-from torch_geometric.nn import GINConv, global_add_pool
+from torch_geometric.nn import GINConv
+from libgptb.model.layers import batch_ptr, checkpoint_layer, fused_readout
 from libgptb.models import SingleBranchContrast
 import libgptb.losses as L
 import math
@@ -17,8 +18,11 @@ def make_gin_conv(input_dim, out_dim):
 
 
 class GConv(nn.Module):
-    def __init__(self, input_dim, hidden_dim, activation, num_layers):
+    def __init__(self, input_dim, hidden_dim, activation, num_layers, activation_checkpoint=False, readouts=('sum',)):
         super(GConv, self).__init__()
+        self.readouts = readouts
+        # recompute the activations of every conv in backward instead of storing them
+        self.activation_checkpoint = activation_checkpoint
         self.activation = activation()
         self.layers = nn.ModuleList()
         self.batch_norms = nn.ModuleList()
@@ -29,31 +33,34 @@ class GConv(nn.Module):
                 self.layers.append(make_gin_conv(hidden_dim, hidden_dim))
             self.batch_norms.append(nn.BatchNorm1d(hidden_dim))
 
-    def forward(self, x, edge_index, batch):
+    def forward(self, x, edge_index, batch, ptr=None):
         z = x
-        zs = []
-        for conv, bn in zip(self.layers, self.batch_norms):
-            z = conv(z, edge_index)
+        zs = None
+        for i, (conv, bn) in enumerate(zip(self.layers, self.batch_norms)):
+            z = checkpoint_layer(self.activation_checkpoint, conv, z, edge_index)
             z = self.activation(z)
             z = bn(z)
-            zs.append(z)
-        gs = [global_add_pool(z, batch) for z in zs]
-        z, g = [torch.cat(x, dim=1) for x in [zs, gs]]
-        return z, g
+            # layer outputs are written side by side into one buffer and pooled once
+            if zs is None:
+                zs = z.new_empty(z.size(0), z.size(1) * len(self.layers))
+            zs[:, i * z.size(1):(i + 1) * z.size(1)] = z
+        g = fused_readout(zs, batch_ptr(batch, ptr), self.readouts)
+        return zs, g
 
 
 class FC(nn.Module):
-    def __init__(self, hidden_dim):
+    def __init__(self, hidden_dim, input_dim=None):
         super(FC, self).__init__()
+        input_dim = hidden_dim if input_dim is None else input_dim
         self.fc = nn.Sequential(
-            nn.Linear(hidden_dim, hidden_dim),
+            nn.Linear(input_dim, hidden_dim),
             nn.ReLU(),
             nn.Linear(hidden_dim, hidden_dim),
             nn.ReLU(),
             nn.Linear(hidden_dim, hidden_dim),
             nn.ReLU()
         )
-        self.linear = nn.Linear(hidden_dim, hidden_dim)
+        self.linear = nn.Linear(input_dim, hidden_dim)
 
     def forward(self, x):
         return self.fc(x) + self.linear(x)
@@ -66,8 +73,8 @@ class Encoder(torch.nn.Module):
         self.local_fc = local_fc
         self.global_fc = global_fc
 
-    def forward(self, x, edge_index, batch):
-        z, g = self.encoder(x, edge_index, batch)
+    def forward(self, x, edge_index, batch, ptr=None):
+        z, g = self.encoder(x, edge_index, batch, ptr)
         return z, g
 
     def project(self, z, g):
@@ -87,12 +94,15 @@ class InfoGraph(nn.Module):
         self.device = config.get('device', torch.device('cpu'))
         self.input_dim = max( data_feature.get('input_dim'), 1)
 
+        self.readouts = config.get('readouts', ['sum'])
         self.embedding_dim  = self.nhid * self.layers
         self.encoder_model = Encoder(self.input_dim, self.nhid, self.layers)
 
-        gconv = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, activation=torch.nn.ReLU, num_layers=self.layers).to(self.device)
+        gconv = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, activation=torch.nn.ReLU, num_layers=self.layers,
+                      activation_checkpoint=config.get('activation_checkpoint', False),
+                      readouts=self.readouts).to(self.device)
         fc1 = FC(hidden_dim=self.nhid * self.layers)
-        fc2 = FC(hidden_dim=self.nhid * self.layers)
+        fc2 = FC(hidden_dim=self.nhid * self.layers, input_dim=self.nhid * self.layers * len(self.readouts))
         self.encoder_model = Encoder(encoder=gconv, local_fc=fc1, global_fc=fc2).to(self.device)
         self.contrast_model = SingleBranchContrast(loss=L.JSD(), mode='G2L').to(self.device)
 
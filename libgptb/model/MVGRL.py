@@ -12,10 +12,13 @@ from torch_geometric.nn import GCNConv
 from torch_geometric.nn import SAGEConv
 from torch_geometric.nn.inits import uniform
 from libgptb.model.abstract_gcl_model import AbstractGCLModel
+from libgptb.model.layers import checkpoint_layer, gcn_conv, gcn_forward_corrupted, gcn_inference_stages
 
 class GConv(nn.Module):
-    def __init__(self, input_dim, hidden_dim, num_layers):
+    def __init__(self, input_dim, hidden_dim, num_layers, activation_checkpoint=False):
         super(GConv, self).__init__()
+        # recompute the activations of every conv in backward instead of storing them
+        self.activation_checkpoint = activation_checkpoint
         self.layers = torch.nn.ModuleList()
         self.activations = torch.nn.ModuleList()
         for i in range(num_layers):
@@ -28,17 +31,35 @@ class GConv(nn.Module):
     def forward(self, x, edge_index, edge_weight=None):
         z = x
         for conv, act in zip(self.layers, self.activations):
-            z = conv(z, edge_index, edge_weight)
+            z = checkpoint_layer(self.activation_checkpoint, gcn_conv, conv, z, edge_index, edge_weight)
             z = act(z)
         return z
 
+    def forward_corrupted(self, x, perm, edge_index, edge_weight=None):
+        """
+        Encode ``x`` and its row-permuted corruption ``x[perm]`` together, see
+        ``libgptb.model.layers.gcn_forward_corrupted``.
+        """
+        return gcn_forward_corrupted(self.layers, self.activations, x, perm, edge_index, edge_weight,
+                                     self.activation_checkpoint)
+
+    def inference_stages(self):
+        """
+        the encoder as ``InferenceEngine`` stages, see ``libgptb.model.inference``
+        """
+        stages = []
+        for conv, act in zip(self.layers, self.activations):
+            stages += gcn_inference_stages(conv) + [act]
+        return stages
+
 
 class Encoder(torch.nn.Module):
-    def __init__(self, encoder1, encoder2, augmentor, hidden_dim):
+    def __init__(self, encoder1, encoder2, augmentor, hidden_dim, shared_propagation=False):
         super(Encoder, self).__init__()
         self.encoder1 = encoder1
         self.encoder2 = encoder2
         self.augmentor = augmentor
+        self.shared_propagation = shared_propagation
         self.project = torch.nn.Linear(hidden_dim, hidden_dim)
         uniform(hidden_dim, self.project.weight)
 
@@ -50,12 +71,18 @@ class Encoder(torch.nn.Module):
         aug1, aug2 = self.augmentor
         x1, edge_index1, edge_weight1 = aug1(x, edge_index, edge_weight)
         x2, edge_index2, edge_weight2 = aug2(x, edge_index, edge_weight)
-        z1 = self.encoder1(x1, edge_index1, edge_weight1)
-        z2 = self.encoder2(x2, edge_index2, edge_weight2)
+        if self.shared_propagation:
+            perm1 = torch.randperm(x1.size(0), device=x1.device)
+            perm2 = torch.randperm(x2.size(0), device=x2.device)
+            z1, z1n = self.encoder1.forward_corrupted(x1, perm1, edge_index1, edge_weight1)
+            z2, z2n = self.encoder2.forward_corrupted(x2, perm2, edge_index2, edge_weight2)
+        else:
+            z1 = self.encoder1(x1, edge_index1, edge_weight1)
+            z2 = self.encoder2(x2, edge_index2, edge_weight2)
+            z1n = self.encoder1(*self.corruption(x1, edge_index1, edge_weight1))
+            z2n = self.encoder2(*self.corruption(x2, edge_index2, edge_weight2))
         g1 = self.project(torch.sigmoid(z1.mean(dim=0, keepdim=True)))
         g2 = self.project(torch.sigmoid(z2.mean(dim=0, keepdim=True)))
-        z1n = self.encoder1(*self.corruption(x1, edge_index1, edge_weight1))
-        z2n = self.encoder2(*self.corruption(x2, edge_index2, edge_weight2))
         return z1, z2, g1, g2, z1n, z2n
     
 class MVGRL(AbstractGCLModel):
@@ -64,12 +91,20 @@ class MVGRL(AbstractGCLModel):
         self.nhid = config.get('nhid', 32)
         self.layers = config.get('layers', 3)
         self.device = config.get('device', torch.device('cpu'))
+        self.sparse_features = config.get('sparse_features', False)
+        # rows of sparse features cannot be permuted; the shared path permutes lin(x) instead
+        self.shared_propagation = config.get('shared_propagation', False) or self.sparse_features
+        # every sampled subgraph is a new graph, so the diffusion cannot be cached
+        self.cache_diffusion = config.get('batch_mode', 'full') == 'full'
         self.input_dim = data_feature.get('input_dim', 2)
         super().__init__(config, data_feature)
         aug1 = A.Identity()
-        aug2 = A.PPRDiffusion(alpha=0.2)
+        aug2 = A.PPRDiffusion(alpha=0.2, use_cache=self.cache_diffusion)
 
-        self.gconv1 = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, num_layers=self.layers).to(self.device)
-        self.gconv2 = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, num_layers=self.layers).to(self.device)
-        self.encoder_model = Encoder(encoder1=self.gconv1, encoder2=self.gconv2, augmentor=(aug1,aug2), hidden_dim=self.nhid).to(self.device)
+        self.gconv1 = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, num_layers=self.layers,
+                            activation_checkpoint=config.get('activation_checkpoint', False)).to(self.device)
+        self.gconv2 = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, num_layers=self.layers,
+                            activation_checkpoint=config.get('activation_checkpoint', False)).to(self.device)
+        self.encoder_model = Encoder(encoder1=self.gconv1, encoder2=self.gconv2, augmentor=(aug1,aug2), hidden_dim=self.nhid,
+                                     shared_propagation=self.shared_propagation).to(self.device)
         self.contrast_model = DualBranchContrast(loss=L.JSD(), mode='G2L').to(self.device)
\ No newline at end of file
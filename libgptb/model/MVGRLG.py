@@ -7,13 +7,17 @@ import libgptb.augmentors as A
 from torch import nn
 from tqdm import tqdm
 from libgptb.models import DualBranchContrast
-from torch_geometric.nn import GCNConv, global_add_pool
+from torch_geometric.nn import GCNConv
 from libgptb.model.abstract_gcl_model import AbstractGCLModel
+from libgptb.model.layers import batch_ptr, checkpoint_layer, fused_readout
 
 
 class GConv(nn.Module):
-    def __init__(self, input_dim, hidden_dim, num_layers):
+    def __init__(self, input_dim, hidden_dim, num_layers, activation_checkpoint=False, readouts=('sum',)):
         super(GConv, self).__init__()
+        self.readouts = readouts
+        # recompute the activations of every conv in backward instead of storing them
+        self.activation_checkpoint = activation_checkpoint
         self.layers = nn.ModuleList()
         self.activation = nn.PReLU(hidden_dim)
         for i in range(num_layers):
@@ -22,15 +26,17 @@ class GConv(nn.Module):
             else:
                 self.layers.append(GCNConv(hidden_dim, hidden_dim))
 
-    def forward(self, x, edge_index, batch):
+    def forward(self, x, edge_index, batch, ptr=None):
         z = x
-        zs = []
-        for conv in self.layers:
-            z = conv(z, edge_index)
+        zs = None
+        for i, conv in enumerate(self.layers):
+            z = checkpoint_layer(self.activation_checkpoint, conv, z, edge_index)
             z = self.activation(z)
-            zs.append(z)
-        gs = [global_add_pool(z, batch) for z in zs]
-        g = torch.cat(gs, dim=1)
+            # layer outputs are written side by side into one buffer and pooled once
+            if zs is None:
+                zs = z.new_empty(z.size(0), z.size(1) * len(self.layers))
+            zs[:, i * z.size(1):(i + 1) * z.size(1)] = z
+        g = fused_readout(zs, batch_ptr(batch, ptr), self.readouts)
         return z, g
 
 
@@ -61,11 +67,12 @@ class Encoder(torch.nn.Module):
         self.aug1 = aug1
         self.aug2 = aug2
 
-    def forward(self, x, edge_index, batch):
+    def forward(self, x, edge_index, batch, ptr=None):
         x1, edge_index1, edge_weight1 = self.aug1(x, edge_index)
         x2, edge_index2, edge_weight2 = self.aug2(x, edge_index)
-        z1, g1 = self.gcn1(x1, edge_index1, batch)
-        z2, g2 = self.gcn2(x2, edge_index2, batch)
+        ptr = batch_ptr(batch, ptr)
+        z1, g1 = self.gcn1(x1, edge_index1, batch, ptr)
+        z2, g2 = self.gcn2(x2, edge_index2, batch, ptr)
         h1, h2 = [self.mlp1(h) for h in [z1, z2]]
         g1, g2 = [self.mlp2(g) for g in [g1, g2]]
         return h1, h2, g1, g2
@@ -78,14 +85,19 @@ class MVGRLG(AbstractGCLModel):
         self.layers = config.get('layers', 3)
         self.device = config.get('device', torch.device('cpu'))
         self.input_dim = max( data_feature.get('input_dim'), 1)
+        self.readouts = config.get('readouts', ['sum'])
         super().__init__(config, data_feature)
         self.aug1 = A.Identity()
         self.aug2 = A.PPRDiffusion(alpha=0.2, use_cache=False)
 
-        self.gconv1 = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, num_layers=self.layers).to(self.device)
-        self.gconv2 = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, num_layers=self.layers).to(self.device)
+        self.gconv1 = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, num_layers=self.layers,
+                            activation_checkpoint=config.get('activation_checkpoint', False),
+                            readouts=self.readouts).to(self.device)
+        self.gconv2 = GConv(input_dim=self.input_dim, hidden_dim=self.nhid, num_layers=self.layers,
+                            activation_checkpoint=config.get('activation_checkpoint', False),
+                            readouts=self.readouts).to(self.device)
         self.mlp1 = FC(input_dim=self.nhid, output_dim=self.nhid)
-        self.mlp2 = FC(input_dim=self.nhid * self.layers, output_dim=self.nhid)
+        self.mlp2 = FC(input_dim=self.nhid * self.layers * len(self.readouts), output_dim=self.nhid)
         self.encoder_model = Encoder(gcn1=self.gconv1, gcn2=self.gconv2,mlp1=self.mlp1, mlp2=self.mlp2, aug1=self.aug1,aug2=self.aug2).to(self.device)
         self.contrast_model = DualBranchContrast(loss=L.JSD(), mode='G2L').to(self.device)
 # def main():
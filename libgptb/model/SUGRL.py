@@ -2,6 +2,7 @@ import torch
 from torch import nn
 import torch.nn.functional as F
 from libgptb.model.abstract_gcl_model import AbstractGCLModel
+from libgptb.model.inference import PROPAGATE
 
 
 def make_mlplayers(in_channel, cfg, batch_norm=False, out_layer =None):
@@ -58,6 +59,12 @@ class SUGRL(AbstractGCLModel):
             h_p = torch.mm(adj, h_p_0)
         return h_a, h_p
 
+    def inference_stages(self):
+        """
+        the encoder as ``InferenceEngine`` stages, see ``libgptb.model.inference``
+        """
+        return [self.encoder_model, PROPAGATE]
+
     def embed(self,  seq_a, adj=None):
         h_a = self.encoder_model(seq_a)
         if self.sparse:
@@ -0,0 +1,180 @@
+import os
+import os.path as osp
+
+import dgl
+import numpy as np
+import torch
+from torch_geometric.nn.conv.gcn_conv import gcn_norm
+from torch_sparse import SparseTensor
+
+# marks the sparse aggregation steps in an encoder's ``inference_stages()``
+PROPAGATE = 'propagate'
+
+
+def get_inference_engine(config, data, device, cache_dir=None, edge_index=None, edge_weight=None, propagate=True):
+    """
+    according the config to create the InferenceEngine used to extract node embeddings
+
+    Args:
+        config(ConfigParser): config
+        data(Data or DGLGraph): the whole graph
+        device(torch.device): device the chunks are computed on
+        cache_dir(str): directory of the memory-mapped intermediate layers
+        edge_index(torch.LongTensor): connectivity overriding the one of ``data``
+        edge_weight(torch.Tensor): edge weights going with ``edge_index``
+        propagate(bool): False for encoders without ``PROPAGATE`` stages, e.g. SIGN,
+            the normalised adjacency is then not built
+
+    Returns:
+        InferenceEngine: the engine
+    """
+    kwargs = dict(chunk_size=config.get('inference_chunk_size', 8192),
+                  storage=config.get('inference_storage', 'cpu'),
+                  memmap_dir=None if cache_dir is None else osp.join(cache_dir, 'inference'))
+    if not propagate:
+        num_nodes = data.num_nodes() if isinstance(data, dgl.DGLGraph) else data.num_nodes
+        return InferenceEngine(None, num_nodes, device, **kwargs)
+    if isinstance(data, dgl.DGLGraph):
+        src, dst = data.edges()
+        return InferenceEngine(torch.stack([src, dst]), data.num_nodes(), device, norm='both', **kwargs)
+    if edge_index is None:
+        edge_index = data.edge_index
+    return InferenceEngine(edge_index, data.num_nodes, device, edge_weight=edge_weight, norm='gcn', **kwargs)
+
+
+class InferenceEngine(object):
+    """
+    Layer-wise full-graph inference. An encoder is described by its
+    ``inference_stages()``: pointwise callables (linear maps, bias, activations,
+    eval-mode normalisation) and ``PROPAGATE`` steps that multiply with the
+    normalised adjacency. Each stage is computed for all nodes, chunk by chunk,
+    before the next one starts, so only ``chunk_size`` rows and their in-neighbours
+    are on the device at a time. Everything runs under ``torch.inference_mode``.
+
+    Args:
+        edge_index(torch.LongTensor): graph connectivity, None for pointwise stages only
+        num_nodes(int): number of nodes
+        device(torch.device): device the chunks are computed on
+        edge_weight(torch.Tensor): optional edge weights
+        norm(str): ``gcn`` to match ``GCNConv`` (self-loops added, target degree),
+            ``both`` to match DGL ``GraphConv(norm='both')`` on the given graph
+        chunk_size(int): number of nodes computed at once
+        storage(str): where intermediate layers live, ``device``, ``cpu`` or ``memmap``
+        memmap_dir(str): directory of the memory-mapped layers for ``memmap`` storage
+    """
+
+    def __init__(self, edge_index, num_nodes, device, edge_weight=None, norm='gcn',
+                 chunk_size=8192, storage='cpu', memmap_dir=None):
+        if storage not in ['device', 'cpu', 'memmap']:
+            raise ValueError('inference storage {} is not supported'.format(storage))
+        if storage == 'memmap' and memmap_dir is None:
+            raise ValueError('memmap storage needs a memmap_dir')
+        self.num_nodes = num_nodes
+        self.device = device
+        self.chunk_size = chunk_size
+        self.storage = storage
+        self.memmap_dir = memmap_dir
+        self.rowptr = self.col = self.value = None
+        if edge_index is not None:
+            edge_weight = None if edge_weight is None else edge_weight.cpu()
+            self.rowptr, self.col, self.value = self._normalized_csr(edge_index.cpu(), edge_weight, num_nodes, norm)
+
+    @staticmethod
+    def _normalized_csr(edge_index, edge_weight, num_nodes, norm):
+        if norm == 'gcn':
+            edge_index, edge_weight = gcn_norm(edge_index, edge_weight, num_nodes, add_self_loops=True)
+        elif norm == 'both':
+            src, dst = edge_index
+            out_deg = torch.bincount(src, minlength=num_nodes).clamp(min=1).float()
+            in_deg = torch.bincount(dst, minlength=num_nodes).clamp(min=1).float()
+            edge_weight = out_deg[src].pow(-0.5) * in_deg[dst].pow(-0.5)
+        else:
+            raise ValueError('adjacency norm {} is not supported'.format(norm))
+        # a row holds the messages received by a node
+        src, dst = edge_index
+        order = torch.argsort(dst, stable=True)
+        rowptr = torch.zeros(num_nodes + 1, dtype=torch.long)
+        rowptr[1:] = torch.cumsum(torch.bincount(dst, minlength=num_nodes), dim=0)
+        return rowptr, src[order], edge_weight[order]
+
+    def run(self, x, stages):
+        """
+        compute the embeddings of all nodes
+
+        Args:
+            x(torch.Tensor): input node features, shape (N, F)
+            stages(list): pointwise callables and ``PROPAGATE`` markers
+
+        Returns:
+            torch.Tensor: node embeddings on ``self.device``, shape (N, d)
+        """
+        groups = []
+        for stage in stages:
+            if stage == PROPAGATE:
+                if self.rowptr is None:
+                    raise ValueError('the InferenceEngine was built without an adjacency to propagate over')
+                groups.append(PROPAGATE)
+            elif groups and groups[-1] != PROPAGATE:
+                groups[-1].append(stage)
+            else:
+                groups.append([stage])
+
+        with torch.inference_mode():
+            h = x
+            for i, group in enumerate(groups):
+                h = self._layer(h, group, i, last=i == len(groups) - 1)
+        # inference tensors cannot be used by the autograd-enabled evaluators
+        return h.clone()
+
+    def _layer(self, h, group, index, last):
+        out = None
+        for start in range(0, self.num_nodes, self.chunk_size):
+            end = min(start + self.chunk_size, self.num_nodes)
+            if group == PROPAGATE:
+                chunk = self._propagate_chunk(h, start, end)
+            else:
+                chunk = self._rows(h, slice(start, end))
+                for fn in group:
+                    chunk = fn(chunk)
+            if out is None:
+                out = self._allocate(chunk.size(1), chunk.dtype, index, last)
+            if isinstance(out, np.memmap):
+                out[start:end] = chunk.float().cpu().numpy()
+            else:
+                out[start:end] = chunk
+        if isinstance(out, np.memmap):
+            out.flush()
+        return out
+
+    def _allocate(self, dim, dtype, index, last):
+        if last or self.storage == 'device':
+            return torch.empty(self.num_nodes, dim, dtype=dtype, device=self.device)
+        if self.storage == 'cpu':
+            return torch.empty(self.num_nodes, dim, dtype=dtype)
+        os.makedirs(self.memmap_dir, exist_ok=True)
+        return np.memmap(osp.join(self.memmap_dir, 'layer_{}.dat'.format(index)), dtype=np.float32,
+                         mode='w+', shape=(self.num_nodes, dim))
+
+    def _rows(self, h, index):
+        if isinstance(h, SparseTensor):
+            if isinstance(index, slice):
+                return h.narrow(0, index.start, index.stop - index.start).to(self.device)
+            return h.index_select(0, index.to(h.device())).to(self.device)
+        if isinstance(h, np.memmap):
+            if torch.is_tensor(index):
+                index = index.numpy()
+            return torch.from_numpy(np.array(h[index])).to(self.device)
+        if torch.is_tensor(index):
+            index = index.to(h.device)
+        return h[index].to(self.device)
+
+    def _propagate_chunk(self, h, start, end):
+        lo, hi = self.rowptr[start], self.rowptr[end]
+        col, value = self.col[lo:hi], self.value[lo:hi]
+        # fetch every in-neighbour of the chunk once
+        cols, local = torch.unique(col, return_inverse=True)
+        src = self._rows(h, cols)
+        row = torch.repeat_interleave(torch.arange(end - start), self.rowptr[start + 1:end + 1] - self.rowptr[start:end])
+        msg = src[local.to(self.device)] * value.to(self.device, src.dtype).unsqueeze(-1)
+        out = torch.zeros(end - start, src.size(1), dtype=src.dtype, device=self.device)
+        return out.index_add_(0, row.to(self.device), msg)
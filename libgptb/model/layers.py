@@ -0,0 +1,273 @@
+from functools import partial
+
+import dgl.function as fn
+from dgl.base import DGLError
+import torch
+import torch.nn.functional as F
+from torch.utils.checkpoint import checkpoint
+
+from torch_geometric.nn.conv.gcn_conv import gcn_norm
+from torch_scatter import segment_csr
+from torch_sparse import SparseTensor
+
+from libgptb.augmentors.functional import MaskedFeatures
+from libgptb.model.inference import PROPAGATE
+
+
+def gcn_propagate(conv, x, edge_index, edge_weight=None):
+    """
+    Run the propagation half of a ``GCNConv`` on features that have already
+    been multiplied by ``conv.lin``. The bias is not added.
+
+    Args:
+        conv(GCNConv): the convolution whose normalisation settings are used
+        x(torch.Tensor): transformed node features, shape (N, C)
+        edge_index(torch.LongTensor): graph connectivity
+        edge_weight(torch.Tensor): optional edge weights
+
+    Returns:
+        torch.Tensor: aggregated features, shape (N, C)
+    """
+    if conv.normalize:
+        edge_index, edge_weight = gcn_norm(edge_index, edge_weight, x.size(0), conv.improved,
+                                           conv.add_self_loops, conv.flow, x.dtype)
+    return conv.propagate(edge_index, x=x, edge_weight=edge_weight, size=None)
+
+
+def linear(lin, x):
+    """
+    Apply a linear layer to dense, sparse (``SparseTensor``) or lazily masked
+    (``MaskedFeatures``) input. Sparse input is transformed with a sparse-dense
+    product; a lazy column mask is applied to the rows of the weight.
+
+    Args:
+        lin(Linear): the layer
+        x(torch.Tensor, SparseTensor or MaskedFeatures): input features, shape (N, F)
+
+    Returns:
+        torch.Tensor: transformed features, shape (N, C)
+    """
+    weight = lin.weight
+    if isinstance(x, MaskedFeatures):
+        weight = weight * x.keep
+        x = x.x
+    if isinstance(x, SparseTensor):
+        out = x @ weight.t()
+        return out if lin.bias is None else out + lin.bias
+    if weight is lin.weight:
+        return lin(x)
+    return F.linear(x, weight, lin.bias)
+
+
+def gcn_conv(conv, x, edge_index, edge_weight=None):
+    """
+    ``conv(x, edge_index, edge_weight)`` for a ``GCNConv`` that also accepts
+    sparse or lazily masked node features.
+
+    Args:
+        conv(GCNConv): the convolution
+        x(torch.Tensor, SparseTensor or MaskedFeatures): node features, shape (N, F)
+        edge_index(torch.LongTensor): graph connectivity
+        edge_weight(torch.Tensor): optional edge weights
+
+    Returns:
+        torch.Tensor: the convolution output, shape (N, C)
+    """
+    if not isinstance(x, (SparseTensor, MaskedFeatures)):
+        return conv(x, edge_index, edge_weight)
+    out = gcn_propagate(conv, linear(conv.lin, x), edge_index, edge_weight)
+    return out if conv.bias is None else out + conv.bias
+
+
+def graphconv(conv, graph, x, edge_weight=None):
+    """
+    ``conv(graph, x, edge_weight=edge_weight)`` for a DGL ``GraphConv(norm='both')``
+    that also accepts lazily masked features (``MaskedFeatures``), masking the rows
+    of the weight instead of the columns of ``x``. The lazy path keeps the checks
+    and the edge weighting of ``GraphConv``.
+
+    Args:
+        conv(GraphConv): the convolution
+        graph(DGLGraph): the graph
+        x(torch.Tensor or MaskedFeatures): node features, shape (N, F)
+        edge_weight(torch.Tensor): optional edge weights, shape (E,)
+
+    Returns:
+        torch.Tensor: the convolution output, shape (N, C)
+    """
+    if not isinstance(x, MaskedFeatures):
+        return conv(graph, x, edge_weight=edge_weight)
+    if conv._norm != 'both' or conv.weight is None:
+        raise ValueError('lazy feature masking needs a GraphConv with norm=both and its own weight')
+    if not conv._allow_zero_in_degree and (graph.in_degrees() == 0).any():
+        # the check and message of GraphConv.forward
+        raise DGLError('There are 0-in-degree nodes in the graph, output for those nodes will be invalid. '
+                       'Adding self-loop on the input graph by calling `g = dgl.add_self_loop(g)` will resolve '
+                       'the issue. Setting ``allow_zero_in_degree`` to be `True` when constructing this module '
+                       'will suppress the check and let the code run.')
+    h = x.x @ (conv.weight * x.keep.unsqueeze(-1))
+    with graph.local_scope():
+        message = fn.copy_u('h', 'm')
+        if edge_weight is not None:
+            graph.edata['_edge_weight'] = edge_weight
+            message = fn.u_mul_e('h', '_edge_weight', 'm')
+        out_deg = graph.out_degrees().float().clamp(min=1)
+        in_deg = graph.in_degrees().float().clamp(min=1)
+        graph.srcdata['h'] = h * out_deg.pow(-0.5).unsqueeze(-1)
+        graph.update_all(message, fn.sum('m', 'h'))
+        out = graph.dstdata['h'] * in_deg.pow(-0.5).unsqueeze(-1)
+    if conv.bias is not None:
+        out = out + conv.bias
+    if conv._activation is not None:
+        out = conv._activation(out)
+    return out
+
+
+def checkpoint_layer(enabled, function, *args):
+    """
+    ``function(*args)``, recomputing its intermediate activations during backward
+    instead of storing them (``torch.utils.checkpoint``) when ``enabled`` and
+    gradients are recorded. Only the inputs of the layer are kept. Do not wrap
+    modules with running statistics, e.g. BatchNorm, they would be updated twice.
+
+    Args:
+        enabled(bool): whether to checkpoint
+        function(callable): the layer
+        *args: arguments of ``function``
+
+    Returns:
+        the output of ``function``
+    """
+    if enabled and torch.is_grad_enabled():
+        return checkpoint(function, *args, use_reentrant=False)
+    return function(*args)
+
+
+def gcn_forward_pair(conv, h, hn, edge_index, edge_weight=None):
+    """
+    Apply a ``GCNConv`` to two feature matrices that live on the same graph
+    with a single sparse aggregation: both inputs are transformed, stacked
+    along the channel dimension and propagated together.
+
+    Args:
+        conv(GCNConv): the convolution to apply
+        h(torch.Tensor): transformed features of the first input, shape (N, C)
+        hn(torch.Tensor): transformed features of the second input, shape (N, C)
+        edge_index(torch.LongTensor): graph connectivity shared by both inputs
+        edge_weight(torch.Tensor): optional edge weights
+
+    Returns:
+        tuple: the two convolution outputs
+    """
+    out = gcn_propagate(conv, torch.cat([h, hn], dim=1), edge_index, edge_weight)
+    z, zn = out.chunk(2, dim=1)
+    if conv.bias is not None:
+        z = z + conv.bias
+        zn = zn + conv.bias
+    return z, zn
+
+
+def _gcn_layer_pair(conv, z, zn, perm, edge_index, edge_weight):
+    # the first layer permutes the shared transform, lin(x[perm]) = lin(x)[perm]
+    h = linear(conv.lin, z)
+    hn = h[perm] if zn is None else conv.lin(zn)
+    return gcn_forward_pair(conv, h, hn, edge_index, edge_weight)
+
+
+def gcn_forward_corrupted(convs, activations, x, perm, edge_index, edge_weight=None, activation_checkpoint=False):
+    """
+    Encode ``x`` and its row-permuted corruption ``x[perm]`` with a stack of
+    ``GCNConv`` layers, each followed by its activation. The first layer's
+    transform is shared since ``lin(x[perm]) = lin(x)[perm]``, and every layer
+    aggregates both inputs with one sparse product, see ``gcn_forward_pair``.
+
+    Args:
+        convs(list): the convolutions
+        activations(list): the activation after every convolution
+        x(torch.Tensor or SparseTensor): node features
+        perm(torch.LongTensor): the row permutation of the corruption
+        edge_index(torch.LongTensor): graph connectivity
+        edge_weight(torch.Tensor): optional edge weights
+        activation_checkpoint(bool): recompute every layer in backward, see
+            ``checkpoint_layer``
+
+    Returns:
+        tuple: the encodings of ``x`` and of ``x[perm]``
+    """
+    z, zn = x, None
+    for conv, act in zip(convs, activations):
+        z, zn = checkpoint_layer(activation_checkpoint, _gcn_layer_pair, conv, z, zn, perm, edge_index, edge_weight)
+        z, zn = act(z), act(zn)
+    return z, zn
+
+
+def batch_ptr(batch, ptr=None):
+    """
+    CSR offsets of the graphs of a batch, ``Batch.ptr``, computed from the sorted
+    ``batch`` vector when not given.
+
+    Args:
+        batch(torch.LongTensor): graph id of every node, shape (N,)
+        ptr(torch.LongTensor): precomputed offsets, returned as is
+
+    Returns:
+        torch.LongTensor: offsets, shape (B + 1,)
+    """
+    if ptr is not None:
+        return ptr
+    counts = torch.bincount(batch)
+    return torch.cat([counts.new_zeros(1), counts.cumsum(0)])
+
+
+def fused_readout(zs, ptr, readouts=('sum',)):
+    """
+    Graph readout of stacked per-layer node embeddings: one ``segment_csr`` over
+    the whole ``(N, L * d)`` buffer per readout, instead of one pooling per layer.
+
+    Args:
+        zs(torch.Tensor): per-layer node embeddings side by side, shape (N, L * d)
+        ptr(torch.LongTensor): CSR offsets of the graphs, see ``batch_ptr``
+        readouts(list): reductions among ``sum``, ``mean`` and ``max``
+
+    Returns:
+        torch.Tensor: graph embeddings, shape (B, R * L * d), readouts side by side
+    """
+    gs = [segment_csr(zs, ptr, reduce=readout) for readout in readouts]
+    return gs[0] if len(gs) == 1 else torch.cat(gs, dim=1)
+
+
+def gcn_inference_stages(conv):
+    """
+    Express a ``GCNConv`` as ``InferenceEngine`` stages: the linear transform, the
+    normalised aggregation and the bias.
+
+    Args:
+        conv(GCNConv): the convolution
+
+    Returns:
+        list: pointwise callables and ``PROPAGATE`` markers
+    """
+    stages = [partial(linear, conv.lin), PROPAGATE]
+    if conv.bias is not None:
+        stages.append(lambda z: z + conv.bias)
+    return stages
+
+
+def graphconv_inference_stages(conv):
+    """
+    Express a DGL ``GraphConv(norm='both')`` as ``InferenceEngine`` stages.
+
+    Args:
+        conv(GraphConv): the convolution
+
+    Returns:
+        list: pointwise callables and ``PROPAGATE`` markers
+    """
+    stages = [PROPAGATE]
+    if conv.weight is not None:
+        stages.insert(0, lambda z: z @ conv.weight)
+    if conv.bias is not None:
+        stages.append(lambda z: z + conv.bias)
+    if conv._activation is not None:
+        stages.append(conv._activation)
+    return stages
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import os.path as osp
+from logging import getLogger
+
+import dgl
+import numpy as np
+import torch
+from torch import nn
+import torch.nn.functional as F
+from torch_sparse import SparseTensor
+
+from libgptb.augmentors.functional import MaskedFeatures
+from libgptb.model.inference import PROPAGATE, get_inference_engine
+from libgptb.model.layers import linear
+
+
+def precompute_hops(config, data, device, cache_dir=None):
+    """
+    Precompute the SIGN input ``[X, ÂX, Â²X, ..., Â^K X]`` with ``K = config['num_hops']``,
+    flattened to shape (N, (K + 1) * F). Â is normalised like the GCN encoders of the
+    graph's framework. With a ``cache_dir`` the result is a float32 memory-mapped file
+    that is reused by later runs with the same dataset, hop count, normalisation,
+    graph and features.
+
+    Args:
+        config(ConfigParser): config
+        data(Data or DGLGraph): the whole graph
+        device(torch.device): device the propagation is computed on
+        cache_dir(str): directory of the cached hops, kept in memory if None
+
+    Returns:
+        np.memmap or torch.Tensor: the propagated features
+    """
+    _logger = getLogger()
+    num_hops = config.get('num_hops', 3)
+    if isinstance(data, dgl.DGLGraph):
+        graph = data.remove_self_loop().add_self_loop()
+        x = data.ndata['feat']
+        norm, edges = 'both', torch.stack(graph.edges())
+    else:
+        graph = data
+        x = data.x
+        norm, edges = 'gcn', data.edge_index
+    if isinstance(x, SparseTensor):
+        x = x.to_dense()
+    num_nodes, dim = x.shape
+    shape = (num_nodes, (num_hops + 1) * dim)
+
+    cache_file = None
+    if cache_dir is not None:
+        key = _hops_key(config, norm, edges, x)
+        cache_file = osp.join(cache_dir, 'sign', 'hops_{}_{}.dat'.format(num_hops, key))
+        if osp.exists(cache_file) and osp.getsize(cache_file) == shape[0] * shape[1] * 4:
+            _logger.info('Loaded precomputed hops from {}'.format(cache_file))
+            return np.memmap(cache_file, dtype=np.float32, mode='r', shape=shape)
+
+    engine = get_inference_engine(config, graph, device)
+    hops = [x.float().cpu()]
+    for _ in range(num_hops):
+        hops.append(engine.run(hops[-1], [PROPAGATE]).cpu())
+    if cache_file is None:
+        return torch.cat(hops, dim=1)
+
+    os.makedirs(osp.dirname(cache_file), exist_ok=True)
+    out = np.memmap(cache_file, dtype=np.float32, mode='w+', shape=shape)
+    for k, h in enumerate(hops):
+        out[:, k * dim:(k + 1) * dim] = h.cpu().numpy()
+    out.flush()
+    _logger.info('Saved precomputed hops to {}'.format(cache_file))
+    return np.memmap(cache_file, dtype=np.float32, mode='r', shape=shape)
+
+
+def _hops_key(config, norm, edge_index, x):
+    # everything the hops depend on: the dataset, the adjacency normalisation,
+    # and a fingerprint of the graph and of the (possibly normalised) features
+    edge_index, x = edge_index.cpu(), x.cpu()
+    col_sums = x.sum(dim=0, dtype=torch.float64)
+    row_sums = x.sum(dim=1, dtype=torch.float64)
+    fingerprint = [config.get('dataset', ''), config.get('num_hops', 3), norm, tuple(x.shape),
+                   edge_index.size(1), edge_index.sum().item(), (edge_index[0] * edge_index[1]).sum().item(),
+                   (col_sums * torch.arange(1, x.size(1) + 1, dtype=torch.float64)).sum().item(),
+                   (row_sums * torch.arange(1, x.size(0) + 1, dtype=torch.float64)).sum().item()]
+    return hashlib.md5(repr(fingerprint).encode()).hexdigest()[:12]
+
+
+class SIGNEncoder(nn.Module):
+    """
+    Decoupled encoder: an MLP over the features precomputed by ``precompute_hops``,
+    so training needs no sparse propagation. Graph arguments are accepted and
+    ignored to keep the calling convention of the GCN encoders it replaces.
+
+    Args:
+        input_dim(int): width of the precomputed features, (K + 1) * F
+        hidden_dim(int): output width
+        num_layers(int): number of linear layers
+        dropout(float): dropout on the input hops
+        graph_first(bool): True for DGL-style ``forward(graph, x)``, False for
+            PyG-style ``forward(x, edge_index, edge_weight)``
+    """
+
+    def __init__(self, input_dim, hidden_dim, num_layers, dropout=0.0, graph_first=False):
+        super(SIGNEncoder, self).__init__()
+        self.dropout = dropout
+        self.graph_first = graph_first
+        layers = []
+        for i in range(num_layers):
+            layers.append(nn.Linear(input_dim if i == 0 else hidden_dim, hidden_dim))
+            if i < num_layers - 1:
+                layers.append(nn.PReLU())
+        self.mlp = nn.Sequential(*layers)
+
+    def forward(self, *args):
+        x = args[1] if self.graph_first else args[0]
+        if isinstance(x, MaskedFeatures):
+            x = x._replace(x=F.dropout(x.x, p=self.dropout, training=self.training))
+            return self.mlp[1:](linear(self.mlp[0], x))
+        x = F.dropout(x, p=self.dropout, training=self.training)
+        return self.mlp(x)
+
+    def inference_stages(self):
+        """
+        the encoder as ``InferenceEngine`` stages, see ``libgptb.model.inference``
+        """
+        return [self.mlp]
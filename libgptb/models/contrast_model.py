@@ -129,6 +129,9 @@ class CCAContrast(torch.nn.Module):
         return loss
 
 class HomoContrast(torch.nn.Module):
+    # the k-means of HomoLoss runs in faiss on numpy arrays
+    compilable = False
+
     def __init__(self, loss: Loss, **kwargs):
         super(HomoContrast, self).__init__()
         self.loss = loss
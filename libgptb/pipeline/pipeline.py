@@ -2,6 +2,7 @@ import os
 import json
 import torch
 import random
+from logging import getLogger
 from libgptb.config import ConfigParser
 from libgptb.data import get_dataset
 from libgptb.utils import get_executor, get_model, get_logger, ensure_dir, set_random_seed
@@ -19,10 +20,15 @@ def run_model(task=None, model_name=None, dataset_name=None, config_file=None,
         saved_model(bool): whether to save the model
         train(bool): whether to train the model
         other_args(dict): the rest parameter args, which will be pass to the Config
+
+    Returns:
+        dict: evaluation result of every milestone epoch
     """
     # load config
     config = ConfigParser(task, model_name, dataset_name,
                           config_file, saved_model, train, other_args)
+    if config.get('compare_precision', False):
+        return compare_precision(task, model_name, dataset_name, config_file, saved_model, train, other_args)
     exp_id = config.get('exp_id', None)
     if exp_id is None:
         # Make a new experiment ID
@@ -69,7 +75,50 @@ def run_model(task=None, model_name=None, dataset_name=None, config_file=None,
     else:
         executor.load_model(model_cache_file)
     # evaluate and the result will be under cache/evaluate_cache
-    executor.evaluate(test_data)
+    return executor.evaluate(test_data)
+
+
+def compare_precision(task=None, model_name=None, dataset_name=None, config_file=None,
+                      saved_model=True, train=True, other_args=None):
+    """
+    train and evaluate the model twice with the same seed, in fp32 and in bf16, and
+    log the accuracy delta of bf16 at every milestone epoch. The runs use the
+    experiment ids ``{exp_id}_fp32`` and ``{exp_id}_bf16``, the deltas are saved in
+    ``./libgptb/cache/{exp_id}_precision.json``.
+
+    Args: see ``run_model``
+
+    Returns:
+        dict: per milestone epoch, the fp32 and bf16 results and their deltas
+    """
+    other_args = dict(other_args or {})
+    exp_id = other_args.get('exp_id', None)
+    if exp_id is None:
+        exp_id = int(random.SystemRandom().random() * 100000)
+    results = {}
+    for precision in ['fp32', 'bf16']:
+        args = dict(other_args, precision=precision, compare_precision=False,
+                    exp_id='{}_{}'.format(exp_id, precision))
+        results[precision] = run_model(task, model_name, dataset_name, config_file, saved_model, train, args)
+
+    logger = getLogger()
+    comparison = {}
+    for epoch, fp32 in results['fp32'].items():
+        bf16 = results['bf16'].get(epoch)
+        if bf16 is None:
+            continue
+        delta = {key: bf16[key] - fp32[key] for key in ['micro_f1', 'macro_f1']}
+        comparison[epoch] = {'fp32': fp32, 'bf16': bf16, 'delta': delta}
+        logger.info('Precision comparison of {} on {} at epoch {}: F1Mi fp32={:.4f} bf16={:.4f} ({:+.4f}), '
+                    'F1Ma fp32={:.4f} bf16={:.4f} ({:+.4f})'.
+                    format(model_name, dataset_name, epoch, fp32['micro_f1'], bf16['micro_f1'], delta['micro_f1'],
+                           fp32['macro_f1'], bf16['macro_f1'], delta['macro_f1']))
+    save_path = './libgptb/cache/{}_precision.json'.format(exp_id)
+    ensure_dir('./libgptb/cache')
+    with open(save_path, 'w') as f:
+        json.dump(comparison, f, indent=2)
+    logger.info('Precision comparison is saved at ' + save_path)
+    return comparison
     
 
 
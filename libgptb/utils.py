@@ -9,6 +9,7 @@ import importlib
 import logging
 import datetime
 import sys
+from contextlib import nullcontext
 
 
 def get_executor(config, model, data_feature):
@@ -76,6 +77,70 @@ def get_evaluator(config):
         raise AttributeError('evaluator is not found')
 
 
+def get_autocast(config):
+    """
+    according the config['precision'] to create the autocast context of a training
+    step: ``fp32`` runs unchanged, ``bf16`` runs eligible ops (matmuls, convolutions)
+    in bfloat16 through ``torch.autocast``. No gradient scaler is needed for bf16.
+
+    Args:
+        config(ConfigParser): config
+
+    Returns:
+        context manager: the autocast context, to be entered once per step
+    """
+    precision = config.get('precision', 'fp32')
+    if precision == 'fp32':
+        return nullcontext()
+    if precision == 'bf16':
+        device = torch.device(config.get('device', torch.device('cpu')))
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+    raise ValueError('precision {} is not supported'.format(precision))
+
+
+def compile_model(config, model):
+    """
+    according the config['compile'] to compile the training modules of a model in place
+    with ``torch.compile``: ``encoder_model`` and ``contrast_model``, or the model itself
+    when it has neither. Shapes are dynamic since augmentations change the edge count.
+    Inductor artifacts are cached in ``./libgptb/cache/compile`` and reused by the
+    other runs of a sweep. Modules with ``compilable = False`` stay eager, and graphs
+    dynamo cannot compile fall back to eager execution.
+
+    Args:
+        config(ConfigParser): config
+        model(AbstractModel): model
+
+    Returns:
+        bool: whether any module was compiled
+    """
+    if not config.get('compile', False):
+        return False
+    _logger = logging.getLogger()
+    if not hasattr(torch.nn.Module, 'compile'):
+        _logger.warning('torch.compile is unavailable, training eagerly')
+        return False
+    cache_dir = os.path.abspath('./libgptb/cache/compile')
+    ensure_dir(cache_dir)
+    os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', cache_dir)
+    import torch._dynamo
+    import torch._inductor.config
+    torch._inductor.config.fx_graph_cache = True
+    torch._dynamo.config.suppress_errors = True
+
+    names = [name for name in ['encoder_model', 'contrast_model'] if isinstance(getattr(model, name, None), torch.nn.Module)]
+    modules = [(name, getattr(model, name)) for name in names] or [(type(model).__name__, model)]
+    compiled = False
+    for name, module in modules:
+        if not getattr(module, 'compilable', True):
+            _logger.info('{} is not compilable, keeping it eager'.format(name))
+            continue
+        module.compile(dynamic=True)
+        _logger.info('Compiled {} with torch.compile'.format(name))
+        compiled = True
+    return compiled
+
+
 def get_logger(config, name=None):
     """
     获取Logger对象
@@ -347,6 +412,191 @@ general_arguments = {
         "default": None,
         "help": "the evaluator class name"
     },
+    "batch_mode": {
+        "type": "str",
+        "default": None,
+        "help": "node-level training mode: full, neighbor_sample or cluster"
+    },
+    "fanouts": {
+        "type": "list of int",
+        "default": None,
+        "help": "number of sampled neighbors per layer"
+    },
+    "num_parts": {
+        "type": "int",
+        "default": None,
+        "help": "number of graph partitions in cluster mode"
+    },
+    "clusters_per_batch": {
+        "type": "int",
+        "default": None,
+        "help": "number of partitions merged into one batch in cluster mode"
+    },
+    "partition_method": {
+        "type": "str",
+        "default": None,
+        "help": "graph partitioner in cluster mode: metis or lp"
+    },
+    "inference_chunk_size": {
+        "type": "int",
+        "default": None,
+        "help": "number of nodes per chunk when extracting embeddings"
+    },
+    "inference_storage": {
+        "type": "str",
+        "default": None,
+        "help": "where intermediate layers are kept during inference: device, cpu or memmap"
+    },
+    "encoder": {
+        "type": "str",
+        "default": None,
+        "help": "node encoder of GRACE/CCA/GBT/BGRL: gcn or sign"
+    },
+    "num_hops": {
+        "type": "int",
+        "default": None,
+        "help": "number of precomputed propagation hops of the sign encoder"
+    },
+    "sparse_features": {
+        "type": "bool",
+        "default": None,
+        "help": "keep node features sparse (PyG datasets)"
+    },
+    "lazy_feature_mask": {
+        "type": "bool",
+        "default": None,
+        "help": "apply feature masking to the first layer weight instead of copying the features, off by default"
+    },
+    "precision": {
+        "type": "str",
+        "default": None,
+        "help": "training precision: fp32 or bf16 (autocast)"
+    },
+    "compare_precision": {
+        "type": "bool",
+        "default": None,
+        "help": "train and evaluate in fp32 and in bf16 with the same seed and log the accuracy deltas"
+    },
+    "compile": {
+        "type": "bool",
+        "default": None,
+        "help": "compile the encoder and contrast models with torch.compile"
+    },
+    "activation_checkpoint": {
+        "type": "bool",
+        "default": None,
+        "help": "recompute the activations of every conv layer in backward to save memory"
+    },
+    "decode_masked_only": {
+        "type": "bool",
+        "default": None,
+        "help": "GraphMAE: run the decoder on the masked nodes only"
+    },
+    "readouts": {
+        "type": "list of str",
+        "default": None,
+        "help": "graph readouts of GraphCL/InfoGraph/MVGRLG: sum, mean and/or max"
+    },
+    "graph_loader": {
+        "type": "str",
+        "default": None,
+        "help": "graph-level batching: pyg (DataLoader) or device (dataset collated once on the device)"
+    },
+    "max_nodes_per_batch": {
+        "type": "int",
+        "default": None,
+        "help": "node budget of size-bucketed graph batches, fixed-size batches if not set"
+    },
+    "max_edges_per_batch": {
+        "type": "int",
+        "default": None,
+        "help": "optional edge budget of size-bucketed graph batches"
+    },
+    "bucket_size": {
+        "type": "int",
+        "default": None,
+        "help": "number of graphs sorted by size together when bucketing"
+    },
+    "checkpoint_async": {
+        "type": "bool",
+        "default": None,
+        "help": "write checkpoints from a background thread"
+    },
+    "checkpoint_keep_last": {
+        "type": "int",
+        "default": None,
+        "help": "number of recent checkpoints kept besides the best one and the milestones"
+    },
+    "embedding_store": {
+        "type": "bool",
+        "default": None,
+        "help": "store the evaluation embeddings of the milestone epochs during training"
+    },
+    "embedding_store_dtype": {
+        "type": "str",
+        "default": None,
+        "help": "storage type of the milestone embeddings: float32 or float16"
+    },
+    "profile_phases": {
+        "type": "bool",
+        "default": None,
+        "help": "record the time and peak memory of every phase of the training step, resets the CUDA peak memory statistics at every phase"
+    },
+    "profile_sync": {
+        "type": "bool",
+        "default": None,
+        "help": "synchronise the device around every profiled phase for exact timings"
+    },
+    "profile": {
+        "type": "bool",
+        "default": None,
+        "help": "capture a torch.profiler trace of a window of training steps"
+    },
+    "profile_steps": {
+        "type": "int",
+        "default": None,
+        "help": "number of training steps recorded by --profile"
+    },
+    "profile_warmup": {
+        "type": "int",
+        "default": None,
+        "help": "number of training steps run before --profile starts recording"
+    },
+    "memory_monitor": {
+        "type": "bool",
+        "default": None,
+        "help": "log the RSS, the allocator statistics and the phase peaks of every epoch"
+    },
+    "memory_threshold_mb": {
+        "type": "float",
+        "default": None,
+        "help": "phase peak in MB above which the largest live tensors are logged"
+    },
+    "memory_top_n": {
+        "type": "int",
+        "default": None,
+        "help": "number of live tensors logged by the memory monitor"
+    },
+    "probe_solver": {
+        "type": "str",
+        "default": None,
+        "help": "solver of the logistic regression probe: adam (the default) or lbfgs"
+    },
+    "probe_batched": {
+        "type": "bool",
+        "default": None,
+        "help": "probe all milestone embeddings at once with a batched multi-head logistic regression"
+    },
+    "probe_seeds": {
+        "type": "list of int",
+        "default": None,
+        "help": "initialisation seeds swept by the batched probe"
+    },
+    "probe_weight_decays": {
+        "type": "list of float",
+        "default": None,
+        "help": "weight decays swept by the batched probe"
+    },
 }
 
 hyper_arguments = {
@@ -415,4 +665,10 @@ def add_general_args(parser):
                                 default=general_arguments[arg]['default'], help=general_arguments[arg]['help'])
         elif general_arguments[arg]['type'] == 'list of int':
             parser.add_argument('--{}'.format(arg), nargs='+', type=int,
+                                default=general_arguments[arg]['default'], help=general_arguments[arg]['help'])
+        elif general_arguments[arg]['type'] == 'list of str':
+            parser.add_argument('--{}'.format(arg), nargs='+', type=str,
+                                default=general_arguments[arg]['default'], help=general_arguments[arg]['help'])
+        elif general_arguments[arg]['type'] == 'list of float':
+            parser.add_argument('--{}'.format(arg), nargs='+', type=str2float,
                                 default=general_arguments[arg]['default'], help=general_arguments[arg]['help'])
\ No newline at end of file
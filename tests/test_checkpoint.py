@@ -0,0 +1,51 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('dgl')
+pytest.importorskip('torch_geometric')
+
+from libgptb.executors.checkpoint import CheckpointManager
+
+
+def _epochs(tmp_path):
+    return sorted(int(p.name[len('epoch'):-len('.tar')]) for p in tmp_path.glob('epoch*.tar'))
+
+
+@pytest.mark.parametrize('async_write', [False, True])
+def test_retention_keeps_best_milestones_and_the_last(tmp_path, async_write):
+    manager = CheckpointManager(str(tmp_path / 'epoch%d.tar'), keep_last=1, async_write=async_write)
+    manager.save(0, {'w': torch.zeros(1)}, best=True)
+    manager.save(1, {'w': torch.ones(1)}, milestone=True)
+    manager.save(2, {'w': torch.ones(1)})
+    manager.save(3, {'w': torch.ones(1)}, best=True)
+    manager.save(4, {'w': torch.ones(1)})
+    manager.wait()
+    # 0 is no longer the best, 2 is not among the last
+    assert _epochs(tmp_path) == [1, 3, 4]
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_save_snapshots_the_state(tmp_path):
+    manager = CheckpointManager(str(tmp_path / 'epoch%d.tar'))
+    weight = torch.zeros(3)
+    path = manager.save(0, {'w': weight})
+    # an optimizer step right after save must not reach the checkpoint
+    weight += 1
+    manager.wait()
+    assert torch.equal(torch.load(path)['w'], torch.zeros(3))
+
+
+def test_files_of_earlier_runs_are_kept(tmp_path):
+    torch.save({}, str(tmp_path / 'epoch7.tar'))
+    manager = CheckpointManager(str(tmp_path / 'epoch%d.tar'), keep_last=1, async_write=False)
+    manager.save(0, {})
+    manager.save(1, {})
+    assert _epochs(tmp_path) == [1, 7]
+
+
+def test_write_errors_are_raised(tmp_path):
+    (tmp_path / 'file').write_text('')
+    # the checkpoint directory cannot be created below a file
+    manager = CheckpointManager(str(tmp_path / 'file' / 'epoch%d.tar'), async_write=False)
+    with pytest.raises(RuntimeError):
+        manager.save(0, {})
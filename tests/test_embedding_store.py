@@ -0,0 +1,36 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+np = pytest.importorskip('numpy')
+pytest.importorskip('dgl')
+pytest.importorskip('torch_geometric')
+
+from libgptb.executors.embedding_store import EmbeddingStore
+
+
+def test_round_trip(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    z, y = torch.rand(5, 3), torch.arange(5)
+    store.put(9, z, y)
+    z_, y_ = store.get(9)
+    assert z_.dtype == torch.float32
+    assert torch.equal(z_, z) and torch.equal(y_, y)
+
+
+def test_float16_storage(tmp_path):
+    store = EmbeddingStore(str(tmp_path), dtype='float16')
+    z = torch.rand(5, 3)
+    store.put(9, z)
+    z_, y_ = store.get(9)
+    assert z_.dtype == torch.float32 and y_ is None
+    assert torch.allclose(z_, z, atol=1e-3)
+
+
+def test_clear_and_disabled(tmp_path):
+    store = EmbeddingStore(str(tmp_path))
+    store.put(9, torch.rand(5, 3), torch.arange(5))
+    store.clear()
+    assert store.get(9) == (None, None)
+    disabled = EmbeddingStore(str(tmp_path), enabled=False)
+    disabled.put(9, torch.rand(5, 3))
+    assert disabled.get(9) == (None, None)
@@ -0,0 +1,74 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('dgl')
+pytest.importorskip('torch_geometric')
+pytest.importorskip('tensorboard')
+
+from torch_geometric.data import Data
+from torch_geometric.loader import DataLoader
+from torch_geometric.nn import global_mean_pool
+
+from libgptb.data.loader import BucketBatchSampler, DeviceGraphLoader, IndexedGraphDataset
+from libgptb.executors.graph_trainer import GraphTrainer
+
+
+class _Model(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.encoder_model = torch.nn.Linear(1, 1)
+
+
+class _Trainer(GraphTrainer):
+    """embeds a graph as the mean of its node features"""
+
+    def graph_embed(self, data):
+        return global_mean_pool(data.x, data.batch)
+
+
+def _graphs(num_graphs=20):
+    torch.manual_seed(0)
+    graphs = []
+    for i in range(num_graphs):
+        n = int(torch.randint(1, 6, ()).item())
+        edge_index = torch.stack([torch.arange(n), torch.arange(n).roll(1)])
+        graphs.append(Data(x=torch.full((n, 1), float(i)), edge_index=edge_index, y=torch.tensor([i])))
+    return graphs
+
+
+def _trainer(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = {'model': 'Toy', 'dataset': 'toy', 'evaluator': 'DGIEvaluator', 'exp_id': 'test',
+              'device': torch.device('cpu'), 'checkpoint_async': False}
+    return _Trainer(config, _Model(), {})
+
+
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_embed_rows_follow_the_dataset_order(tmp_path, monkeypatch, shuffle):
+    trainer = _trainer(tmp_path, monkeypatch)
+    loader = DeviceGraphLoader(_graphs(), 3, 'cpu', shuffle=shuffle)
+    for _ in range(2):
+        x, y = trainer.embed(loader)
+        # row i is graph i, whatever order the loader yields the graphs in
+        assert torch.equal(x[:, 0], torch.arange(20, dtype=torch.float))
+        assert torch.equal(y, torch.arange(20))
+
+
+def _sampler(graphs, shuffle):
+    return BucketBatchSampler([g.num_nodes for g in graphs], [g.num_edges for g in graphs], 8,
+                              bucket_size=7, shuffle=shuffle)
+
+
+@pytest.mark.parametrize('shuffle', [False, True])
+@pytest.mark.parametrize('device_loader', [False, True])
+def test_embed_rows_follow_the_dataset_order_with_buckets(tmp_path, monkeypatch, shuffle, device_loader):
+    trainer = _trainer(tmp_path, monkeypatch)
+    graphs = _graphs()
+    if device_loader:
+        loader = DeviceGraphLoader(graphs, 3, 'cpu', batch_sampler=_sampler(graphs, shuffle))
+    else:
+        loader = DataLoader(IndexedGraphDataset(graphs), batch_sampler=_sampler(graphs, shuffle))
+    # even unshuffled, the buckets yield the graphs sorted by size
+    x, y = trainer.embed(loader)
+    assert torch.equal(x[:, 0], torch.arange(20, dtype=torch.float))
+    assert torch.equal(y, torch.arange(20))
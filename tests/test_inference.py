@@ -0,0 +1,57 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+dgl = pytest.importorskip('dgl')
+pytest.importorskip('torch_geometric')
+pytest.importorskip('torch_sparse')
+
+from dgl.nn import GraphConv
+from torch_geometric.data import Data
+from torch_geometric.nn import GCNConv
+
+from libgptb.model.inference import InferenceEngine, get_inference_engine
+from libgptb.model.layers import gcn_inference_stages, graphconv_inference_stages
+
+
+def _edges(num_nodes=10, num_edges=30):
+    torch.manual_seed(0)
+    edge_index = torch.randint(0, num_nodes, (2, num_edges))
+    return edge_index[:, edge_index[0] != edge_index[1]]
+
+
+@pytest.mark.parametrize('storage', ['device', 'cpu', 'memmap'])
+@pytest.mark.parametrize('weighted', [False, True])
+def test_chunked_gcn_matches_the_full_graph_forward(tmp_path, storage, weighted):
+    edge_index = _edges()
+    edge_weight = torch.rand(edge_index.size(1)) if weighted else None
+    x = torch.rand(10, 5)
+    conv1, conv2 = GCNConv(5, 4), GCNConv(4, 3)
+    expected = conv2(torch.relu(conv1(x, edge_index, edge_weight)), edge_index, edge_weight)
+    # chunks smaller than the graph, so that a chunk needs rows computed by other chunks
+    engine = InferenceEngine(edge_index, 10, 'cpu', edge_weight=edge_weight, chunk_size=3,
+                             storage=storage, memmap_dir=str(tmp_path))
+    stages = gcn_inference_stages(conv1) + [torch.relu] + gcn_inference_stages(conv2)
+    assert torch.allclose(engine.run(x, stages), expected, atol=1e-5)
+
+
+def test_chunked_graphconv_matches_the_full_graph_forward():
+    graph = dgl.graph(tuple(_edges()), num_nodes=10).add_self_loop()
+    x = torch.rand(10, 5)
+    conv1, conv2 = GraphConv(5, 4, activation=torch.relu), GraphConv(4, 3)
+    expected = conv2(graph, conv1(graph, x))
+    engine = get_inference_engine({'inference_chunk_size': 3}, graph, 'cpu')
+    stages = graphconv_inference_stages(conv1) + graphconv_inference_stages(conv2)
+    assert torch.allclose(engine.run(x, stages), expected, atol=1e-5)
+
+
+def test_engine_uses_the_overriding_edges():
+    edge_index = _edges()
+    data = Data(x=torch.rand(10, 5), edge_index=edge_index, num_nodes=10)
+    conv = GCNConv(5, 4)
+    # e.g. the diffusion graph of MVGRL
+    diffusion_index = edge_index.flip(0)
+    diffusion_weight = torch.rand(edge_index.size(1))
+    engine = get_inference_engine({'inference_chunk_size': 4}, data, 'cpu',
+                                  edge_index=diffusion_index, edge_weight=diffusion_weight)
+    expected = conv(data.x, diffusion_index, diffusion_weight)
+    assert torch.allclose(engine.run(data.x, gcn_inference_stages(conv)), expected, atol=1e-5)
@@ -0,0 +1,61 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+dgl = pytest.importorskip('dgl')
+pytest.importorskip('torch_geometric')
+pytest.importorskip('torch_sparse')
+
+from dgl.base import DGLError
+from dgl.nn import GraphConv
+
+from libgptb.augmentors.functional import MaskedFeatures
+from libgptb.model.layers import graphconv
+
+
+def _graph():
+    return dgl.graph((torch.tensor([0, 1, 2, 3, 0]), torch.tensor([1, 2, 3, 0, 2])), num_nodes=4)
+
+
+def _masked():
+    torch.manual_seed(0)
+    return MaskedFeatures(torch.rand(4, 5), torch.tensor([1., 0., 1., 1., 0.]))
+
+
+def test_lazy_graphconv_matches_graphconv():
+    conv = GraphConv(5, 3, norm='both', activation=torch.relu)
+    graph, x = _graph().add_self_loop(), _masked()
+    assert torch.allclose(graphconv(conv, graph, x), conv(graph, x.materialize()), atol=1e-6)
+
+
+def test_lazy_graphconv_matches_graphconv_with_edge_weight():
+    conv = GraphConv(5, 3, norm='both')
+    graph, x = _graph().add_self_loop(), _masked()
+    edge_weight = torch.rand(graph.num_edges())
+    assert torch.allclose(graphconv(conv, graph, x, edge_weight),
+                          conv(graph, x.materialize(), edge_weight=edge_weight), atol=1e-6)
+
+
+def test_lazy_graphconv_keeps_the_zero_in_degree_check():
+    conv = GraphConv(5, 3, norm='both')
+    graph = dgl.graph((torch.tensor([0, 1]), torch.tensor([1, 2])), num_nodes=4)
+    with pytest.raises(DGLError):
+        conv(graph, torch.rand(4, 5))
+    with pytest.raises(DGLError):
+        graphconv(conv, graph, _masked())
+
+
+@pytest.mark.parametrize('activation_checkpoint', [False, True])
+def test_shared_propagation_matches_two_forwards(activation_checkpoint):
+    from libgptb.model.DGI import GConv
+    torch.manual_seed(0)
+    edge_index = torch.tensor([[0, 1, 1, 2, 2, 3], [1, 0, 2, 1, 3, 2]])
+    x, perm = torch.rand(4, 5), torch.tensor([2, 0, 3, 1])
+    gconv = GConv(5, 3, num_layers=2, activation_checkpoint=activation_checkpoint)
+    z, zn = gconv.forward_corrupted(x, perm, edge_index)
+    assert torch.allclose(z, gconv(x, edge_index), atol=1e-6)
+    assert torch.allclose(zn, gconv(x[perm], edge_index), atol=1e-6)
+    (z.sum() + zn.sum()).backward()
+    shared = [p.grad.clone() for p in gconv.parameters()]
+    gconv.zero_grad()
+    (gconv(x, edge_index).sum() + gconv(x[perm], edge_index).sum()).backward()
+    assert all(torch.allclose(a, p.grad, atol=1e-5) for a, p in zip(shared, gconv.parameters()))
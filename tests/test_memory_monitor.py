@@ -0,0 +1,51 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('dgl')
+pytest.importorskip('torch_geometric')
+
+from libgptb.executors.memory_monitor import MemoryMonitor
+from libgptb.executors.step_profiler import StepProfiler
+
+
+class _Writer(object):
+    def __init__(self):
+        self.scalars = {}
+
+    def add_scalar(self, tag, value, step):
+        self.scalars[tag] = value
+
+
+def test_watch_tags_the_outputs():
+    model = torch.nn.Sequential(torch.nn.Linear(3, 2))
+    monitor = MemoryMonitor(None, 'cpu', threshold_mb=1.)
+    monitor.watch(model)
+    assert model(torch.rand(4, 3))._created_by == '0 (Linear)'
+
+
+def test_compiled_models_are_not_watched():
+    model = torch.nn.Sequential(torch.nn.Linear(3, 2))
+    monitor = MemoryMonitor(None, 'cpu', threshold_mb=1.)
+    monitor.watch(model, compiled=True)
+    assert not monitor._hooks
+    assert not hasattr(model(torch.rand(4, 3)), '_created_by')
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason='needs CUDA')
+def test_run_peak_survives_the_phase_resets():
+    writer = _Writer()
+    monitor = MemoryMonitor(writer, 'cuda')
+    profiler = StepProfiler(writer, 'cuda', memory=monitor)
+    with profiler.phase('big'):
+        big = torch.empty(2 ** 20, device='cuda')
+        del big
+    with profiler.phase('small'):
+        torch.empty(1, device='cuda')
+    # the allocator only remembers the small phase
+    assert torch.cuda.max_memory_allocated() < 4 * 2 ** 20 <= profiler.max_memory_allocated()
+    monitor.end_epoch(0, run_peak=profiler.max_memory_allocated())
+    assert writer.scalars['memory/run_peak_allocated_mb'] >= 4.
+
+
+def test_run_peak_is_not_tracked_on_the_cpu():
+    assert StepProfiler(_Writer(), 'cpu').max_memory_allocated() is None
@@ -0,0 +1,66 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('dgl')
+pytest.importorskip('torch_geometric')
+
+from libgptb.evaluators.metrics import accuracy, batched_f1_scores, confusion_matrix, f1_scores, roc_auc
+
+
+def _labels():
+    return torch.tensor([0, 0, 1, 1, 2]), torch.tensor([0, 1, 1, 1, 0])
+
+
+def test_f1_scores():
+    y_true, y_pred = _labels()
+    micro, macro = f1_scores(y_true, y_pred)
+    # per-class F1: 2/4, 4/5 and 0
+    assert micro.item() == pytest.approx(0.6)
+    assert macro.item() == pytest.approx((0.5 + 0.8 + 0.) / 3)
+    assert accuracy(y_true, y_pred).item() == pytest.approx(0.6)
+    assert [v.item() for v in f1_scores(y_true, y_pred, 3)] == pytest.approx([micro.item(), macro.item()])
+
+
+def test_macro_f1_skips_absent_classes():
+    y_true, y_pred = _labels()
+    # classes 3 and 4 occur neither in the labels nor in the predictions
+    _, macro = f1_scores(y_true, y_pred, 5)
+    assert macro.item() == pytest.approx((0.5 + 0.8 + 0.) / 3)
+
+
+def test_raw_labels_are_remapped():
+    y_true, y_pred = torch.tensor([-1, -1, 1, 1]), torch.tensor([-1, 1, 1, 1])
+    micro, macro = f1_scores(y_true, y_pred)
+    assert micro.item() == pytest.approx(0.75)
+    assert macro.item() == pytest.approx((2 / 3 + 0.8) / 2)
+    assert confusion_matrix(y_true, y_pred).tolist() == [[1, 1], [0, 2]]
+    # labels that are not contiguous
+    assert [v.item() for v in f1_scores(5 * y_true, 5 * y_pred)] == pytest.approx([micro.item(), macro.item()])
+
+
+def test_confusion_matrix():
+    y_true, y_pred = _labels()
+    expected = [[1, 1, 0], [0, 2, 0], [1, 0, 0]]
+    assert confusion_matrix(y_true, y_pred, 3).tolist() == expected
+    assert confusion_matrix(y_true, y_pred).tolist() == expected
+
+
+def test_batched_f1_scores_match_f1_scores():
+    y_true, y_pred = _labels()
+    y_preds = torch.stack([y_pred, y_true, torch.zeros_like(y_true)])
+    micro, macro = batched_f1_scores(y_true, y_preds, 3)
+    for h in range(y_preds.size(0)):
+        expected = f1_scores(y_true, y_preds[h])
+        assert micro[h].item() == pytest.approx(expected[0].item())
+        assert macro[h].item() == pytest.approx(expected[1].item())
+    assert [micro[1].item(), macro[1].item()] == pytest.approx([1., 1.])
+
+
+def test_roc_auc():
+    y_true = torch.tensor([0, 0, 1, 1])
+    assert roc_auc(y_true, torch.tensor([0.1, 0.4, 0.35, 0.8])).item() == pytest.approx(0.75)
+    # ties count one half
+    assert roc_auc(torch.tensor([0, 1]), torch.tensor([0.5, 0.5])).item() == pytest.approx(0.5)
+    scores = torch.tensor([[0.9, 0.1], [0.6, 0.4], [0.65, 0.35], [0.2, 0.8]])
+    # one-vs-rest: 0.75 for both classes
+    assert roc_auc(y_true, scores).item() == pytest.approx(0.75)
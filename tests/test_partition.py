@@ -0,0 +1,45 @@
+import math
+
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('dgl')
+pytest.importorskip('torch_geometric')
+
+from torch_geometric.data import Data
+
+from libgptb.data import partition
+
+
+def _two_cliques(size=8):
+    # two cliques joined by a single edge
+    edges = [(i, j) for block in range(2) for i in range(block * size, (block + 1) * size)
+             for j in range(block * size, (block + 1) * size) if i != j]
+    edges += [(0, size), (size, 0)]
+    return Data(edge_index=torch.tensor(edges).t(), num_nodes=2 * size)
+
+
+def test_label_propagation_is_balanced():
+    data = _two_cliques()
+    part = partition.label_propagation_partition(data.edge_index, data.num_nodes, 2)
+    assert part.shape == (data.num_nodes,)
+    assert part.min() >= 0 and part.max() < 2
+    capacity = math.ceil(1.1 * data.num_nodes / 2)
+    assert torch.bincount(part, minlength=2).max() <= capacity
+
+
+def test_metis_fallback_is_cached_as_lp(tmp_path, monkeypatch):
+    def unavailable(data, num_parts):
+        raise ImportError('no METIS')
+
+    monkeypatch.setattr(partition, 'metis_partition', unavailable)
+    part = partition.get_partition(_two_cliques(), 2, 'metis', str(tmp_path))
+    assert (tmp_path / 'partition_lp_2.pt').exists()
+    assert not (tmp_path / 'partition_metis_2.pt').exists()
+    # the fallback reuses the lp cache
+    assert torch.equal(partition.get_partition(_two_cliques(), 2, 'metis', str(tmp_path)), part)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        partition.get_partition(_two_cliques(), 2, 'spectral')
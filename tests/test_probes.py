@@ -0,0 +1,59 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('dgl')
+pytest.importorskip('torch_geometric')
+pytest.importorskip('sklearn')
+
+from libgptb.evaluators import LREvaluator, BatchedLREvaluator
+
+
+def _separable(num_nodes=120, num_classes=3, dim=8):
+    torch.manual_seed(0)
+    y = torch.arange(num_nodes) % num_classes
+    centers = 5 * torch.randn(num_classes, dim)
+    x = centers[y] + 0.1 * torch.randn(num_nodes, dim)
+    perm = torch.randperm(num_nodes)
+    split = {'train': perm[:60], 'valid': perm[60:90], 'test': perm[90:]}
+    return x, y, split
+
+
+def test_adam_is_the_default_solver():
+    assert LREvaluator().solver == 'adam'
+    with pytest.raises(ValueError):
+        LREvaluator(solver='sgd')
+
+
+@pytest.mark.parametrize('solver', ['adam', 'lbfgs'])
+def test_solvers_fit_separable_classes(solver):
+    x, y, split = _separable()
+    result = LREvaluator(num_epochs=200, solver=solver).evaluate(x, y, split)
+    assert result['micro_f1'] == pytest.approx(1.)
+    assert result['macro_f1'] == pytest.approx(1.)
+
+
+def test_lbfgs_matches_adam():
+    x, y, split = _separable()
+    adam = LREvaluator(num_epochs=200, solver='adam').evaluate(x, y, split)
+    lbfgs = LREvaluator(solver='lbfgs').evaluate(x, y, split)
+    assert lbfgs['micro_f1'] == pytest.approx(adam['micro_f1'])
+    assert lbfgs['macro_f1'] == pytest.approx(adam['macro_f1'])
+
+
+def test_batched_probe_scores_every_embedding():
+    x, y, split = _separable()
+    noise = torch.randn_like(x)
+    probe = BatchedLREvaluator(num_epochs=200, weight_decays=[0., 10.], seeds=[0, 1])
+    good, bad = probe.evaluate_many([x, noise], y, split)
+    assert good['micro_f1'] == pytest.approx(1.) and good['val_micro_f1'] == pytest.approx(1.)
+    assert bad['val_micro_f1'] < 1.
+    assert good['seed'] in [0, 1] and good['weight_decay'] in [0., 10.]
+
+
+def test_batched_probe_heads_are_independent():
+    x, y, split = _separable()
+    # a head trained alone and the same head trained next to others end up alike
+    alone = BatchedLREvaluator(num_epochs=100, weight_decays=[0.]).evaluate(x, y, split)
+    together = BatchedLREvaluator(num_epochs=100, weight_decays=[0., 1e3]).evaluate(x, y, split)
+    assert together['weight_decay'] == 0.
+    assert together['micro_f1'] == pytest.approx(alone['micro_f1'])
@@ -0,0 +1,45 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('dgl')
+pytest.importorskip('torch_geometric')
+pytest.importorskip('torch_sparse')
+
+from torch_geometric.data import Data
+
+from libgptb.model.inference import PROPAGATE, get_inference_engine
+from libgptb.model.sign import precompute_hops
+
+
+def _graph(x):
+    edge_index = torch.tensor([[0, 1, 1, 2, 2, 3], [1, 0, 2, 1, 3, 2]])
+    return Data(x=x, edge_index=edge_index, num_nodes=x.size(0))
+
+
+def test_hops_cache_is_keyed_on_the_features(tmp_path):
+    config = {'dataset': 'toy', 'num_hops': 2}
+    x = torch.rand(4, 3)
+    first = precompute_hops(config, _graph(x), 'cpu', str(tmp_path))
+    # same shape, different features: the cached hops must not be reused
+    second = precompute_hops(config, _graph(2 * x), 'cpu', str(tmp_path))
+    assert len(list((tmp_path / 'sign').iterdir())) == 2
+    assert torch.allclose(torch.from_numpy(second[:]), 2 * torch.from_numpy(first[:]), atol=1e-6)
+    # same inputs: served from the cache
+    again = precompute_hops(config, _graph(x), 'cpu', str(tmp_path))
+    assert torch.equal(torch.from_numpy(again[:]), torch.from_numpy(first[:]))
+
+
+def test_hops_cache_is_keyed_on_the_hop_count(tmp_path):
+    x = torch.rand(4, 3)
+    precompute_hops({'dataset': 'toy', 'num_hops': 1}, _graph(x), 'cpu', str(tmp_path))
+    hops = precompute_hops({'dataset': 'toy', 'num_hops': 2}, _graph(x), 'cpu', str(tmp_path))
+    assert hops.shape == (4, 9)
+
+
+def test_pointwise_engine_has_no_adjacency():
+    engine = get_inference_engine({}, _graph(torch.rand(4, 3)), 'cpu', propagate=False)
+    assert engine.rowptr is None
+    x = torch.rand(4, 3)
+    assert torch.allclose(engine.run(x, [torch.nn.Identity()]), x)
+    with pytest.raises(ValueError):
+        engine.run(x, [PROPAGATE])
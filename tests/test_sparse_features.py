@@ -0,0 +1,30 @@
+import types
+
+import pytest
+
+torch = pytest.importorskip('torch')
+np = pytest.importorskip('numpy')
+sp = pytest.importorskip('scipy.sparse')
+pytest.importorskip('dgl')
+pytest.importorskip('torch_geometric')
+pytest.importorskip('torch_sparse')
+
+from libgptb.data import get_dataset
+from libgptb.data.dataset.pyg_dataset import normalize_sparse_features, read_sparse_features
+
+
+def test_npz_features_are_read_sparse(tmp_path):
+    dense = np.array([[0., 2., 0.], [1., 0., 3.], [0., 0., 0.]], dtype=np.float32)
+    x = sp.csr_matrix(dense)
+    path = str(tmp_path / 'toy.npz')
+    np.savez(path, attr_data=x.data, attr_indices=x.indices, attr_indptr=x.indptr, attr_shape=x.shape)
+    dataset = types.SimpleNamespace(raw_paths=[path])
+    features = read_sparse_features(dataset)
+    assert torch.equal(features.to_dense(), torch.from_numpy((dense > 0).astype(np.float32)))
+    normalized = normalize_sparse_features(features).to_dense()
+    assert torch.allclose(normalized.sum(dim=1), torch.tensor([1., 1., 0.]))
+
+
+def test_sparse_features_are_refused_by_dense_models():
+    with pytest.raises(ValueError):
+        get_dataset({'model': 'GRACE', 'sparse_features': True, 'dataset_class': 'PyGDataset'})
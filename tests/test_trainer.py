@@ -0,0 +1,122 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('dgl')
+pytest.importorskip('torch_geometric')
+pytest.importorskip('tensorboard')
+
+from libgptb.executors.metrics_buffer import MetricsBuffer
+from libgptb.executors.trainer import GCLTrainer
+
+
+class _Writer(object):
+    def __init__(self):
+        self.scalars = []
+
+    def add_scalar(self, tag, value, step):
+        self.scalars.append((tag, value, step))
+
+
+class _Model(torch.nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.encoder_model = torch.nn.Linear(3, 2)
+
+
+class _Trainer(GCLTrainer):
+    """a trainer whose epoch losses follow ``config['losses']``"""
+
+    def prepare(self, data):
+        return [data]
+
+    def step(self, batch, epoch_idx):
+        return (self.model.encoder_model(batch) * 0).sum() + self.config['losses'][epoch_idx]
+
+    def embed(self, data):
+        return self.model.encoder_model(data), torch.zeros(data.size(0), dtype=torch.long)
+
+
+def _config(**kwargs):
+    config = {'model': 'Toy', 'dataset': 'toy', 'evaluator': 'DGIEvaluator', 'exp_id': 'test',
+              'device': torch.device('cpu'), 'checkpoint_async': False}
+    config.update(kwargs)
+    return config
+
+
+def test_metrics_buffer_keeps_the_last_loss_after_flush():
+    writer = _Writer()
+    metrics = MetricsBuffer(writer)
+    metrics.append(0, [torch.tensor(1.), torch.tensor(3.)])
+    metrics.append(1, torch.tensor(4.))
+    assert metrics.flush() == [(0, 2.), (1, 4.)]
+    assert metrics.last().item() == 4.
+    assert metrics.flush() == []
+    assert [value for _, value, _ in writer.scalars] == [2., 4.]
+
+
+@pytest.mark.parametrize('log_every, decays', [(1, 3), (2, 2)])
+def test_reduce_lr_on_plateau(tmp_path, monkeypatch, log_every, decays):
+    monkeypatch.chdir(tmp_path)
+    losses = [1., 1., 1., 1.]
+    trainer = _Trainer(_config(max_epoch=len(losses), losses=losses, log_every=log_every,
+                               lr_scheduler='reducelronplateau', lr_patience=0, lr_decay_ratio=0.5),
+                       _Model(), {})
+    assert trainer.train(torch.rand(4, 3), None) == 1.
+    # the loss never improves after the first flush, the learning rate is halved at every later flush
+    assert trainer.optimizer.param_groups[0]['lr'] == pytest.approx(0.01 * 0.5 ** decays)
+
+
+def test_reduce_lr_on_plateau_only_sees_flushed_losses(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    losses = [3., 2., 1., 1., 1.]
+    trainer = _Trainer(_config(max_epoch=len(losses), losses=losses, log_every=2,
+                               lr_scheduler='reducelronplateau'), _Model(), {})
+    values = []
+    monkeypatch.setattr(trainer.lr_scheduler, 'step', values.append)
+    monkeypatch.setattr(trainer.metrics, 'last', lambda: pytest.fail('the device loss was read'))
+    trainer.train(torch.rand(4, 3), None)
+    # epochs 0, 2 and 4 are flushed, the scheduler gets host floats
+    assert values == [3., 1., 1.]
+    assert all(isinstance(value, float) for value in values)
+
+
+def test_best_checkpoint_is_the_epoch_it_is_labelled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    losses = [5., 1., 4., 3., 2., 2.5, 0.5]
+    trainer = _Trainer(_config(max_epoch=len(losses), losses=losses, log_every=3, lr_decay=False),
+                       _Model(), {})
+    saved = []
+    save = trainer.save_model_with_epoch
+
+    def record(epoch, best=False, milestone=False):
+        if best:
+            saved.append(epoch)
+        return save(epoch, best=best, milestone=milestone)
+
+    monkeypatch.setattr(trainer, 'save_model_with_epoch', record)
+    assert trainer.train(torch.rand(4, 3), None) == 0.5
+    # the minimum of epoch 1 is only known at epoch 3, whose weights are the ones saved
+    assert saved == [0, 3, 6]
+
+
+def test_inference_engine_is_built_once(tmp_path, monkeypatch):
+    from torch_geometric.data import Data
+    monkeypatch.chdir(tmp_path)
+    trainer = _Trainer(_config(), _Model(), {})
+    data = Data(x=torch.rand(3, 3), edge_index=torch.tensor([[0, 1, 1, 2], [1, 0, 2, 1]]), num_nodes=3)
+    engine = trainer.inference_engine(data)
+    assert trainer.inference_engine(data) is engine
+    diffusion = trainer.inference_engine(data, 'diffusion', edges=lambda: (data.edge_index, None))
+    assert diffusion is not engine
+
+
+def test_tracer_is_stopped_when_an_epoch_raises(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # a loss per epoch is missing, the second epoch raises an IndexError
+    trainer = _Trainer(_config(max_epoch=2, losses=[1.]), _Model(), {})
+    calls = []
+    monkeypatch.setattr(trainer.tracer, 'start', lambda: calls.append('start'))
+    monkeypatch.setattr(trainer.tracer, 'stop', lambda: calls.append('stop'))
+    with pytest.raises(IndexError):
+        trainer.train(torch.rand(4, 3), None)
+    assert calls == ['start', 'stop']